@@ -1,5 +1,7 @@
 from .phrase import Phrase
+from .phrase_summary import PhraseSummary
+from .tag import Tag
 from .meaning import Meaning
 from .user_vote import User_Vote
 
-__all__ = ["Phrase", "Meaning", "User_Vote"]
\ No newline at end of file
+__all__ = ["Phrase", "PhraseSummary", "Tag", "Meaning", "User_Vote"]
\ No newline at end of file
@@ -2,7 +2,7 @@ import datetime
 from bson import ObjectId
 from typing import Optional
 from pymongo import ReturnDocument
-from datalayer import Base, ResponseModel, ToneEnum, get_ip, my_logger, get_db
+from datalayer import Base, ResponseModel, ToneEnum, get_ip, my_logger, get_db, get_async_db, get_read_db, get_async_read_db, get_user_db, get_async_user_db, search_index, vote_index, response_cache
 
 class Meaning(Base):
     """
@@ -15,8 +15,9 @@ class Meaning(Base):
         - confidence: int - Confidence level from 0 to 100.
         - warning_level: int - Warning level from 0 to 10.
     
-    two field more in response:
-        - like_count: int - Number of likes for the meaning.
+        - like_count: int - Number of likes for the meaning (kept up to date by User_Vote).
+
+    one field more in response:
         - is_liked_by_user: bool - Indicates if the user has liked the meaning.   
     """
 
@@ -26,45 +27,72 @@ class Meaning(Base):
     confidence: Optional[int] = 50  # Confidence level from 0 to 100
     warning_level: Optional[int] = 0  # Warning level from 0 to 5
     
-    ## these fields are not in the database just for the response
-    like_count: Optional[int] = 0
+    like_count: Optional[int] = 0  # denormalized counter, changed only with $inc by User_Vote
+
+    ## this field is not in the database just for the response
     is_liked_by_user: bool = False
 
-    def __init__(self, **data):
-        super().__init__(**data)
-        self.like_count = self.get_like_count()
-        self.is_liked_by_user = self.check_is_liked_by_user()
-        
-    def get_like_count(self) -> int:
+    @staticmethod
+    def user_votes_query(meanings: list) -> Optional[dict]:
         """
-        Get the like count for the meaning.
+        Filter of the current user's likes on the given meanings, None when there is nothing to look up
+        (no meaning saved yet, or no request in context e.g. at startup).
         """
+        meaning_ids = [meaning.id for meaning in meanings if meaning.id]
+        if not meaning_ids:
+            return None
+
         try:
-            db = get_db()
-            data_from_db = db["user_votes"].count_documents({"meaning_id": self.id, "like": True})
-            
-            return data_from_db
-        except Exception as e:
-            my_logger.error(f"can not get like for meaning {self.id}\n{e.args[0]}")
-            return 0
+            user_ip = get_ip()
+        except LookupError:
+            return None
 
-    def check_is_liked_by_user(self) -> bool:
+        return {"meaning_id": {"$in": meaning_ids}, "ip": user_ip, "like": True}
+
+    @staticmethod
+    def set_liked_by_user(meanings: list, liked_ids: set) -> list:
+        for meaning in meanings:
+            meaning.is_liked_by_user = meaning.id in liked_ids
+        return meanings
+
+    @staticmethod
+    def attach_votes(meanings: list) -> list:
         """
-        Check if the meaning is liked by the user.
+        Fill is_liked_by_user for a batch of meanings with one $in query for the current user's votes.
+        like_count is already stored on the embedded meanings.
+        The votes are read from the primary when the user voted lately, so they always see their own vote,
+        or from the in-process vote index without any query when it's loaded.
         """
+        liked_ids = set()
         try:
-            user_ip = get_ip()
+            query = Meaning.user_votes_query(meanings)
+            if query and vote_index.ready:
+                liked_ids = vote_index.liked(query["ip"], query["meaning_id"]["$in"])
+            elif query:
+                db = get_user_db(query["ip"])
+                liked_ids = {vote["meaning_id"] for vote in db["user_votes"].find(query, {"_id": 0, "meaning_id": 1})}
+        except Exception as e:
+            my_logger.error(f"can not check if meanings are liked by user\n{e}")
 
-            db = get_db()
-            data_from_db = db["user_votes"].find_one({"meaning_id": self.id, "ip": user_ip})
+        return Meaning.set_liked_by_user(meanings, liked_ids)
 
-            if data_from_db and data_from_db["like"] == True:
-                return True
-            else:
-                return False
+    @staticmethod
+    async def attach_votes_async(meanings: list) -> list:
+        """
+        Async version of attach_votes.
+        """
+        liked_ids = set()
+        try:
+            query = Meaning.user_votes_query(meanings)
+            if query and vote_index.ready:
+                liked_ids = vote_index.liked(query["ip"], query["meaning_id"]["$in"])
+            elif query:
+                db = get_async_user_db(query["ip"])
+                liked_ids = {vote["meaning_id"] async for vote in db["user_votes"].find(query, {"_id": 0, "meaning_id": 1})}
         except Exception as e:
-            my_logger.error(f"can not check if meaning {self.id} is liked by user\n{e.args[0]}")
-            return False
+            my_logger.error(f"can not check if meanings are liked by user\n{e}")
+
+        return Meaning.set_liked_by_user(meanings, liked_ids)
 
     def validation(self) -> ResponseModel:
         """
@@ -88,37 +116,58 @@ class Meaning(Base):
 
         return ResponseModel(success=True, message="Meaning validated successfully")
 
-    def check_duplicate_possibility(self) -> bool:
+    @staticmethod
+    def get_meanings_by_phrase_id(phrase_id: str) -> ResponseModel:
         """
-        Check if the meaning already exists in the database.
-        Based on the phrase ID, meaning, and tone.
-        If it exists, return a response (TRUE) indicating a duplicate.
+        Retrieve meanings by phrase ID from the database.
         """
+        try:
+            cache_key = response_cache.key("meanings", {"phrase_id": phrase_id}, phrase_id=phrase_id)
+            cached = response_cache.get(cache_key)
+            if cached is not None:
+                result = Meaning.attach_votes([Meaning.construct_trusted(meaning) for meaning in cached])
+                return ResponseModel(success=True, data=result)
 
-        db = get_db()
-        data_from_db = db["phrases"].find_one(
-            {"_id": ObjectId(self.phrase_id), "meanings.meaning": self.meaning, "meanings.tone": self.tone})
+            db = get_read_db()
+            data_from_db = db["phrases"].find_one({"_id": ObjectId(phrase_id)}, {"meanings": 1})
 
-        # Check if the meaning already exists in the database
-        if data_from_db:
-            return True  # Meaning already exists in the database
+            # Check if the meanings exist in the database
+            if not data_from_db["meanings"]:
+                return ResponseModel(success=False, message="Meanings not found!")
+
+            meanings = [Meaning.construct_trusted(meaning) for meaning in data_from_db["meanings"]]
+            response_cache.set(cache_key, [meaning.dict() for meaning in meanings])
+
+            result = Meaning.attach_votes(meanings)
+            return ResponseModel(success=True, data=result)
+
+        except Exception as e:
+            my_logger.error(f"Error retrieving meanings for phrase {phrase_id}\n{e.args[0]}")
+            return ResponseModel(success=False, message=str(e))
 
-        return False  # No duplicate found
-    
     @staticmethod
-    def get_meanings_by_phrase_id(phrase_id: str) -> ResponseModel:
+    async def get_meanings_by_phrase_id_async(phrase_id: str) -> ResponseModel:
         """
-        Retrieve meanings by phrase ID from the database.
+        Async version of get_meanings_by_phrase_id.
         """
         try:
-            db = get_db()
-            data_from_db = db["phrases"].find_one({"_id": ObjectId(phrase_id)})
+            cache_key = await response_cache.key_async("meanings", {"phrase_id": phrase_id}, phrase_id=phrase_id)
+            cached = await response_cache.get_async(cache_key)
+            if cached is not None:
+                result = await Meaning.attach_votes_async([Meaning.construct_trusted(meaning) for meaning in cached])
+                return ResponseModel(success=True, data=result)
+
+            db = get_async_read_db()
+            data_from_db = await db["phrases"].find_one({"_id": ObjectId(phrase_id)}, {"meanings": 1})
 
             # Check if the meanings exist in the database
             if not data_from_db["meanings"]:
                 return ResponseModel(success=False, message="Meanings not found!")
 
-            result = [Meaning(**meaning) for meaning in data_from_db["meanings"]]
+            meanings = [Meaning.construct_trusted(meaning) for meaning in data_from_db["meanings"]]
+            await response_cache.set_async(cache_key, [meaning.dict() for meaning in meanings])
+
+            result = await Meaning.attach_votes_async(meanings)
             return ResponseModel(success=True, data=result)
 
         except Exception as e:
@@ -129,26 +178,38 @@ class Meaning(Base):
     def create(self, phrase_id: str) -> ResponseModel:
         """
         Save the meaning to the database.
+        A single update: the filter only matches the phrase when it has no meaning with the same meaning
+        and tone, so the duplicate check is part of the write. When nothing matched, the phrase is looked
+        up to tell a missing phrase from a duplicated meaning.
         """
         validation_response = self.validation()
         if not validation_response.success:
             return validation_response
 
-        # Check if the meaning already exists in the database
-        existing_meaning = self.check_duplicate_possibility()
-
-        if existing_meaning:
-            return ResponseModel(success=False, message="Meaning already exists in the database")
+        if not ObjectId.is_valid(phrase_id):
+            return ResponseModel(success=False, message="Phrase not found!")
 
         try:
             self.create_date = datetime.datetime.now()
             self.id = str(ObjectId())
-            
+            self.phrase_id = phrase_id
+            self.like_count = 0
+
             db = get_db()
             data_from_db = db["phrases"].update_one(
-                {"_id": ObjectId(phrase_id)},
-                {"$addToSet": {"meanings": self.dict(exclude={"like_count", "is_liked_by_user"})}}
+                {"_id": ObjectId(phrase_id), "meanings": {"$not": {"$elemMatch": {"meaning": self.meaning, "tone": self.tone}}}},
+                {"$push": {"meanings": self.dict(exclude={"is_liked_by_user"})}}
             )
+            if data_from_db.matched_count == 0:
+                if db["phrases"].count_documents({"_id": ObjectId(phrase_id)}, limit=1) == 0:
+                    return ResponseModel(success=False, message="Phrase not found!")
+                return ResponseModel(success=False, message="Meaning already exists in the database")
+
+            response_cache.invalidate_phrases([phrase_id], topics=response_cache.TOPICS)
+
+            if search_index.enabled:
+                search_index.set_meaning(phrase_id, self.id, self.meaning)
+
             return ResponseModel(success=True, message="Meaning added successfully", data=self)
 
         except Exception as e:
@@ -192,10 +253,25 @@ class Meaning(Base):
                     "_id": ObjectId(phrase_id),
                     "meanings.id": meaning_id
                 },
-                {"$set": {"meanings.$": self.dict(exclude={"id", "like_count", "is_liked_by_user"})}},
+                # set field by field so the stored id and create_date are kept
+                {"$set": {f"meanings.$.{key}": value for key, value in self.dict(
+                    exclude={"id", "phrase_id", "create_date", "like_count", "is_liked_by_user"}).items()}},
                 return_document=ReturnDocument.AFTER
             )
-            return ResponseModel(success=True, message="Meaning updated successfully", data=Meaning(**data_from_db))
+
+            if not data_from_db:
+                return ResponseModel(success=False, message="Meaning not found!")
+
+            updated_meaning = next(Meaning.construct_trusted(meaning) for meaning in data_from_db["meanings"] if meaning.get("id") == meaning_id)
+            # the meaning text shows in the pages embedding meanings and is searched, their number didn't change
+            response_cache.invalidate_phrases([phrase_id], topics=("meanings", "search"))
+
+            if search_index.enabled:
+                search_index.set_meaning(phrase_id, meaning_id, updated_meaning.meaning)
+
+            Meaning.attach_votes([updated_meaning])
+
+            return ResponseModel(success=True, message="Meaning updated successfully", data=updated_meaning)
 
         except Exception as e:
             my_logger.error(f"Error updating meaning {meaning_id} for phrase {phrase_id}\n{e.args[0]}")
@@ -210,8 +286,12 @@ class Meaning(Base):
             db = get_db()
             db["phrases"].update_one(
                 {"_id": ObjectId(phrase_id)},
-                {"$pull": {"meanings": {"_id": ObjectId(meaning_id)}}}
+                {"$pull": {"meanings": {"id": meaning_id}}}
             )
+            response_cache.invalidate_phrases([phrase_id], topics=response_cache.TOPICS)
+
+            if search_index.enabled:
+                search_index.remove_meaning(phrase_id, meaning_id)
 
             return ResponseModel(success=True, message="Meaning deleted successfully")
 
@@ -230,6 +310,10 @@ class Meaning(Base):
                 {"_id": ObjectId(phrase_id)},
                 {"$set": {"meanings": []}}
             )
+            response_cache.invalidate_phrases([phrase_id], topics=response_cache.TOPICS)
+
+            if search_index.enabled:
+                search_index.remove_meaning(phrase_id)
 
             return ResponseModel(success=True, message=f"All meanings for phrase {phrase_id} deleted successfully")
 
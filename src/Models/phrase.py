@@ -1,9 +1,19 @@
+import re
+import json
+import base64
 import pymongo
 import datetime
 from typing import List, Optional
-from bson import ObjectId
-from datalayer import Base, ResponseModel, SortEnum, my_logger, get_db
+from bson import ObjectId, json_util
+from pydantic import ValidationError
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+from datalayer import Base, ResponseModel, SortEnum, RankingEnum, SearchModeEnum, TagModeEnum, my_logger, get_db, get_async_db, get_read_db, get_async_read_db, search_index, view_buffer, response_cache, rankings
 from .meaning import Meaning
+from .phrase_summary import PhraseSummary
+from .tag import Tag
+
+# fields a phrase list can be asked for without its meanings
+SUMMARY_FIELDS = ["text", "suggested_response", "tags", "views", "create_date", "meaning_count"]
 
 
 class Phrase(Base):
@@ -35,36 +45,157 @@ class Phrase(Base):
 
         return ResponseModel(success=True, message="Phrase validated successfully")
 
+    def validate_with_meanings(self) -> ResponseModel:
+        """
+        Validate the phrase and every one of its meanings.
+        """
+        validation_response = self.validate()
+        if not validation_response.success:
+            return validation_response
+
+        for meaning in self.meanings or []:
+            validation_response = meaning.validation()
+            if not validation_response.success:
+                return validation_response
+
+        return ResponseModel(success=True, message="Phrase validated successfully")
+
+    def build_document(self, keep_create_date: bool = False) -> dict:
+        """
+        Build the complete MongoDB document of a new phrase, meanings embedded.
+        The phrase and meaning ids are assigned here (client side) and duplicated meanings
+        (same meaning and tone) are dropped, so the phrase can be written with a single insert.
+        """
+        phrase_id = ObjectId()
+        self.id = str(phrase_id)
+        if not (keep_create_date and self.create_date):
+            self.create_date = datetime.datetime.now()
+
+        meanings = []
+        seen = set()
+        for meaning in self.meanings or []:
+            key = (meaning.meaning.strip().lower(), meaning.tone)
+            if key in seen:
+                continue
+            seen.add(key)
+
+            meaning.id = str(ObjectId())
+            meaning.phrase_id = self.id
+            meaning.like_count = 0
+            meaning.create_date = self.create_date
+            meanings.append(meaning)
+        self.meanings = meanings
+
+        document = self.dict(exclude={"id": True, "meanings": {"__all__": {"is_liked_by_user"}}})
+        document["_id"] = phrase_id
+        document["text_lower"] = self.text.lower()
+        return document
+
+    @staticmethod
+    def attach_votes(phrases: list) -> list:
+        """
+        Fill the vote fields of every meaning of the given phrases in one batch.
+        """
+        Meaning.attach_votes([meaning for phrase in phrases for meaning in getattr(phrase, "meanings", None) or []])
+        return phrases
+
+    @staticmethod
+    async def attach_votes_async(phrases: list) -> list:
+        """
+        Async version of attach_votes.
+        """
+        await Meaning.attach_votes_async([meaning for phrase in phrases for meaning in getattr(phrase, "meanings", None) or []])
+        return phrases
+
     @staticmethod
     def Phrase_viewed(phrase_id: str) -> ResponseModel:
         """
         Increment the view count of the phrase.
+        With the view buffer enabled the view is only counted in memory (written later in a batch)
+        and the phrase is not reloaded.
         """
         try:
+            if view_buffer.enabled:
+                view_buffer.add(str(ObjectId(phrase_id)))
+                return ResponseModel(success=True, message="Phrase viewed successfully", data={"id": phrase_id})
+
             db = get_db()
             data_from_db = db["phrases"].find_one_and_update({"_id": ObjectId(phrase_id)}, {
                                                              "$inc": {"views": 1}}, return_document=pymongo.ReturnDocument.AFTER)
+            if not data_from_db:
+                return ResponseModel(success=False, message="Phrase not found!")
+
+            Tag.add_views({phrase_id: 1})
+            rankings.record_views({phrase_id: 1})
 
-            return ResponseModel(success=True, message="Phrase viewed successfully", data=Phrase.convert_mongo_to_phrase(data_from_db))
+            phrase = Phrase.convert_mongo_to_phrase(data_from_db)
+            Phrase.attach_votes([phrase])
+
+            return ResponseModel(success=True, message="Phrase viewed successfully", data=phrase)
 
         except Exception as e:
             my_logger.error(f"Error viewing phrase {phrase_id}: {e}")
             return ResponseModel(success=False, message=str(e))
 
     @staticmethod
-    def get_phrase_by_id(phrase_id: str) -> ResponseModel:
+    def get_phrase_by_id(phrase_id: str, fields: str = "", include: str = "meanings") -> ResponseModel:
         """
         Retrieve a phrase by ID from the database.
+        With include="" only the summary fields listed in fields (all of them by default) are read,
+        see build_projection.
         """
         try:
-            db = get_db()
-            data_from_db = db["phrases"].find_one({"_id": ObjectId(phrase_id)})
+            requested_fields, include_meanings = Phrase.parse_fields(fields, include)
+            cache_key = response_cache.key("phrase", {"id": phrase_id, "fields": requested_fields, "meanings": include_meanings}, phrase_id=phrase_id)
+            cached = response_cache.get(cache_key)
+            if cached is not None:
+                phrase = Phrase.construct_trusted(cached) if include_meanings else PhraseSummary.construct_trusted(cached)
+                Phrase.attach_votes([phrase])
+                return ResponseModel(success=True, data=phrase)
+
+            db = get_read_db()
+            data_from_db = db["phrases"].find_one({"_id": ObjectId(phrase_id)}, Phrase.build_projection(requested_fields, include_meanings))
 
             # Check if the phrase exists in the database
             if not data_from_db:
                 return ResponseModel(success=False, message="Phrase not found!")
 
-            return ResponseModel(success=True, data=Phrase.convert_mongo_to_phrase(data_from_db))
+            phrase = Phrase.convert_mongo_to_phrase(data_from_db) if include_meanings else PhraseSummary.convert_mongo_to_summary(data_from_db)
+            response_cache.set(cache_key, phrase.dict())
+            Phrase.attach_votes([phrase])
+
+            return ResponseModel(success=True, data=phrase)
+
+        except Exception as e:
+            my_logger.error(f"Error retrieving phrase {phrase_id}: {e}")
+            return ResponseModel(success=False, message=str(e))
+
+    @staticmethod
+    async def get_phrase_by_id_async(phrase_id: str, fields: str = "", include: str = "meanings") -> ResponseModel:
+        """
+        Async version of get_phrase_by_id.
+        """
+        try:
+            requested_fields, include_meanings = Phrase.parse_fields(fields, include)
+            cache_key = await response_cache.key_async("phrase", {"id": phrase_id, "fields": requested_fields, "meanings": include_meanings}, phrase_id=phrase_id)
+            cached = await response_cache.get_async(cache_key)
+            if cached is not None:
+                phrase = Phrase.construct_trusted(cached) if include_meanings else PhraseSummary.construct_trusted(cached)
+                await Phrase.attach_votes_async([phrase])
+                return ResponseModel(success=True, data=phrase)
+
+            db = get_async_read_db()
+            data_from_db = await db["phrases"].find_one({"_id": ObjectId(phrase_id)}, Phrase.build_projection(requested_fields, include_meanings))
+
+            # Check if the phrase exists in the database
+            if not data_from_db:
+                return ResponseModel(success=False, message="Phrase not found!")
+
+            phrase = Phrase.convert_mongo_to_phrase(data_from_db) if include_meanings else PhraseSummary.convert_mongo_to_summary(data_from_db)
+            await response_cache.set_async(cache_key, phrase.dict())
+            await Phrase.attach_votes_async([phrase])
+
+            return ResponseModel(success=True, data=phrase)
 
         except Exception as e:
             my_logger.error(f"Error retrieving phrase {phrase_id}: {e}")
@@ -76,7 +207,7 @@ class Phrase(Base):
         Retrieve a phrase by text from the database.
         """
         try:
-            db = get_db()
+            db = get_read_db()
             data_from_db = db["phrases"].find_one({"text": text})
 
             # Check if the phrase exists in the database
@@ -93,39 +224,34 @@ class Phrase(Base):
     def create(self) -> ResponseModel:
         """
         Save the phrase to the database.
+        The phrase is written with its meanings in a single insert; the unique index on text
+        rejects a phrase that already exists, so there is no lookup before.
+        A phrase with an invalid meaning is rejected, as bulk_import does.
         """
-        validation_response = self.validate()
+        validation_response = self.validate_with_meanings()
         if not validation_response.success:
             return validation_response
 
-        # Check if the phrase already exists in the database
-        existing_phrase = Phrase.get_phrase_by_text(self.text)
-
-        if existing_phrase.success:
-            return ResponseModel(success=False, message="Phrase already exists in the database")
-
         try:
-            """
-            to save the meanings, we need first to save the phrase
-            and then use the phrase ID to save the meanings.
-            """
-            meanings = self.meanings
-
-            self.meanings = []  # Clear meanings to avoid saving them with the phrase
-            self.create_date = datetime.datetime.now()
+            document = self.build_document()
 
             db = get_db()
-            result = db["phrases"].insert_one(self.dict(exclude={"id"}))
+            db["phrases"].insert_one(document)
+
+            response_cache.invalidate()
+            Tag.apply_phrase_changes([(None, document)])
 
-            self.id = str(result.inserted_id)
+            if search_index.enabled:
+                search_index.index_document(document)
 
-            if meanings:
-                meanings_result = Meaning.create_meanings(meanings, self.id)
-                phrase_with_meanings = Phrase.get_phrase_by_id(self.id)
-                return ResponseModel(success=True, message=f"Phrase saved successfully. {meanings_result.message}", data=phrase_with_meanings.data)
+            if self.meanings:
+                return ResponseModel(success=True, message=f"Phrase saved successfully. {len(self.meanings)} meanings added successfully", data=self)
 
             return ResponseModel(success=True, message="Phrase saved successfully", data=self)
 
+        except DuplicateKeyError:
+            return ResponseModel(success=False, message="Phrase already exists in the database")
+
         except Exception as e:
             my_logger.error(f"Error saving phrase '{self.text}': {e}")
             return ResponseModel(success=False, message=str(e))
@@ -140,13 +266,32 @@ class Phrase(Base):
             return validation_response
 
         try:
+            changes = {**self.dict(exclude={"id", "create_date", "views", "meanings"}), "text_lower": self.text.lower()} # Exclude fields that should not be updated
+
+            # the previous tags are needed by the tag facets, the updated document is built from them
             db = get_db()
-            data_from_db = db["phrases"].find_one_and_update(
+            previous_data = db["phrases"].find_one_and_update(
                 {"_id": ObjectId(phrase_id)},
-                {"$set": self.dict(exclude={"id", "create_date", "views", "meanings"})}, # Exclude fields that should not be updated
-                return_document=pymongo.ReturnDocument.AFTER)
+                {"$set": changes},
+                return_document=pymongo.ReturnDocument.BEFORE)
             
-            return ResponseModel(success=True, message="Phrase updated successfully", data=Phrase.convert_mongo_to_phrase(data_from_db))
+            if not previous_data:
+                return ResponseModel(success=False, message="Phrase not found!")
+
+            data_from_db = {**previous_data, **changes}
+            response_cache.invalidate()
+            Tag.apply_phrase_changes([(previous_data, data_from_db)])
+
+            if search_index.enabled:
+                search_index.index_document(data_from_db)
+
+            phrase = Phrase.convert_mongo_to_phrase(data_from_db)
+            Phrase.attach_votes([phrase])
+
+            return ResponseModel(success=True, message="Phrase updated successfully", data=phrase)
+
+        except DuplicateKeyError:
+            return ResponseModel(success=False, message="Phrase already exists in the database")
 
         except Exception as e:
             my_logger.error(f"Error updating phrase {phrase_id}: {e}")
@@ -159,7 +304,13 @@ class Phrase(Base):
         """
         try:
             db = get_db()
-            db["phrases"].delete_one({"_id": ObjectId(phrase_id)})
+            data_from_db = db["phrases"].find_one_and_delete({"_id": ObjectId(phrase_id)}, {"tags": 1, "views": 1})
+            response_cache.invalidate()
+            Tag.apply_phrase_changes([(data_from_db, None)])
+
+            if search_index.enabled:
+                search_index.remove_phrase(phrase_id)
+
             return ResponseModel(success=True, message="Phrase deleted successfully")
 
         except Exception as e:
@@ -167,90 +318,551 @@ class Phrase(Base):
             return ResponseModel(success=False, message=str(e))
 
     @staticmethod
-    def get_phrases(pageIndex: int = 0, pageSize: int = 10, pageOrder: SortEnum = SortEnum.newest, searchText: str = "", tags: str = "") -> ResponseModel:
+    def build_search_query(searchText: str, searchMode: SearchModeEnum = SearchModeEnum.text) -> dict:
+        """
+        Build the Mongo filter for a search text.
+            text: full-text search on the text index (text, suggested_response and meanings).
+            prefix: phrases starting with the search text, served by the text_lower index.
+            regex: case-insensitive substring match, the input is escaped so it is never run as a pattern.
+        """
+        searchText = searchText.strip()
+
+        match searchMode:
+            case SearchModeEnum.prefix:
+                return {"text_lower": {"$regex": "^" + re.escape(searchText.lower())}}
+            case SearchModeEnum.regex:
+                return {"text": {"$regex": re.escape(searchText), "$options": "i"}}
+            case _:
+                return {"$text": {"$search": searchText}}
+
+    @staticmethod
+    def encode_cursor(pageOrder: SortEnum, document: dict, order_by: list) -> str:
+        """
+        Build the opaque cursor pointing after `document`: the page order, its sort key and its _id.
+        """
+        field = order_by[0][0]
+        payload = json_util.dumps({"order": pageOrder.value, "key": document.get(field), "id": document["_id"]})
+        return base64.urlsafe_b64encode(payload.encode()).decode()
+
+    @staticmethod
+    def decode_cursor(cursor: str) -> dict:
+        """
+        Read a cursor built by encode_cursor. Raises ValueError for a malformed cursor.
+        """
+        try:
+            payload = json_util.loads(base64.urlsafe_b64decode(cursor.encode()))
+            SortEnum(payload["order"])
+            return payload
+        except Exception:
+            raise ValueError("Invalid cursor")
+
+    @staticmethod
+    def build_cursor_query(cursor: dict, order_by: list) -> dict:
+        """
+        Filter for the documents after the cursor position (keyset pagination).
+        order_by is the sort of the page: the sort field, then _id as tie-breaker if the field is not unique.
+        """
+        field, direction = order_by[0]
+        operator = "$gt" if direction == pymongo.ASCENDING else "$lt"
+
+        if len(order_by) == 1:
+            return {field: {operator: cursor["key"]}}
+
+        return {"$or": [
+            {field: {operator: cursor["key"]}},
+            {field: cursor["key"], "_id": {operator: cursor["id"]}}
+        ]}
+
+    @staticmethod
+    def parse_fields(fields: str = "", include: str = "") -> tuple:
+        """
+        Read the fields and include parameters: the requested summary fields (all of them when empty)
+        and whether the meanings are included. Raises ValueError for an unknown field.
+        """
+        requested_fields = sorted({field.strip() for field in fields.split(",") if field.strip()}) or SUMMARY_FIELDS
+        unknown_fields = set(requested_fields) - set(SUMMARY_FIELDS)
+        if unknown_fields:
+            raise ValueError(f"Unknown fields: {', '.join(sorted(unknown_fields))}")
+
+        include_list = {item.strip() for item in include.split(",") if item.strip()}
+        if include_list - {"meanings"}:
+            raise ValueError(f"Unknown include: {', '.join(sorted(include_list - {'meanings'}))}")
+
+        return requested_fields, "meanings" in include_list
+
+    @staticmethod
+    def build_projection(requested_fields: list, include_meanings: bool) -> Optional[dict]:
+        """
+        Mongo projection of a phrase read. None (the whole document) when the meanings are included,
+        otherwise only the requested summary fields; meaning_count is computed by the database with $size
+        so the meanings never leave it.
+        """
+        if include_meanings:
+            return None
+
+        projection = {field: 1 for field in requested_fields}
+        if "meaning_count" in projection:
+            projection["meaning_count"] = {"$size": {"$ifNull": ["$meanings", []]}}
+        return projection
+
+    @staticmethod
+    def build_list_plan(pageIndex: int = 0, pageSize: int = 10, pageOrder: Optional[SortEnum] = None, searchText: str = "", tags: str = "",
+                        searchMode: SearchModeEnum = SearchModeEnum.text, cursor: str = "", fields: str = "", include: str = "",
+                        tagMode: TagModeEnum = TagModeEnum.any, trending_ids: Optional[list] = None) -> dict:
+        """
+        Work out the query of a phrases page (filter, projection, sort, skip and limit) without running it,
+        so the sync and the async data layer share it. Raises ValueError for an unusable cursor or field.
+        trending_ids is the trending ranking when the caller already read it (the async path reads it
+        with the async client), otherwise it's read here when the trending order needs it.
+        """
+        requested_fields, include_meanings = Phrase.parse_fields(fields, include)
+        projection = Phrase.build_projection(requested_fields, include_meanings)
+
+        cursor_position = Phrase.decode_cursor(cursor) if cursor else None
+        if cursor_position:
+            if pageOrder is None:
+                pageOrder = SortEnum(cursor_position["order"])
+            elif pageOrder != SortEnum(cursor_position["order"]):
+                raise ValueError("Cursor does not match the page order")
+            if pageOrder in (SortEnum.relevance, SortEnum.trending):
+                raise ValueError(f"{pageOrder.value} order does not support cursors")
+
+        # Create a query based on the search text and tags
+        query = {}
+        tag_list = [tag.strip().lower() for tag in tags.split(",") if tag.strip()]
+
+        ranked_ids = None
+        if searchText.strip():
+            if search_index.enabled and searchMode != SearchModeEnum.regex:
+                ranked_ids = search_index.search(searchText, prefix=searchMode == SearchModeEnum.prefix, tags=tag_list,
+                                                 all_tags=tagMode == TagModeEnum.all)
+                query["_id"] = {"$in": [ObjectId(phrase_id) for phrase_id in ranked_ids]}
+            else:
+                query.update(Phrase.build_search_query(searchText, searchMode))
+
+        # both are served by the multikey tags index
+        if tag_list:
+            query["tags"] = {"$all" if tagMode == TagModeEnum.all else "$in": tag_list}
+
+        if pageOrder is None:
+            pageOrder = SortEnum.relevance if "$text" in query or ranked_ids is not None else SortEnum.newest
+
+        if pageOrder == SortEnum.relevance and ranked_ids is not None:
+            # the index already ranked the matches, only the page itself is read
+            page_ids = ranked_ids[pageIndex * pageSize:(pageIndex + 1) * pageSize]
+            return Phrase.build_ids_plan(page_ids, projection, pageOrder, pageSize, include_meanings)
+
+        if pageOrder == SortEnum.trending:
+            if trending_ids is None:
+                trending_ids = rankings.get_ranking(RankingEnum.trending.value)
+            if trending_ids and not query:
+                page_ids = trending_ids[pageIndex * pageSize:(pageIndex + 1) * pageSize]
+                return Phrase.build_ids_plan(page_ids, projection, pageOrder, pageSize, include_meanings)
+            if trending_ids:
+                # only the ranked phrases (at most top_size) are filtered, then paged in rank order
+                plan = Phrase.build_ids_plan(trending_ids, projection, pageOrder, pageSize, include_meanings)
+                plan.update(query={"$and": [query, plan["query"]]}, page_ids=None, ranked_ids=trending_ids, pageIndex=pageIndex)
+                return plan
+            pageOrder = SortEnum.most_viewed  # nothing ranked yet
+
+        # text is unique, the other sort fields need _id as tie-breaker to give a stable keyset
+        order_by = [("create_date", pymongo.DESCENDING), ("_id", pymongo.DESCENDING)]
+        match pageOrder:
+            case SortEnum.A_Z:
+                order_by = [("text", pymongo.ASCENDING)]
+            case SortEnum.Z_A:
+                order_by = [("text", pymongo.DESCENDING)]
+            case SortEnum.oldest:
+                order_by = [("create_date", pymongo.ASCENDING), ("_id", pymongo.ASCENDING)]
+            case SortEnum.newest:
+                order_by = [("create_date", pymongo.DESCENDING), ("_id", pymongo.DESCENDING)]
+            case SortEnum.most_viewed:
+                order_by = [("views", pymongo.DESCENDING), ("_id", pymongo.DESCENDING)]
+            case SortEnum.relevance if "$text" in query:
+                projection = {**(projection or {}), "score": {"$meta": "textScore"}}
+                order_by = [("score", {"$meta": "textScore"})]
+            case SortEnum.relevance:
+                pageOrder = SortEnum.newest
+
+        # fields read only for the query (text score, sort key of the next cursor), removed from the response
+        injected_fields = ["score"] if order_by[0][0] == "score" else []
+        if projection is not None and order_by[0][0] not in projection:
+            projection[order_by[0][0]] = 1
+            injected_fields.append(order_by[0][0])
+
+        skip = pageIndex * pageSize
+        if cursor_position:
+            query = {"$and": [query, Phrase.build_cursor_query(cursor_position, order_by)]}
+            skip = 0
+
+        return {"query": query, "projection": projection, "order_by": order_by, "skip": skip, "limit": pageSize,
+                "page_ids": None, "pageOrder": pageOrder, "pageSize": pageSize, "summary": not include_meanings,
+                "injected_fields": injected_fields}
+
+    @staticmethod
+    def build_ids_plan(page_ids: list, projection: Optional[dict], pageOrder: SortEnum, pageSize: int, include_meanings: bool) -> dict:
+        """
+        Page plan reading already ranked phrase ids (search index, rankings); the page keeps their order.
+        """
+        return {"query": {"_id": {"$in": [ObjectId(phrase_id) for phrase_id in page_ids]}}, "projection": projection,
+                "order_by": None, "skip": 0, "limit": 0, "page_ids": page_ids, "pageOrder": pageOrder, "pageSize": pageSize,
+                "summary": not include_meanings, "injected_fields": []}
+
+    @staticmethod
+    def find_list_page(collection, plan: dict):
+        """
+        Start the find of a page plan on a (sync or async) phrases collection.
+        """
+        cursor = collection.find(plan["query"], plan["projection"])
+        if plan["order_by"]:
+            cursor = cursor.sort(plan["order_by"])
+        return cursor.skip(plan["skip"]).limit(plan["limit"])
+
+    @staticmethod
+    def build_list_response(plan: dict, data_from_db: list) -> ResponseModel:
+        """
+        Turn the documents of a page plan into the response (without the per-user vote fields):
+        full phrases when the meanings were asked for, summaries otherwise.
+        """
+        if plan["page_ids"] is not None:
+            documents = {str(phrase["_id"]): phrase for phrase in data_from_db}
+            data_from_db = [documents[phrase_id] for phrase_id in plan["page_ids"] if phrase_id in documents]
+
+        if plan.get("ranked_ids") is not None:
+            rank = {phrase_id: position for position, phrase_id in enumerate(plan["ranked_ids"])}
+            data_from_db = sorted(data_from_db, key=lambda phrase: rank[str(phrase["_id"])])
+            data_from_db = data_from_db[plan["pageIndex"] * plan["pageSize"]:(plan["pageIndex"] + 1) * plan["pageSize"]]
+
+        # the documents keep the injected fields for the cursor below, the models don't get them
+        documents = data_from_db
+        if plan.get("injected_fields"):
+            documents = [{key: value for key, value in phrase.items() if key not in plan["injected_fields"]} for phrase in data_from_db]
+
+        if plan["summary"]:
+            phrases = [PhraseSummary.convert_mongo_to_summary(phrase) for phrase in documents]
+        else:
+            phrases = [Phrase.convert_mongo_to_phrase(phrase) for phrase in documents]
+
+        next_cursor = None
+        if plan["order_by"] and plan["pageOrder"] not in (SortEnum.relevance, SortEnum.trending) and data_from_db and len(data_from_db) == plan["pageSize"]:
+            next_cursor = Phrase.encode_cursor(plan["pageOrder"], data_from_db[-1], plan["order_by"])
+
+        return ResponseModel(success=True, data=phrases, next_cursor=next_cursor)
+
+    @staticmethod
+    def list_cache_topics(requested_fields: list, include_meanings: bool, searchText: str = "") -> tuple:
+        """
+        What a cached page shows of its phrases that a change of one of them can touch (see ResponseCache.TOPICS).
+        """
+        topics = []
+        if include_meanings:
+            topics.append("meanings")
+        elif "meaning_count" in requested_fields:
+            topics.append("meaning_count")
+        if searchText.strip():
+            topics.append("search")
+        return tuple(topics)
+
+    @staticmethod
+    def list_cache_params(pageIndex: int, pageSize: int, pageOrder: Optional[SortEnum], searchText: str, tags: str,
+                          searchMode: SearchModeEnum, cursor: str, fields: str = "", include: str = "",
+                          tagMode: TagModeEnum = TagModeEnum.any) -> dict:
+        """
+        Normalized parameters of a phrases page, used as its cache key.
+        """
+        return {
+            "page": 0 if cursor else pageIndex,
+            "size": pageSize,
+            "order": pageOrder.value if pageOrder else "",
+            "search": searchText.strip().lower(),
+            "mode": searchMode.value if searchText.strip() else "",
+            "tags": sorted({tag.strip().lower() for tag in tags.split(",") if tag.strip()}),
+            "tag_mode": tagMode.value,
+            "cursor": cursor,
+            "fields": sorted({field.strip() for field in fields.split(",") if field.strip()}),
+            "include": sorted({item.strip() for item in include.split(",") if item.strip()}),
+        }
+
+    @staticmethod
+    def cache_list(cache_key: str, result: ResponseModel):
+        response_cache.set(cache_key, Phrase.cached_list_value(result))
+
+    @staticmethod
+    async def cache_list_async(cache_key: str, result: ResponseModel):
+        await response_cache.set_async(cache_key, Phrase.cached_list_value(result))
+
+    @staticmethod
+    def cached_list_value(result: ResponseModel) -> dict:
+        return {"data": [phrase.dict() for phrase in result.data], "next_cursor": result.next_cursor,
+                "summary": all(isinstance(phrase, PhraseSummary) for phrase in result.data)}
+
+    @staticmethod
+    def load_cached_list(cached: Optional[dict]) -> Optional[ResponseModel]:
+        if cached is None:
+            return None
+        model = PhraseSummary if cached.get("summary") else Phrase
+        return ResponseModel(success=True, data=[model.construct_trusted(phrase) for phrase in cached["data"]], next_cursor=cached["next_cursor"])
+
+    @staticmethod
+    def get_phrases(pageIndex: int = 0, pageSize: int = 10, pageOrder: Optional[SortEnum] = None, searchText: str = "", tags: str = "",
+                    searchMode: SearchModeEnum = SearchModeEnum.text, cursor: str = "", fields: str = "", include: str = "",
+                    tagMode: TagModeEnum = TagModeEnum.any) -> ResponseModel:
         """
         Retrieve all phrases from the database.
+        Without pageOrder, searches are sorted by relevance and everything else by newest.
+        When the in-process search index is enabled, text and prefix searches are answered by it
+        and only the matching phrases are read from the database (by _id).
+
+        Pages are either selected by pageIndex (skip/limit) or, when a cursor is given, by keyset:
+        the cursor returned as next_cursor holds the sort key and _id of the last phrase of the previous page.
+        Relevance and trending ordered pages only support pageIndex. Trending pages follow the ranking
+        precomputed by the rankings job (most viewed until it ran once).
+
+        The phrases are summaries (PhraseSummary) read with a projection: fields picks the summary fields
+        (text, suggested_response, tags, views, create_date, meaning_count; all by default).
+        Full phrases with their meanings are only read with include="meanings".
+
+        tags is a comma separated list; with tagMode any a phrase needs one of them (OR), with all every one (AND).
         """
         try:
-            # Create a query based on the search text and tags
-            query = {}
-            
-            if searchText:
-                query["text"] = {
-                    "$regex": searchText.strip().lower(), "$options": "i"}
-                
-            if tags:
-                query["tags"] = {"$in": [tag.strip().lower() for tag in tags.split(",")]}
-
-            order_by = ("create_date", pymongo.DESCENDING)
-            match pageOrder:
-                case SortEnum.A_Z:
-                    order_by = ("text", pymongo.ASCENDING)
-                case SortEnum.Z_A:
-                    order_by = ("text", pymongo.DESCENDING)
-                case SortEnum.oldest:
-                    order_by = ("create_date", pymongo.ASCENDING)
-                case SortEnum.newest:
-                    order_by = ("create_date", pymongo.DESCENDING)
-                case SortEnum.most_viewed:
-                    order_by = ("views", pymongo.DESCENDING)
+            cache_key = response_cache.key("phrases", Phrase.list_cache_params(pageIndex, pageSize, pageOrder, searchText, tags, searchMode, cursor, fields, include, tagMode),
+                                           topics=Phrase.list_cache_topics(*Phrase.parse_fields(fields, include), searchText))
+            result = Phrase.load_cached_list(response_cache.get(cache_key))
 
-            db = get_db()
-            data_from_db = db["phrases"].find(query).sort(order_by[0], order_by[1]).skip(pageIndex * pageSize).limit(pageSize)
+            if result is None:
+                plan = Phrase.build_list_plan(pageIndex, pageSize, pageOrder, searchText, tags, searchMode, cursor, fields, include, tagMode)
 
-            phrases: list[Phrase] = [Phrase.convert_mongo_to_phrase(phrase) for phrase in data_from_db]
+                db = get_read_db()
+                data_from_db = list(Phrase.find_list_page(db["phrases"], plan))
 
-            return ResponseModel(success=True, data=phrases)
+                result = Phrase.build_list_response(plan, data_from_db)
+                Phrase.cache_list(cache_key, result)
+
+            Phrase.attach_votes(result.data)
+
+            return result
 
         except Exception as e:
             my_logger.error(f"Error retrieving phrases: {e}")
             return ResponseModel(success=False, message=str(e))
 
     @staticmethod
-    def search_phrases_by_tag(tag: str) -> ResponseModel:
+    async def get_phrases_async(pageIndex: int = 0, pageSize: int = 10, pageOrder: Optional[SortEnum] = None, searchText: str = "", tags: str = "",
+                                searchMode: SearchModeEnum = SearchModeEnum.text, cursor: str = "", fields: str = "", include: str = "",
+                                tagMode: TagModeEnum = TagModeEnum.any) -> ResponseModel:
         """
-        Search for phrases by tag in the database.
+        Async version of get_phrases.
         """
         try:
-            db = get_db()
-            data_from_db = db["phrases"].find({"tags": tag})
+            cache_key = await response_cache.key_async("phrases", Phrase.list_cache_params(pageIndex, pageSize, pageOrder, searchText, tags, searchMode, cursor, fields, include, tagMode),
+                                                       topics=Phrase.list_cache_topics(*Phrase.parse_fields(fields, include), searchText))
+            result = Phrase.load_cached_list(await response_cache.get_async(cache_key))
 
-            phrases = [Phrase.convert_mongo_to_phrase(
-                phrase) for phrase in data_from_db]
-            return ResponseModel(success=True, data=phrases)
+            if result is None:
+                trending_ids = await rankings.get_ranking_async(RankingEnum.trending.value) if pageOrder == SortEnum.trending else None
+                plan = Phrase.build_list_plan(pageIndex, pageSize, pageOrder, searchText, tags, searchMode, cursor, fields, include, tagMode,
+                                              trending_ids=trending_ids)
+
+                db = get_async_read_db()
+                data_from_db = await Phrase.find_list_page(db["phrases"], plan).to_list()
+
+                result = Phrase.build_list_response(plan, data_from_db)
+                await Phrase.cache_list_async(cache_key, result)
+
+            await Phrase.attach_votes_async(result.data)
+
+            return result
 
         except Exception as e:
-            my_logger.error(f"Error searching phrases by tag '{tag}': {e}")
+            my_logger.error(f"Error retrieving phrases: {e}")
             return ResponseModel(success=False, message=str(e))
 
     @staticmethod
-    def search_phrases(text: str) -> ResponseModel:
+    def get_top_phrases(ranking: RankingEnum = RankingEnum.trending, pageIndex: int = 0, pageSize: int = 10,
+                        fields: str = "", include: str = "") -> ResponseModel:
+        """
+        Retrieve a page of a precomputed ranking (trending or all-time most viewed).
+        Only the phrases of the page are read, by _id.
+        """
+        try:
+            requested_fields, include_meanings = Phrase.parse_fields(fields, include)
+            cache_key = response_cache.key("top", {"ranking": ranking.value, "page": pageIndex, "size": pageSize,
+                                                   "fields": requested_fields, "meanings": include_meanings},
+                                           topics=Phrase.list_cache_topics(requested_fields, include_meanings))
+            result = Phrase.load_cached_list(response_cache.get(cache_key))
+
+            if result is None:
+                page_ids = rankings.get_ranking(ranking.value)[pageIndex * pageSize:(pageIndex + 1) * pageSize]
+                plan = Phrase.build_ids_plan(page_ids, Phrase.build_projection(requested_fields, include_meanings),
+                                             SortEnum(ranking.value), pageSize, include_meanings)
+
+                db = get_read_db()
+                data_from_db = list(Phrase.find_list_page(db["phrases"], plan)) if page_ids else []
+
+                result = Phrase.build_list_response(plan, data_from_db)
+                Phrase.cache_list(cache_key, result)
+
+            Phrase.attach_votes(result.data)
+
+            return result
+
+        except Exception as e:
+            my_logger.error(f"Error retrieving {ranking.value} phrases: {e}")
+            return ResponseModel(success=False, message=str(e))
+
+    @staticmethod
+    def search_phrases_by_tag(tag: str, pageIndex: int = 0, pageSize: int = 10, pageOrder: Optional[SortEnum] = None, cursor: str = "",
+                              fields: str = "", include: str = "meanings") -> ResponseModel:
+        """
+        Search for phrases by tag in the database, one page at a time (see get_phrases).
+        """
+        return Phrase.get_phrases(pageIndex=pageIndex, pageSize=pageSize, pageOrder=pageOrder, tags=tag, cursor=cursor,
+                                  fields=fields, include=include)
+
+    @staticmethod
+    def search_phrases(text: str, searchMode: SearchModeEnum = SearchModeEnum.text) -> ResponseModel:
         """
         Search for phrases by text in the database.
         """
         try:
-            db = get_db()
-            data_from_db = db["phrases"].find(
-                {"text": {"$regex": text, "$options": "i"}})
+            db = get_read_db()
+            data_from_db = db["phrases"].find(Phrase.build_search_query(text, searchMode))
 
             phrases = [Phrase.convert_mongo_to_phrase(
                 phrase) for phrase in data_from_db]
+            Phrase.attach_votes(phrases)
             return ResponseModel(success=True, data=phrases)
 
         except Exception as e:
             my_logger.error(f"Error searching phrases by text '{text}': {e}")
             return ResponseModel(success=False, message=str(e))
 
+    @staticmethod
+    def parse_import_data(raw) -> list:
+        """
+        Read phrases to import from a JSON array (or {"phrases": [...]}) or from NDJSON (one phrase per line).
+        """
+        if isinstance(raw, bytes):
+            raw = raw.decode("utf-8-sig")
+
+        try:
+            data = json.loads(raw)
+            if isinstance(data, dict):
+                data = data.get("phrases", [data])
+            return data
+        except json.JSONDecodeError:
+            return [json.loads(line) for line in raw.splitlines() if line.strip()]
+
+    @staticmethod
+    def bulk_import(items: list, batch_size: int = 1000, first_index: int = 0) -> ResponseModel:
+        """
+        Import many phrases at once.
+        Every batch is validated in memory, deduplicated by text against itself and against the database
+        with a single $in query, then written with one unordered insert_many (meanings embedded).
+        Returns a report with the status of every item: created, duplicate, invalid or failed.
+        """
+        report = {"created": 0, "duplicate": 0, "invalid": 0, "failed": 0, "items": []}
+
+        try:
+            db = get_db()
+
+            for start in range(0, len(items), batch_size):
+                batch = items[start:start + batch_size]
+                documents = []  # (item report, document)
+                texts = set()
+
+                for number, item in enumerate(batch, start=first_index + start):
+                    item_report = {"index": number, "text": item.get("text") if isinstance(item, dict) else None}
+                    report["items"].append(item_report)
+
+                    try:
+                        phrase = item if isinstance(item, Phrase) else Phrase(**item)
+                    except (ValidationError, TypeError) as e:
+                        item_report.update(status="invalid", message=str(e))
+                        continue
+
+                    item_report["text"] = phrase.text
+                    validation_response = phrase.validate_with_meanings()
+                    if not validation_response.success:
+                        item_report.update(status="invalid", message=validation_response.message)
+                        continue
+
+                    if phrase.text in texts:
+                        item_report.update(status="duplicate", message="Phrase appears more than once in the import")
+                        continue
+                    texts.add(phrase.text)
+
+                    documents.append((item_report, phrase.build_document(keep_create_date=True)))
+
+                existing_texts = {phrase["text"] for phrase in db["phrases"].find({"text": {"$in": list(texts)}}, {"text": 1})}
+                new_documents = []
+                for item_report, document in documents:
+                    if document["text"] in existing_texts:
+                        item_report.update(status="duplicate", message="Phrase already exists in the database")
+                    else:
+                        item_report.update(status="created", id=str(document["_id"]))
+                        new_documents.append((item_report, document))
+
+                if not new_documents:
+                    continue
+
+                try:
+                    db["phrases"].insert_many([document for _, document in new_documents], ordered=False)
+                except BulkWriteError as e:
+                    # someone else inserted the same text meanwhile (unique index) or the write failed
+                    for error in e.details.get("writeErrors", []):
+                        item_report = new_documents[error["index"]][0]
+                        item_report.pop("id", None)
+                        if error.get("code") == 11000:
+                            item_report.update(status="duplicate", message="Phrase already exists in the database")
+                        else:
+                            item_report.update(status="failed", message=error.get("errmsg"))
+
+                Tag.apply_phrase_changes([(None, document) for item_report, document in new_documents if item_report["status"] == "created"])
+
+                if search_index.enabled:
+                    for item_report, document in new_documents:
+                        if item_report["status"] == "created":
+                            search_index.index_document(document)
+
+            for item_report in report["items"]:
+                report[item_report["status"]] += 1
+
+            if report["created"]:
+                response_cache.invalidate()
+
+            return ResponseModel(success=True, message=f"{report['created']} phrases imported", data=report)
+
+        except Exception as e:
+            my_logger.error(f"Error importing phrases: {e}")
+            return ResponseModel(success=False, message=str(e), data=report)
+
+    @staticmethod
+    def backfill_text_lower() -> ResponseModel:
+        """
+        Add the text_lower field (used by the prefix search) to phrases saved before it existed.
+        """
+        try:
+            db = get_db()
+            result = db["phrases"].update_many(
+                {"text_lower": {"$exists": False}},
+                [{"$set": {"text_lower": {"$toLower": "$text"}}}])
+
+            return ResponseModel(success=True, message=f"{result.modified_count} phrases updated")
+
+        except Exception as e:
+            my_logger.error(f"Error filling text_lower: {e}")
+            return ResponseModel(success=False, message=str(e))
+
     @classmethod
     def convert_mongo_to_phrase(self, data: dict):
         """
             Convert MongoDB doc to Pydantic model
+            Built in pydantic-core without the tag normalization of __init__ (see construct_trusted).
             Args:
                 data (dict): The MongoDB document to convert.
             Returns:
                 Phrase: The converted Pydantic model.
         """
 
-        data = data.copy()
-        data["id"] = str(data.pop("_id"))
-        return self(**data)
+        return self.construct_trusted(data)
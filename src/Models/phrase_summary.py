@@ -0,0 +1,34 @@
+from typing import List, Optional
+from datalayer import Base
+
+
+class PhraseSummary(Base):
+    """
+    Slim version of a phrase for the lists, read with a projection and without its meanings.
+    Only the requested fields are filled, the others stay None.
+
+    schema:
+    - text: str - The phrase.
+    - suggested_response: str - The suggested response to the phrase.
+    - tags: List[str] - The tags associated with the phrase.
+    - views: int - The number of views for the phrase.
+    - meaning_count: int - The number of meanings of the phrase (computed by the database with $size).
+    """
+
+    text: Optional[str] = None
+    suggested_response: Optional[str] = None
+    tags: Optional[List[str]] = None
+    views: Optional[int] = None
+    meaning_count: Optional[int] = None
+
+    @classmethod
+    def convert_mongo_to_summary(self, data: dict):
+        """
+            Convert a projected MongoDB doc to the summary model (built in pydantic-core, see construct_trusted)
+            Args:
+                data (dict): The MongoDB document to convert.
+            Returns:
+                PhraseSummary: The converted Pydantic model.
+        """
+
+        return self.construct_trusted(data)
@@ -0,0 +1,142 @@
+import re
+from collections import defaultdict
+from bson import ObjectId
+from typing import Optional
+from pymongo import DESCENDING, ASCENDING, UpdateOne
+from datalayer import Base, ResponseModel, my_logger, get_db, get_read_db, response_cache
+
+class Tag(Base):
+    """
+    Tag class to represent a tag with the totals of its phrases.
+    Read from the tag_facets collection ({_id: tag, phrase_count, views}) which is kept up to date
+    incrementally by every phrase create/update/delete and by the view counter.
+
+    schema:
+        - tag: str - The tag.
+        - phrase_count: int - Number of phrases having the tag.
+        - views: int - Total views of the phrases having the tag.
+    """
+    tag: str
+    phrase_count: int = 0
+    views: int = 0
+
+    @staticmethod
+    def apply_phrase_changes(changes: list):
+        """
+        Update the facets for a list of (before, after) phrase documents (None for a created or deleted phrase).
+        Only tags and views of the documents are used.
+        """
+        deltas = defaultdict(lambda: [0, 0])  # tag -> [phrase_count, views]
+        for before, after in changes:
+            for document, sign in ((before, -1), (after, 1)):
+                if not document:
+                    continue
+                for tag in set(document.get("tags") or []):
+                    deltas[tag][0] += sign
+                    deltas[tag][1] += sign * (document.get("views") or 0)
+
+        deltas = {tag: delta for tag, delta in deltas.items() if delta != [0, 0]}
+        if not deltas:
+            return
+
+        try:
+            db = get_db()
+            db["tag_facets"].bulk_write(
+                [UpdateOne({"_id": tag}, {"$inc": {"phrase_count": phrase_count, "views": views}}, upsert=True)
+                 for tag, (phrase_count, views) in deltas.items()],
+                ordered=False)
+            db["tag_facets"].delete_many({"_id": {"$in": list(deltas)}, "phrase_count": {"$lte": 0}})
+
+        except Exception as e:
+            # the facets are derived data, `manage.py rebuild-tag-facets` repairs them
+            my_logger.error(f"Error updating tag facets of {len(deltas)} tags: {e}")
+
+    @staticmethod
+    def add_views(views_by_phrase: dict):
+        """
+        Add phrase views ({phrase_id: views}) to the totals of their tags. Registered as a view buffer listener.
+        """
+        try:
+            db = get_db()
+            views_by_tag = defaultdict(int)
+            data_from_db = db["phrases"].find({"_id": {"$in": [ObjectId(phrase_id) for phrase_id in views_by_phrase]}}, {"tags": 1})
+            for phrase in data_from_db:
+                for tag in set(phrase.get("tags") or []):
+                    views_by_tag[tag] += views_by_phrase[str(phrase["_id"])]
+
+            if views_by_tag:
+                db["tag_facets"].bulk_write(
+                    [UpdateOne({"_id": tag}, {"$inc": {"views": views}}) for tag, views in views_by_tag.items()], ordered=False)
+
+        except Exception as e:
+            my_logger.error(f"Error adding views to tag facets: {e}")
+
+    @staticmethod
+    def get_tags(pageIndex: int = 0, pageSize: int = 50, prefix: str = "") -> ResponseModel:
+        """
+        Retrieve the tags with their phrase count and total views, most used first.
+        prefix keeps only the tags starting with it.
+        """
+        try:
+            prefix = prefix.strip().lower()
+            cache_key = response_cache.key("tags", {"page": pageIndex, "size": pageSize, "prefix": prefix})
+            cached = response_cache.get(cache_key)
+            if cached is not None:
+                return ResponseModel(success=True, data=[Tag.construct_trusted(tag) for tag in cached])
+
+            query = {"_id": {"$regex": "^" + re.escape(prefix)}} if prefix else {}
+
+            db = get_read_db()
+            data_from_db = db["tag_facets"].find(query).sort([("phrase_count", DESCENDING), ("_id", ASCENDING)]) \
+                .skip(pageIndex * pageSize).limit(pageSize)
+
+            tags = [Tag.convert_mongo_to_tag(tag) for tag in data_from_db]
+            response_cache.set(cache_key, [tag.dict() for tag in tags])
+
+            return ResponseModel(success=True, data=tags)
+
+        except Exception as e:
+            my_logger.error(f"Error retrieving tags: {e}")
+            return ResponseModel(success=False, message=str(e))
+
+    @staticmethod
+    def rebuild() -> ResponseModel:
+        """
+        Recompute every facet from the phrases (replaces the tag_facets collection, its indexes are kept).
+        """
+        try:
+            db = get_db()
+            db["phrases"].aggregate([
+                {"$unwind": "$tags"},
+                {"$group": {"_id": "$tags", "phrase_count": {"$sum": 1}, "views": {"$sum": {"$ifNull": ["$views", 0]}}}},
+                {"$out": "tag_facets"},
+            ])
+            response_cache.invalidate()
+
+            return ResponseModel(success=True, message=f"{db['tag_facets'].estimated_document_count()} tags computed")
+
+        except Exception as e:
+            my_logger.error(f"Error rebuilding tag facets: {e}")
+            return ResponseModel(success=False, message=str(e))
+
+    @staticmethod
+    def ensure_facets() -> Optional[ResponseModel]:
+        """
+        Build the facets when there are phrases but no facets yet (databases created before them).
+        """
+        db = get_db()
+        if db["tag_facets"].estimated_document_count() == 0 and db["phrases"].estimated_document_count() > 0:
+            return Tag.rebuild()
+        return None
+
+    @classmethod
+    def convert_mongo_to_tag(self, data: dict):
+        """
+            Convert MongoDB doc to Pydantic model (built in pydantic-core, see construct_trusted)
+            Args:
+                data (dict): The tag_facets document to convert.
+            Returns:
+                Tag: The converted Pydantic model.
+        """
+
+        return self.model_validate({"tag": data["_id"], "phrase_count": data.get("phrase_count", 0), "views": data.get("views", 0)})
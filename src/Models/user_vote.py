@@ -1,7 +1,9 @@
 import datetime
+from collections import defaultdict
 from bson import ObjectId
 from typing import Optional
-from datalayer import Base, ResponseModel, my_logger, get_db
+from pymongo import ReturnDocument, UpdateOne
+from datalayer import Base, ResponseModel, my_logger, get_db, get_async_db, get_user_db, get_async_user_db, mark_user_write, response_cache, vote_queue, vote_index, rankings
 
 class User_Vote(Base):
     """
@@ -26,6 +28,10 @@ class User_Vote(Base):
         if not isinstance(self.like, bool):
             return ResponseModel(success=False, message="Vote must be a boolean value (True or False)!")
 
+        # checked before writing: a bad id would otherwise fail after the vote is saved (or a whole queued batch)
+        if not ObjectId.is_valid(self.phrase_id):
+            return ResponseModel(success=False, message="Phrase ID is not valid!")
+
         return ResponseModel(success=True, message="Vote validated successfully")
 
     def check_duplicate_possibility(self) -> Optional[str]:
@@ -40,13 +46,42 @@ class User_Vote(Base):
         # Check if the vote already exists in the database
         return str(data_from_db.pop("_id")) if data_from_db else None
 
+    @staticmethod
+    def change_like_count(phrase_id: str, meaning_id: str, amount: int) -> bool:
+        """
+        Add amount to the like_count of the embedded meaning with $inc on the positional element.
+        The cached responses showing the like counts of the phrase are invalidated.
+        Returns False when the meaning doesn't exist (nothing matched), also for an amount of 0.
+        """
+        db = get_db()
+        result = db["phrases"].update_one(
+            {"_id": ObjectId(phrase_id), "meanings.id": meaning_id},
+            {"$inc": {"meanings.$.like_count": amount}})
+        if amount:
+            response_cache.invalidate_phrases([phrase_id])
+        return result.matched_count > 0
+
+    @staticmethod
+    async def change_like_count_async(phrase_id: str, meaning_id: str, amount: int) -> bool:
+        """
+        Async version of change_like_count.
+        """
+        db = get_async_db()
+        result = await db["phrases"].update_one(
+            {"_id": ObjectId(phrase_id), "meanings.id": meaning_id},
+            {"$inc": {"meanings.$.like_count": amount}})
+        if amount:
+            await response_cache.invalidate_phrases_async([phrase_id])
+        return result.matched_count > 0
+
     @staticmethod
     def get_by_ip(user_ip: str) -> ResponseModel:
         """
         Get all votes by user IP.
+        Read from a secondary unless the user voted lately (read-your-own-writes, see get_user_db).
         """
         try:
-            db = get_db()
+            db = get_user_db(user_ip)
             data_from_db = db["user_votes"].find({"ip": user_ip, "like": True})
 
             if not data_from_db:
@@ -59,36 +94,213 @@ class User_Vote(Base):
             my_logger.error(f"Error retrieving votes by IP {user_ip}: {e}")
             return ResponseModel(success=False, message=str(e))
     
+    @staticmethod
+    async def get_by_ip_async(user_ip: str) -> ResponseModel:
+        """
+        Async version of get_by_ip.
+        """
+        try:
+            db = get_async_user_db(user_ip)
+            data_from_db = await db["user_votes"].find({"ip": user_ip, "like": True}).to_list()
+
+            votes = [User_Vote.convert_mongo_to_user_vote(data) for data in data_from_db]
+            return ResponseModel(success=True, message="Votes retrieved successfully", data=votes)
+
+        except Exception as e:
+            my_logger.error(f"Error retrieving votes by IP {user_ip}: {e}")
+            return ResponseModel(success=False, message=str(e))
+    
+    def build_upsert(self) -> tuple:
+        """
+        Filter and update of the vote upsert on (meaning_id, ip).
+        The _id of a new vote is assigned here so it is known without reading the vote back.
+        """
+        self.create_date = datetime.datetime.now()
+        new_id = ObjectId()
+
+        upsert_filter = {"meaning_id": self.meaning_id, "ip": self.ip}
+        update = {
+            "$set": {"like": self.like, "phrase_id": self.phrase_id, "create_date": self.create_date},
+            "$setOnInsert": {"_id": new_id},
+        }
+        return upsert_filter, update, new_id
+
+    def apply_upsert_result(self, previous_vote: Optional[dict], new_id: ObjectId) -> tuple:
+        """
+        From the vote as it was before the upsert, return the like_count change (-1, 0 or +1) and the response.
+        """
+        if previous_vote is None:
+            self.id = str(new_id)
+            return (1 if self.like else 0), ResponseModel(success=True, message="Vote created successfully", data=self)
+
+        self.id = str(previous_vote["_id"])
+        if previous_vote["like"] == self.like:
+            return 0, ResponseModel(success=True, message="Vote unchanged", data=self)
+
+        return (1 if self.like else -1), ResponseModel(success=True, message="Vote updated successfully", data=self)
+
     @staticmethod
     def create(self) -> ResponseModel:
         """
-        Create a new vote in the database.
+        Create the vote, or update it when the user already voted on this meaning.
+        One atomic upsert on (meaning_id, ip): the unique index makes concurrent votes of the same user
+        end up in one document, and the vote returned as it was before tells if the like state changed.
+        The meaning is not looked up before: a new or changed vote runs the like_count $inc anyway,
+        when it matches no meaning the vote is taken back.
         """
         try:
             validation_response = self.validation()
             if not validation_response.success:
                 return validation_response
 
-            # if User already voted, update the vote
-            existing_id = self.check_duplicate_possibility()
-            if existing_id:
-                self.id = existing_id
-                updated_vote_response = User_Vote.update(self)
-                return updated_vote_response
+            upsert_filter, update, new_id = self.build_upsert()
 
-            self.create_date = datetime.datetime.now()
-            
             db = get_db()
-            result = db["user_votes"].insert_one(self.dict(exclude={"id"}))
-            
-            self.id = str(result.inserted_id)
+            previous_vote = db["user_votes"].find_one_and_update(
+                upsert_filter, update, projection={"like": 1}, upsert=True, return_document=ReturnDocument.BEFORE)
+
+            like_change, response = self.apply_upsert_result(previous_vote, new_id)
+            if (previous_vote is None or like_change) and not User_Vote.change_like_count(self.phrase_id, self.meaning_id, like_change):
+                db["user_votes"].delete_one({"_id": ObjectId(self.id)})
+                return ResponseModel(success=False, message="Meaning not found!")
 
-            return ResponseModel(success=True, message="Vote created successfully", data=self)
+            mark_user_write(self.ip)
+            vote_index.set(self.meaning_id, self.ip, self.like)
+            if like_change > 0:
+                rankings.record_vote(self.phrase_id)
+
+            return response
 
         except Exception as e:
             my_logger.error(f"Error creating vote: {e}")
             return ResponseModel(success=False, message=str(e))
     
+    @staticmethod
+    async def create_async(self) -> ResponseModel:
+        """
+        Async version of create.
+        """
+        try:
+            validation_response = self.validation()
+            if not validation_response.success:
+                return validation_response
+
+            upsert_filter, update, new_id = self.build_upsert()
+
+            db = get_async_db()
+            previous_vote = await db["user_votes"].find_one_and_update(
+                upsert_filter, update, projection={"like": 1}, upsert=True, return_document=ReturnDocument.BEFORE)
+
+            like_change, response = self.apply_upsert_result(previous_vote, new_id)
+            if (previous_vote is None or like_change) and not await User_Vote.change_like_count_async(self.phrase_id, self.meaning_id, like_change):
+                await db["user_votes"].delete_one({"_id": ObjectId(self.id)})
+                return ResponseModel(success=False, message="Meaning not found!")
+
+            mark_user_write(self.ip)
+            vote_index.set(self.meaning_id, self.ip, self.like)
+            if like_change > 0:
+                rankings.record_vote(self.phrase_id)
+
+            return response
+
+        except Exception as e:
+            my_logger.error(f"Error creating vote: {e}")
+            return ResponseModel(success=False, message=str(e))
+
+    @staticmethod
+    def enqueue(self) -> ResponseModel:
+        """
+        Validate the vote, check that its meaning exists and put it on the ingestion queue,
+        it is written a moment later by bulk_upsert. Raises QueueFullError when the queue is full.
+        """
+        validation_response = self.validation()
+        if not validation_response.success:
+            return validation_response
+
+        if not get_db()["phrases"].find_one({"_id": ObjectId(self.phrase_id), "meanings.id": self.meaning_id}, {"_id": 1}):
+            return ResponseModel(success=False, message="Meaning not found!")
+
+        self.create_date = datetime.datetime.now()
+        vote_queue.submit(self)
+        mark_user_write(self.ip)
+
+        return ResponseModel(success=True, message="Vote queued successfully", data=self)
+
+    @staticmethod
+    async def enqueue_async(self) -> ResponseModel:
+        """
+        Async version of enqueue.
+        """
+        validation_response = self.validation()
+        if not validation_response.success:
+            return validation_response
+
+        if not await get_async_db()["phrases"].find_one({"_id": ObjectId(self.phrase_id), "meanings.id": self.meaning_id}, {"_id": 1}):
+            return ResponseModel(success=False, message="Meaning not found!")
+
+        self.create_date = datetime.datetime.now()
+        vote_queue.submit(self)
+        mark_user_write(self.ip)
+
+        return ResponseModel(success=True, message="Vote queued successfully", data=self)
+
+    @staticmethod
+    def bulk_upsert(votes: list) -> list:
+        """
+        Write a batch of votes, at most one per (meaning_id, ip).
+        The meanings of the batch are checked with one query, the votes on a meaning deleted since they were
+        queued are dropped. Every vote is an upsert on (meaning_id, ip) returning the vote as it was before,
+        like User_Vote.create: the like changes come from the writes themselves, also when direct votes of the
+        same users run meanwhile, and the like counters are changed with one bulk_write (one $inc per meaning).
+        The votes whose upsert failed are returned for a retry (the queue's write_batch).
+        """
+        db = get_db()
+
+        existing_meanings = {
+            (str(phrase["_id"]), meaning["id"])
+            for phrase in db["phrases"].find({"_id": {"$in": list({ObjectId(vote.phrase_id) for vote in votes})}}, {"meanings.id": 1})
+            for meaning in phrase.get("meanings") or []
+        }
+
+        failed = []
+        like_changes = defaultdict(int)
+        for vote in votes:
+            if (vote.phrase_id, vote.meaning_id) not in existing_meanings:
+                my_logger.error(f"Vote of {vote.ip} dropped, meaning {vote.meaning_id} of phrase {vote.phrase_id} not found")
+                continue
+
+            try:
+                previous_vote = db["user_votes"].find_one_and_update(
+                    {"meaning_id": vote.meaning_id, "ip": vote.ip},
+                    {"$set": {"like": vote.like, "phrase_id": vote.phrase_id, "create_date": vote.create_date}},
+                    projection={"_id": 0, "like": 1}, upsert=True, return_document=ReturnDocument.BEFORE)
+            except Exception as e:
+                my_logger.error(f"Vote of {vote.ip} on meaning {vote.meaning_id} not written: {e}")
+                failed.append(vote)
+                continue
+
+            vote_index.set(vote.meaning_id, vote.ip, vote.like)
+            # no vote yet counts as not liked
+            if (previous_vote or {}).get("like", False) != vote.like:
+                like_changes[(vote.phrase_id, vote.meaning_id)] += 1 if vote.like else -1
+
+        like_changes = {key: amount for key, amount in like_changes.items() if amount}
+        for (phrase_id, meaning_id), amount in like_changes.items():
+            if amount > 0:
+                rankings.record_vote(phrase_id, amount)
+        if like_changes:
+            try:
+                db["phrases"].bulk_write([
+                    UpdateOne({"_id": ObjectId(phrase_id), "meanings.id": meaning_id}, {"$inc": {"meanings.$.like_count": amount}})
+                    for (phrase_id, meaning_id), amount in like_changes.items()
+                ], ordered=False)
+            except Exception as e:
+                # the votes are written, retrying them would not change the counters again
+                my_logger.error(f"Error changing {len(like_changes)} like counters, run `manage.py reconcile-likes`: {e}")
+            response_cache.invalidate_phrases([phrase_id for phrase_id, _ in like_changes])
+
+        return failed
+
     @staticmethod
     def update(self) -> ResponseModel:
         """
@@ -102,9 +314,21 @@ class User_Vote(Base):
             self.create_date = datetime.datetime.now()
             
             db = get_db()
+            # the document before the update tells us if the like state really changed
             data_from_db = db["user_votes"].find_one_and_update({"_id": ObjectId(self.id)}, {"$set": self.dict(exclude={"id"})})
 
-            return ResponseModel(success=True, message="Vote updated successfully", data=User_Vote.convert_mongo_to_user_vote(data_from_db))
+            if not data_from_db:
+                return ResponseModel(success=False, message="Vote not found!")
+
+            mark_user_write(self.ip)
+            vote_index.set(data_from_db["meaning_id"], data_from_db["ip"], False)
+            vote_index.set(self.meaning_id, self.ip, self.like)
+            if data_from_db["like"] != self.like:
+                User_Vote.change_like_count(self.phrase_id, self.meaning_id, 1 if self.like else -1)
+                if self.like:
+                    rankings.record_vote(self.phrase_id)
+
+            return ResponseModel(success=True, message="Vote updated successfully", data=self)
 
         except Exception as e:
             my_logger.error(f"Error updating vote: {e}")
@@ -117,7 +341,13 @@ class User_Vote(Base):
         """
         try:
             db = get_db()
-            db["user_votes"].delete_one({"_id": ObjectId(vote_id)})
+            data_from_db = db["user_votes"].find_one_and_delete({"_id": ObjectId(vote_id)})
+            if data_from_db:
+                mark_user_write(data_from_db["ip"])
+                vote_index.set(data_from_db["meaning_id"], data_from_db["ip"], False)
+
+            if data_from_db and data_from_db["like"]:
+                User_Vote.change_like_count(data_from_db["phrase_id"], data_from_db["meaning_id"], -1)
 
             return ResponseModel(success=True, message="Vote deleted successfully")
 
@@ -133,6 +363,7 @@ class User_Vote(Base):
         try:
             db = get_db()
             db["user_votes"].delete_many({"meaning_id": meaning_id})
+            vote_index.remove_meanings([meaning_id])
 
             return ResponseModel(success=True, message="Vote(s) deleted successfully")
 
@@ -147,6 +378,8 @@ class User_Vote(Base):
         """
         try:
             db = get_db()
+            if vote_index.enabled:
+                vote_index.remove_meanings(db["user_votes"].distinct("meaning_id", {"phrase_id": phrase_id}))
             db["user_votes"].delete_many({"phrase_id": phrase_id})
 
             return ResponseModel(success=True, message="Vote(s) deleted successfully")
@@ -155,17 +388,55 @@ class User_Vote(Base):
             my_logger.error(f"Error deleting vote by phrase_id {phrase_id}: {e}")
             return ResponseModel(success=False, message=str(e))
         
+    @staticmethod
+    def reconcile_like_counts() -> ResponseModel:
+        """
+        Recompute the like_count of every embedded meaning from user_votes.
+        Used to repair counters that drifted (e.g. a crash between the vote write and the $inc).
+        """
+        try:
+            db = get_db()
+            like_counts = {row["_id"]: row["count"] for row in db["user_votes"].aggregate([
+                {"$match": {"like": True}},
+                {"$group": {"_id": "$meaning_id", "count": {"$sum": 1}}}
+            ])}
+
+            fixed = 0
+            operations = []
+            for phrase in db["phrases"].find({}, {"meanings.id": 1, "meanings.like_count": 1}):
+                for meaning in phrase.get("meanings") or []:
+                    like_count = like_counts.get(meaning.get("id"), 0)
+                    if meaning.get("like_count") != like_count:
+                        operations.append(UpdateOne(
+                            {"_id": phrase["_id"], "meanings.id": meaning["id"]},
+                            {"$set": {"meanings.$.like_count": like_count}}))
+
+                if len(operations) >= 1000:
+                    db["phrases"].bulk_write(operations, ordered=False)
+                    fixed += len(operations)
+                    operations = []
+
+            if operations:
+                db["phrases"].bulk_write(operations, ordered=False)
+                fixed += len(operations)
+
+            response_cache.invalidate()
+            return ResponseModel(success=True, message=f"{fixed} like counters fixed")
+
+        except Exception as e:
+            my_logger.error(f"Error reconciling like counts: {e}")
+            return ResponseModel(success=False, message=str(e))
+
     @classmethod
     def convert_mongo_to_user_vote(self, data: dict):
         """
             Convert MongoDB doc to Pydantic model
+            Built in pydantic-core (see construct_trusted).
             Args:
                 data (dict): The MongoDB document to convert.
             Returns:
                 User_Vote: The converted Pydantic model.
         """
 
-        data = data.copy()
-        data["id"] = str(data.pop("_id"))
-        return self(**data)
+        return self.construct_trusted(data)
         
\ No newline at end of file
@@ -1,9 +1,16 @@
 from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from datalayer import ResponseModel, SortEnum, get_ip, set_request_context, my_logger, insert_data_from_json
-from Models import Meaning, Phrase, User_Vote
-
-app = FastAPI()
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from typing import Optional
+import datetime
+from datalayer import ResponseModel, RequestDbStats, instrumentation_enabled, query_listener, connection, wait_for_db, async_db_enabled, SortEnum, RankingEnum, SearchModeEnum, TagModeEnum, ExportCollectionEnum, get_ip, set_request_context, set_write_token, my_logger, require_indexes, insert_data_from_json, search_index, vote_index, view_buffer, vote_queue, QueueFullError, rankings, change_stream, response_cache, stream_export, render_metrics
+from Models import Meaning, Phrase, Tag, User_Vote
+from .responses import FastJSONResponse
+
+# responses are rendered with orjson; the read endpoints return FastJSONResponse themselves
+# so their data (built from our own documents) is not validated again against response_model
+app = FastAPI(default_response_class=FastJSONResponse)
 
 #Allowing Site for API submission.
 origins = [
@@ -17,46 +24,117 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Wrote-At"],
 )
 
 # Middleware to store the request globally
+# to return the write token of read-your-own-writes (see set_write_token)
+# and to report the database commands of the request (Server-Timing header, N+1 warning)
 @app.middleware("http")
 async def add_request_context(request: Request, call_next):
     set_request_context(request)
+    if not instrumentation_enabled:
+        response = await call_next(request)
+        set_write_token(request, response)
+        return response
+
+    request.state.db_stats = RequestDbStats()
     response = await call_next(request)
+    set_write_token(request, response)
+
+    stats = request.state.db_stats
+    if stats.commands:
+        response.headers.append("Server-Timing", stats.server_timing())
+        query_listener.check_request(stats, request.url.path)
     return response
 
-#Inserting default data into the database when launching the application
+#Connecting to the database, creating the indexes and inserting default data into the database when launching the application
 @app.on_event("startup")
 def on_startup():
+   wait_for_db()
+   require_indexes()
    insert_data_from_json()
+   Phrase.backfill_text_lower()
+   Tag.ensure_facets()
+   if search_index.enabled:
+      search_index.rebuild_from_db()
+   if vote_index.enabled:
+      vote_index.rebuild_from_db()
+   view_buffer.add_listener(Tag.add_views)
+   view_buffer.add_listener(rankings.record_views)
+   view_buffer.start()
+   vote_queue.start(User_Vote.bulk_upsert)
+   rankings.start()
+   # other workers' writes refresh the in-process state of this one (needs a replica set)
+   change_stream.add_consumer(response_cache.apply_changes)
+   change_stream.add_consumer(search_index.apply_changes)
+   change_stream.add_consumer(vote_index.apply_changes)
+   change_stream.start()
+
+#Writing the buffered data before the application stops
+@app.on_event("shutdown")
+def on_shutdown():
+   view_buffer.stop()
+   vote_queue.stop()
+   rankings.stop()
+   change_stream.stop()
+   connection.close()
 
 @app.get("/")
 def read_root():
     return {"Hello": "Welcome to the Womanslation."}
 
+@app.get("/health/live")
+def health_live():
+    """
+    Liveness: the process answers requests.
+    """
+    return {"status": "alive"}
+
+@app.get("/health/ready")
+async def health_ready():
+    """
+    Readiness: the startup finished and the database answers a ping (503 otherwise).
+    """
+    if connection.ready and await run_in_threadpool(connection.ping):
+        return {"status": "ready"}
+    return FastJSONResponse({"status": "not ready"}, status_code=503)
+
 @app.get("/phrases", response_model=ResponseModel)
-def get_phrases(page_number: int = 0, page_size: int = 10, pageOrder: SortEnum = SortEnum.newest, search_text: str = "", tags: str = "") -> ResponseModel:
+async def get_phrases(page_number: int = 0, page_size: int = 10, pageOrder: Optional[SortEnum] = None, search_text: str = "", tags: str = "",
+                search_mode: SearchModeEnum = SearchModeEnum.text, cursor: str = "", fields: str = "", include: str = "",
+                tag_mode: TagModeEnum = TagModeEnum.any) -> ResponseModel:
     """
     Get a list of phrases with pagination and filtering options.
     
     Parameters:
         - page_number (int): The page number to retrieve (default is 0).
         - page_size (int): The number of phrases per page (default is 10).
-        - pageOrder (SortEnum): The order in which to sort the phrases (default is SortEnum.newest).
+        - pageOrder (SortEnum): The order in which to sort the phrases (default is relevance when searching, otherwise newest);
+          trending follows the precomputed ranking of GET /phrases/top.
         - search_text (str): Text to search for in phrases (default is empty string).
         - tags (str): Comma-separated tags to filter phrases by (default is empty string).
+        - tag_mode (TagModeEnum): any (default) for phrases having one of the tags, all for phrases having every tag.
+        - search_mode (SearchModeEnum): text (full-text, default), prefix (autocomplete) or regex (escaped substring match).
+        - cursor (str): The next_cursor of the previous page; when given, page_number is ignored and the page
+          starts right after the previous one (not available for the relevance order).
+        - fields (str): Comma-separated fields of the phrase summaries: text, suggested_response, tags, views,
+          create_date, meaning_count (default is all of them).
+        - include (str): "meanings" to get the full phrases with their meanings instead of the summaries.
 
     Raises:
         HTTPException: If an error occurs during the retrieval of phrases.
     
     Returns:
-        ResponseModel: The response model containing the list of phrases.
+        ResponseModel: The response model containing the list of phrases and the next_cursor of the following page.
     """
     try:
-        result = Phrase.get_phrases(pageIndex=page_number, pageSize=page_size, pageOrder=pageOrder, searchText=search_text, tags=tags)
+        if async_db_enabled:
+            result = await Phrase.get_phrases_async(pageIndex=page_number, pageSize=page_size, pageOrder=pageOrder, searchText=search_text, tags=tags, searchMode=search_mode, cursor=cursor, fields=fields, include=include, tagMode=tag_mode)
+        else:
+            result = await run_in_threadpool(Phrase.get_phrases, pageIndex=page_number, pageSize=page_size, pageOrder=pageOrder, searchText=search_text, tags=tags, searchMode=search_mode, cursor=cursor, fields=fields, include=include, tagMode=tag_mode)
 
-        return result
+        return FastJSONResponse(result, exclude_none=True)
     
     except Exception as e:
         my_logger.error(f"Error retrieving phrases: {e}")
@@ -87,6 +165,98 @@ def create_phrase(phrase: Phrase) -> ResponseModel:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/phrases/bulk", response_model=ResponseModel)
+async def import_phrases(request: Request) -> ResponseModel:
+    """
+    Import many phrases at once.
+
+    The body is a JSON array of phrases, NDJSON (one phrase per line),
+    or a multipart form with a JSON/NDJSON file in the `file` field.
+
+    Raises:
+        HTTPException: 400 if the body can not be read, 500 if an error occurs during the import.
+
+    Returns:
+        ResponseModel: The response model containing the import report (status of every item).
+    """
+    try:
+        if request.headers.get("content-type", "").startswith("multipart/form-data"):
+            form = await request.form()
+            raw = await form["file"].read()
+        else:
+            raw = await request.body()
+
+        items = Phrase.parse_import_data(raw)
+
+    except (ValueError, KeyError) as e:
+        raise HTTPException(status_code=400, detail=f"Can not read the phrases to import: {e}")
+
+    try:
+        result = await run_in_threadpool(Phrase.bulk_import, items)
+
+        return result
+
+    except Exception as e:
+        my_logger.error(f"Error importing phrases: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/phrases/top", response_model=ResponseModel)
+async def get_top_phrases(ranking: RankingEnum = RankingEnum.trending, page_number: int = 0, page_size: int = 10,
+                          fields: str = "", include: str = "") -> ResponseModel:
+    """
+    Get a page of the precomputed phrase rankings.
+
+    Parameters:
+        - ranking (RankingEnum): trending (recent views and votes, default) or most_viewed (all-time views).
+        - page_number (int): The page number to retrieve (default is 0).
+        - page_size (int): The number of phrases per page (default is 10).
+        - fields, include: as for GET /phrases.
+
+    Raises:
+        HTTPException: If an error occurs during the retrieval of the phrases.
+
+    Returns:
+        ResponseModel: The response model containing the list of phrases, best ranked first.
+    """
+    try:
+        result = await run_in_threadpool(Phrase.get_top_phrases, ranking, pageIndex=page_number, pageSize=page_size, fields=fields, include=include)
+        return FastJSONResponse(result, exclude_none=True)
+
+    except Exception as e:
+        my_logger.error(f"Error retrieving {ranking.value} phrases: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/phrases/{phrase_id}", response_model=ResponseModel)
+async def get_phrase(phrase_id: str, fields: str = "", include: str = "meanings") -> ResponseModel:
+    """
+    Get a phrase by its ID.
+
+    Parameters:
+        phrase_id (str): The ID of the phrase to retrieve.
+        fields (str): Comma-separated fields of the summary when the meanings are not included (default is all of them).
+        include (str): "meanings" (default) for the full phrase, empty for its summary.
+
+    Raises:
+        HTTPException: If an error occurs during the retrieval of the phrase.
+
+    Returns:
+        ResponseModel: The response model containing the phrase.
+    """
+    try:
+        if async_db_enabled:
+            result = await Phrase.get_phrase_by_id_async(phrase_id, fields=fields, include=include)
+        else:
+            result = await run_in_threadpool(Phrase.get_phrase_by_id, phrase_id, fields=fields, include=include)
+
+        return FastJSONResponse(result, exclude_none=True)
+
+    except Exception as e:
+        my_logger.error(f"Error retrieving phrase {phrase_id}: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @app.put("/phrases/{phrase_id}/view", response_model=ResponseModel)
 def view_phrase(phrase_id: str) -> ResponseModel:
     """
@@ -99,7 +269,8 @@ def view_phrase(phrase_id: str) -> ResponseModel:
         HTTPException: If an error occurs during the marking of the phrase as viewed.
 
     Returns:
-        ResponseModel: The response model containing the updated phrase.
+        ResponseModel: The response model containing the updated phrase
+            (only its id when the view buffer is enabled, the view is written a moment later).
     """
     try:
         result = Phrase.Phrase_viewed(phrase_id)
@@ -166,7 +337,7 @@ def delete_phrase(phrase_id: str) -> ResponseModel:
 
 
 @app.get("/phrases/{phrase_id}/meanings", response_model=ResponseModel)
-def get_meanings_by_phrase_id(phrase_id: str) -> ResponseModel:
+async def get_meanings_by_phrase_id(phrase_id: str) -> ResponseModel:
     """
     Get meanings for a specific phrase by its ID.
     
@@ -177,9 +348,12 @@ def get_meanings_by_phrase_id(phrase_id: str) -> ResponseModel:
         HTTPException: If an error occurs during the retrieval of meanings.
     """
     try:
-        result = Meaning.get_meanings_by_phrase_id(phrase_id)
+        if async_db_enabled:
+            result = await Meaning.get_meanings_by_phrase_id_async(phrase_id)
+        else:
+            result = await run_in_threadpool(Meaning.get_meanings_by_phrase_id, phrase_id)
         
-        return result
+        return FastJSONResponse(result)
     
     except Exception as e:
         my_logger.error(f"Error retrieving meanings for phrase {phrase_id}: {e}")
@@ -296,10 +470,12 @@ def delete_meanings_by_phrase_id(phrase_id: str) -> ResponseModel:
 
 #custom user vote api
 @app.post("/phrases/{phrase_id}/meanings/{meaning_id}/vote", response_model=ResponseModel)
-def create_vote(phrase_id: str, meaning_id: str, like: bool, request: Request) -> ResponseModel:
+async def create_vote(phrase_id: str, meaning_id: str, like: bool, request: Request) -> ResponseModel:
     """
     like or unlike a meaning.
     when user votes again, it will update the vote automatically
+    (the message tells if the vote was created, updated or unchanged)
+    with the vote queue enabled, the vote is only queued and written a moment later
     
     Parameters:
         phrase_id (str): The ID of the phrase.
@@ -307,7 +483,7 @@ def create_vote(phrase_id: str, meaning_id: str, like: bool, request: Request) -
         like (bool): for like True, for unlike False 
 
     Raises:
-        HTTPException: If an error occurs during the like.
+        HTTPException: 503 if the vote queue is full, 500 if an error occurs during the like.
         
     Returns:
         ResponseModel: The response model containing the liked of unliked User_Vote.
@@ -317,9 +493,19 @@ def create_vote(phrase_id: str, meaning_id: str, like: bool, request: Request) -
 
         vote = User_Vote(phrase_id=phrase_id, meaning_id=meaning_id, ip= user_ip, like=like)
 
-        result = User_Vote.create(vote)
+        if vote_queue.enabled and async_db_enabled:
+            result = await User_Vote.enqueue_async(vote)
+        elif vote_queue.enabled:
+            result = await run_in_threadpool(User_Vote.enqueue, vote)
+        elif async_db_enabled:
+            result = await User_Vote.create_async(vote)
+        else:
+            result = await run_in_threadpool(User_Vote.create, vote)
 
         return result
+
+    except QueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
     
     except Exception as e:
         my_logger.error(f"Error creating vote for phrase {phrase_id} and meaning {meaning_id}: {e}")
@@ -327,7 +513,7 @@ def create_vote(phrase_id: str, meaning_id: str, like: bool, request: Request) -
     
 
 @app.get("/user_vote/current_user", response_model=ResponseModel)
-def get_current_user_vote() -> ResponseModel:
+async def get_current_user_vote() -> ResponseModel:
     """
     Get all current user's votes.
     
@@ -339,9 +525,12 @@ def get_current_user_vote() -> ResponseModel:
     """
     try:
         user_ip = get_ip()
-        result = User_Vote.get_by_ip(user_ip)
+        if async_db_enabled:
+            result = await User_Vote.get_by_ip_async(user_ip)
+        else:
+            result = await run_in_threadpool(User_Vote.get_by_ip, user_ip)
 
-        return result
+        return FastJSONResponse(result)
 
     except Exception as e:
         my_logger.error(f"Error creating user vote: {e}")
@@ -370,4 +559,126 @@ def delete_user_vote(vote_id: str) -> ResponseModel:
     
     except Exception as e:
         my_logger.error(f"Error deleting user vote {vote_id}: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/tags", response_model=ResponseModel)
+async def get_tags(page_number: int = 0, page_size: int = 50, prefix: str = "") -> ResponseModel:
+    """
+    Get the tags with their phrase count and the total views of their phrases, most used first.
+
+    Parameters:
+        - page_number (int): The page number to retrieve (default is 0).
+        - page_size (int): The number of tags per page (default is 50).
+        - prefix (str): Only the tags starting with it (default is every tag).
+
+    Raises:
+        HTTPException: If an error occurs during the retrieval of the tags.
+
+    Returns:
+        ResponseModel: The response model containing the list of Tag.
+    """
+    try:
+        result = await run_in_threadpool(Tag.get_tags, pageIndex=page_number, pageSize=page_size, prefix=prefix)
+        return FastJSONResponse(result, exclude_none=True)
+
+    except Exception as e:
+        my_logger.error(f"Error retrieving tags: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/tags/{tag}/phrases", response_model=ResponseModel)
+async def get_phrases_by_tag(tag: str, page_number: int = 0, page_size: int = 10, pageOrder: Optional[SortEnum] = None, cursor: str = "",
+                             fields: str = "", include: str = "meanings") -> ResponseModel:
+    """
+    Get the phrases having a tag, one page at a time.
+
+    Parameters:
+        - tag (str): The tag of the phrases.
+        - page_number, page_size, pageOrder, cursor, fields, include: as for GET /phrases
+          (include is "meanings" by default).
+
+    Raises:
+        HTTPException: If an error occurs during the retrieval of the phrases.
+
+    Returns:
+        ResponseModel: The response model containing the list of phrases and the next_cursor of the following page.
+    """
+    try:
+        result = await run_in_threadpool(Phrase.search_phrases_by_tag, tag, pageIndex=page_number, pageSize=page_size, pageOrder=pageOrder,
+                                         cursor=cursor, fields=fields, include=include)
+        return FastJSONResponse(result, exclude_none=True)
+
+    except Exception as e:
+        my_logger.error(f"Error retrieving phrases by tag '{tag}': {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/export")
+def export_collection(collection: ExportCollectionEnum = ExportCollectionEnum.phrases, tags: str = "", since: Optional[datetime.datetime] = None,
+                      until: Optional[datetime.datetime] = None, gzip: bool = False) -> StreamingResponse:
+    """
+    Stream a whole collection as NDJSON (one document per line), in constant memory whatever its size.
+
+    Parameters:
+        - collection (ExportCollectionEnum): phrases (with their meanings, default) or user_votes
+          (voter IPs are replaced by a keyed hash with EXPORT_IP_KEY, dropped otherwise).
+        - tags (str): Comma-separated tags, only the phrases having one of them (or the votes on these phrases).
+        - since, until (datetime): create_date range for incremental exports (since included, until excluded).
+        - gzip (bool): Send the export as a .ndjson.gz file.
+
+    Returns:
+        StreamingResponse: The NDJSON lines; the connection is aborted if the export fails midway (see the logs).
+    """
+    tag_list = [tag.strip().lower() for tag in tags.split(",") if tag.strip()]
+    filename = f"{collection.value}.ndjson" + (".gz" if gzip else "")
+
+    return StreamingResponse(
+        stream_export(collection, tags=tag_list, since=since, until=until, compress=gzip),
+        media_type="application/gzip" if gzip else "application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'})
+
+
+@app.post("/search_index/rebuild", response_model=ResponseModel)
+def rebuild_search_index() -> ResponseModel:
+    """
+    Rebuild the in-process search index from the database.
+
+    Returns:
+        ResponseModel: The response model containing the memory report of the rebuilt index.
+    """
+    try:
+        if not search_index.enabled:
+            return ResponseModel(success=False, message="Search index is disabled (SEARCH_INDEX_ENABLED)")
+
+        count = search_index.rebuild_from_db()
+
+        return ResponseModel(success=True, message=f"{count} phrases indexed", data=search_index.memory_report())
+
+    except Exception as e:
+        my_logger.error(f"Error rebuilding search index: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/search_index/stats", response_model=ResponseModel)
+def get_search_index_stats() -> ResponseModel:
+    """
+    Get the size and the memory footprint of the in-process search index.
+    """
+    return ResponseModel(success=True, data={"enabled": search_index.enabled, **search_index.memory_report()})
+
+
+@app.get("/vote_index/stats", response_model=ResponseModel)
+def get_vote_index_stats() -> ResponseModel:
+    """
+    Get the size and the memory footprint (also per million likes) of the in-process vote index.
+    """
+    return ResponseModel(success=True, data={"enabled": vote_index.enabled, "loaded": vote_index.loaded, **vote_index.memory_report()})
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def get_metrics() -> str:
+    """
+    Application metrics in the Prometheus text format.
+    """
+    return render_metrics()
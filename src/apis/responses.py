@@ -0,0 +1,41 @@
+import datetime
+import json
+from enum import Enum
+from bson import ObjectId
+from pydantic import BaseModel
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSON response rendered with orjson (the standard json module when orjson is not installed).
+
+    Pydantic models are dumped as they are, so an endpoint returning FastJSONResponse(result) skips the
+    validation FastAPI does against response_model. With exclude_none, fields left None are not sent
+    (e.g. the fields of a phrase summary that were not asked for).
+    """
+
+    def __init__(self, content, exclude_none: bool = False, **kwargs):
+        self.exclude_none = exclude_none
+        super().__init__(content, **kwargs)
+
+    def _default(self, value):
+        if isinstance(value, BaseModel):
+            return value.model_dump(exclude_none=self.exclude_none)
+        if isinstance(value, ObjectId):
+            return str(value)
+        if isinstance(value, (datetime.datetime, datetime.date)):
+            return value.isoformat()
+        if isinstance(value, Enum):
+            return value.value
+        raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+    def render(self, content) -> bytes:
+        if orjson is None:
+            return json.dumps(content, default=self._default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        return orjson.dumps(content, default=self._default, option=orjson.OPT_NON_STR_KEYS)
@@ -0,0 +1,30 @@
+"""
+Benchmarks of the API and the data layer.
+
+They drop and fill collections, so they never use the DB_NAME of the application: importing this package
+(every `python -m benchmarks.<name>` does it first) points the data layer at BENCH_DB_NAME
+(womanslation_bench by default), and check_bench_db refuses a database whose name doesn't end with _bench.
+"""
+import os
+
+BENCH_SUFFIX = "_bench"
+BENCH_DB_NAME = os.getenv("BENCH_DB_NAME", "womanslation_bench")
+
+os.environ["DB_NAME"] = BENCH_DB_NAME
+
+
+def check_bench_db(db):
+    """
+    Stop before dropping or overwriting anything in a database that isn't a benchmark database.
+    """
+    if not db.name.endswith(BENCH_SUFFIX):
+        raise SystemExit(f"refusing to write to {db.name}: benchmark databases must end with {BENCH_SUFFIX} (set BENCH_DB_NAME)")
+
+
+def bench_env(**variables) -> dict:
+    """
+    Environment of a server started by a benchmark: the current one on the benchmark database.
+    """
+    if not BENCH_DB_NAME.endswith(BENCH_SUFFIX):
+        raise SystemExit(f"refusing to benchmark {BENCH_DB_NAME}: benchmark databases must end with {BENCH_SUFFIX}")
+    return {**os.environ, **variables, "DB_NAME": BENCH_DB_NAME}
@@ -0,0 +1,207 @@
+"""
+Reproducible benchmark of the HTTP API: seeds a synthetic dataset (benchmarks/dataset.py), starts the app
+with uvicorn (or uses --url) and replays a fixed mix of listing, search, view, vote and current_user calls.
+
+Writes a JSON report with the throughput and p50/p95/p99 latency of every endpoint. With --baseline,
+compares with a previous report and exits with 1 when an endpoint got slower or its throughput dropped
+by more than --tolerance.
+
+usage (from src/, needs a running MongoDB, uses its own database BENCH_DB_NAME for the seed and the server):
+    python -m benchmarks.api_suite --scale 100k --report bench.json
+    python -m benchmarks.api_suite --scale 100k --skip-seed --baseline bench.json --tolerance 0.15
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+
+import httpx
+
+from benchmarks import BENCH_DB_NAME, bench_env
+from benchmarks.dataset import SCALES, TAGS, meaning_count, meaning_id, phrase_id, seed
+from benchmarks.load_test import percentile, wait_until_up
+from benchmarks.search import WORDS
+
+# endpoint name -> weight in the request mix
+MIX = {
+    "list": 30,
+    "list_tags": 10,
+    "search": 15,
+    "phrase": 15,
+    "meanings": 5,
+    "view": 10,
+    "vote": 10,
+    "current_user": 5,
+}
+COMPARED_STATS = ("p95_ms", "rps")
+
+
+def make_request(rng: random.Random, phrases: int, data_seed: int) -> tuple:
+    """
+    Draw the next request of the mix: (endpoint name, method, path, params).
+    """
+    endpoint = rng.choices(list(MIX), weights=list(MIX.values()))[0]
+    number = rng.randrange(phrases)
+    phrase = str(phrase_id(number))
+
+    if endpoint == "list":
+        return endpoint, "GET", "/phrases", {"page_number": rng.randrange(5), "page_size": 20}
+    if endpoint == "list_tags":
+        return endpoint, "GET", "/phrases", {"tags": ",".join(rng.sample(TAGS, 2)), "page_size": 20}
+    if endpoint == "search":
+        return endpoint, "GET", "/phrases", {"search_text": rng.choice(WORDS), "page_size": 20}
+    if endpoint == "phrase":
+        return endpoint, "GET", f"/phrases/{phrase}", None
+    if endpoint == "meanings":
+        return endpoint, "GET", f"/phrases/{phrase}/meanings", None
+    if endpoint == "view":
+        return endpoint, "PUT", f"/phrases/{phrase}/view", None
+    if endpoint == "vote":
+        meaning = meaning_id(number, rng.randrange(meaning_count(data_seed, number)))
+        return endpoint, "POST", f"/phrases/{phrase}/meanings/{meaning}/vote", {"like": rng.random() < 0.8}
+    return endpoint, "GET", "/user_vote/current_user", None
+
+
+def summarize(latencies: list, errors: int, duration: float) -> dict:
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": len(latencies) / duration,
+        "p50_ms": percentile(latencies, 0.50),
+        "p95_ms": percentile(latencies, 0.95),
+        "p99_ms": percentile(latencies, 0.99),
+    }
+
+
+async def run_mix(base_url: str, phrases: int, data_seed: int, concurrency: int, duration: float, warmup: float) -> dict:
+    """
+    Run `concurrency` clients for warmup + duration seconds, only the requests after the warmup are measured.
+    Every client has its own IP (x-forwarded-for) and random generator, so a run is repeatable.
+    """
+    latencies = {endpoint: [] for endpoint in MIX}
+    errors = {endpoint: 0 for endpoint in MIX}
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=30, limits=httpx.Limits(max_connections=concurrency)) as client:
+        measure_from = time.monotonic() + warmup
+        deadline = measure_from + duration
+
+        async def worker(number: int):
+            rng = random.Random(data_seed * 100_000 + number)
+            headers = {"x-forwarded-for": f"172.16.{number // 250}.{number % 250 + 1}"}
+            while time.monotonic() < deadline:
+                endpoint, method, path, params = make_request(rng, phrases, data_seed)
+                warming_up = time.monotonic() < measure_from
+                started = time.perf_counter()
+                response = await client.request(method, path, params=params, headers=headers)
+                if warming_up:
+                    continue
+                latencies[endpoint].append((time.perf_counter() - started) * 1000)
+                if response.status_code != 200:
+                    errors[endpoint] += 1
+
+        await asyncio.gather(*(worker(number) for number in range(concurrency)))
+
+    endpoints = {endpoint: summarize(values, errors[endpoint], duration) for endpoint, values in latencies.items()}
+    endpoints["all"] = summarize([value for values in latencies.values() for value in values], sum(errors.values()), duration)
+    return endpoints
+
+
+def compare(report: dict, baseline: dict, tolerance: float) -> list:
+    """
+    Regressions of the report against the baseline: (endpoint, stat, baseline value, value).
+    Latencies regress when they grow by more than tolerance, throughput when it drops by more than it.
+    """
+    regressions = []
+    for endpoint, stats in report["endpoints"].items():
+        previous = baseline.get("endpoints", {}).get(endpoint)
+        if not previous or not previous.get("requests") or not stats["requests"]:
+            continue
+        for stat in COMPARED_STATS:
+            if stat == "rps":
+                regressed = stats[stat] < previous[stat] * (1 - tolerance)
+            else:
+                regressed = stats[stat] > previous[stat] * (1 + tolerance)
+            if regressed:
+                regressions.append((endpoint, stat, previous[stat], stats[stat]))
+    return regressions
+
+
+def print_report(report: dict):
+    print(f"{'endpoint':>13} {'requests':>9} {'errors':>7} {'req/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for endpoint, stats in report["endpoints"].items():
+        print(f"{endpoint:>13} {stats['requests']:>9} {stats['errors']:>7} {stats['rps']:>9.1f} "
+              f"{stats['p50_ms']:>8.2f} {stats['p95_ms']:>8.2f} {stats['p99_ms']:>8.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scale", choices=list(SCALES), default="1k")
+    parser.add_argument("--phrases", type=int, help="number of phrases (overrides --scale)")
+    parser.add_argument("--votes", type=int, help="number of seeded votes (overrides --scale)")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the dataset and of the request mix")
+    parser.add_argument("--skip-seed", action="store_true", help="reuse the dataset of a previous run (same scale and seed)")
+    parser.add_argument("--url", help="benchmark a running server instead of starting one")
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=30)
+    parser.add_argument("--warmup", type=float, default=5)
+    parser.add_argument("--report", help="write the JSON report to this file (stdout otherwise)")
+    parser.add_argument("--baseline", help="JSON report of a previous run to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="allowed relative regression (0.10 = 10%%)")
+    args = parser.parse_args()
+
+    phrases = args.phrases or SCALES[args.scale]["phrases"]
+    votes = args.votes if args.votes is not None else SCALES[args.scale]["votes"]
+
+    if not args.skip_seed:
+        started = time.perf_counter()
+        seed(phrases, votes, seed=args.seed)
+        print(f"seeded {phrases} phrases and {votes} votes in {time.perf_counter() - started:.1f}s")
+
+    server = None
+    base_url = args.url
+    if not base_url:
+        server = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "apis:app", "--port", str(args.port), "--log-level", "warning"],
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))), env=bench_env())
+        base_url = f"http://127.0.0.1:{args.port}"
+    try:
+        asyncio.run(wait_until_up(base_url))
+        endpoints = asyncio.run(run_mix(base_url, phrases, args.seed, args.concurrency, args.duration, args.warmup))
+    finally:
+        if server:
+            server.terminate()
+            server.wait()
+
+    report = {
+        "config": {"phrases": phrases, "votes": votes, "seed": args.seed, "concurrency": args.concurrency,
+                   "duration": args.duration, "warmup": args.warmup, "mix": MIX, "db_async": os.getenv("DB_ASYNC", "false"), "db_name": BENCH_DB_NAME},
+        "environment": {"python": platform.python_version(), "machine": platform.machine(), "node": platform.node()},
+        "endpoints": endpoints,
+    }
+
+    print_report(report)
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as file:
+            json.dump(report, file, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as file:
+            baseline = json.load(file)
+        regressions = compare(report, baseline, args.tolerance)
+        for endpoint, stat, previous, value in regressions:
+            print(f"REGRESSION {endpoint} {stat}: {previous:.2f} -> {value:.2f}")
+        if regressions:
+            sys.exit(1)
+        print(f"no regression against {args.baseline} (tolerance {args.tolerance:.0%})")
+
+
+if __name__ == "__main__":
+    main()
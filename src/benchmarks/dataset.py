@@ -0,0 +1,232 @@
+"""
+Synthetic dataset generator: phrases with embedded meanings (the shape of datalayer/add_first_rows.py)
+and the votes on them, at any scale, in constant memory.
+
+- tags follow a Zipf distribution over a vocabulary of --tags tags (a few are on most phrases),
+- every phrase has 1 to 10 meanings (mostly few) with varied tones, and heavy-tailed view counts,
+- votes come from IPs with heavy-tailed activity (most vote a few times, some hundreds of times)
+  and go mostly to the popular (oldest) phrases; an IP never votes twice on a meaning.
+
+Everything is derived from --seed and the phrase number (ids included), so the same arguments always
+give the same data and the votes never need the phrases in memory.
+
+usage (from src/):
+    python -m benchmarks.dataset --scale 100k                            # into BENCH_DB_NAME (womanslation_bench by default)
+    python -m benchmarks.dataset --phrases 1000000 --votes 10000000 --out data/ --gzip
+The NDJSON files are MongoDB extended JSON, load them with mongoimport then run
+`manage.py reconcile-likes`, `manage.py rebuild-tag-facets` and `manage.py ensure-indexes`.
+"""
+import argparse
+import datetime
+import gzip
+import itertools
+import os
+import random
+
+from bson import ObjectId, json_util
+from datalayer import ToneEnum, ensure_indexes, get_db
+from Models import Tag, User_Vote
+from benchmarks import check_bench_db
+from benchmarks.search import WORDS
+
+SCALES = {
+    "1k": {"phrases": 1000, "votes": 10000},
+    "100k": {"phrases": 100000, "votes": 1000000},
+    "1m": {"phrases": 1000000, "votes": 10000000},
+}
+
+FIRST_DATE = datetime.datetime(2023, 1, 1)
+TONES = [tone.value for tone in ToneEnum]
+# most used tags first, the vocabulary continues with tag-20, tag-21, ...
+TAGS = ["testing", "reassurance", "love", "anger", "sarcasm", "playful", "jealousy", "food", "time", "money",
+        "friends", "family", "plans", "gifts", "work", "trust", "sorry", "fine", "busy", "attention"]
+MEANING_COUNT_WEIGHTS = [30, 25, 15, 10, 7, 5, 3, 2, 2, 1]  # 1 to 10 meanings
+BENCHMARK_COLLECTIONS = ["phrases", "user_votes", "tag_facets", "phrase_activity", "rankings"]
+
+
+def phrase_id(number: int) -> ObjectId:
+    return ObjectId(f"{number:024x}")
+
+
+def meaning_id(number: int, position: int) -> str:
+    return f"{number:020x}{position:04x}"
+
+
+def vote_ip(number: int) -> str:
+    return f"10.{number >> 16 & 255}.{number >> 8 & 255}.{number & 255}"
+
+
+def _phrase_rng(seed: int, number: int) -> random.Random:
+    return random.Random(seed * 1_000_003 + number)
+
+
+def _draw_meaning_count(rng: random.Random) -> int:
+    return rng.choices(range(1, 11), weights=MEANING_COUNT_WEIGHTS)[0]
+
+
+def meaning_count(seed: int, number: int) -> int:
+    """
+    Number of meanings of phrase `number` (the first draw of its generator), without generating it.
+    """
+    return _draw_meaning_count(_phrase_rng(seed, number))
+
+
+def tag_vocabulary(size: int, exponent: float = 1.1) -> tuple:
+    """
+    (tags, cumulative Zipf weights) of a vocabulary of `size` tags.
+    """
+    tags = TAGS[:size] + [f"tag-{rank}" for rank in range(len(TAGS), size)]
+    return tags, list(itertools.accumulate(1 / rank ** exponent for rank in range(1, size + 1)))
+
+
+def make_phrase(seed: int, number: int, vocabulary: tuple) -> dict:
+    """
+    The document of phrase `number`, the same for a given seed and vocabulary.
+    """
+    rng = _phrase_rng(seed, number)
+    meanings = _draw_meaning_count(rng)  # first draw, see meaning_count
+    text = " ".join(rng.choices(WORDS, k=rng.randint(3, 8))) + f" #{number}"
+    create_date = FIRST_DATE + datetime.timedelta(minutes=number)
+
+    tags, cum_weights = vocabulary
+    phrase_tags = set(rng.choices(tags, cum_weights=cum_weights, k=rng.randint(1, 5)))
+
+    return {
+        "_id": phrase_id(number),
+        "text": text,
+        "text_lower": text.lower(),
+        "create_date": create_date,
+        "suggested_response": " ".join(rng.choices(WORDS, k=rng.randint(6, 14))),
+        "tags": sorted(phrase_tags),
+        "views": min(10 ** 7, int(rng.paretovariate(1.2) * 20) - 20),
+        "meanings": [{
+            "id": meaning_id(number, position),
+            "phrase_id": str(phrase_id(number)),
+            "meaning": " ".join(rng.choices(WORDS, k=rng.randint(5, 12))),
+            "tone": rng.choice(TONES),
+            "confidence": rng.randint(0, 100),
+            "warning_level": rng.randint(0, 5),
+            "like_count": 0,
+            "create_date": create_date + datetime.timedelta(minutes=position),
+        } for position in range(meanings)],
+    }
+
+
+def generate_phrases(phrases: int, seed: int = 0, tags: int = 500):
+    vocabulary = tag_vocabulary(tags)
+    for number in range(phrases):
+        yield make_phrase(seed, number, vocabulary)
+
+
+def generate_votes(phrases: int, votes: int, seed: int = 0, max_votes_per_ip: int = 1000):
+    """
+    `votes` votes, IP after IP: each IP votes a Pareto distributed number of times on distinct meanings,
+    phrases drawn with a bias to the first (oldest, most popular) ones.
+    Only the meanings of the current IP are kept in memory.
+    """
+    rng = random.Random(seed)
+    generated = 0
+    for ip_number in itertools.count():
+        if generated >= votes:
+            return
+
+        ip = vote_ip(ip_number)
+        wanted = min(max_votes_per_ip, int(rng.paretovariate(1.2)), votes - generated)
+        voted = set()
+        for _ in range(wanted * 3):  # a few more attempts for the meanings drawn twice
+            if len(voted) == wanted:
+                break
+            number = int(phrases * rng.random() ** 3)
+            meaning = meaning_id(number, rng.randrange(meaning_count(seed, number)))
+            if meaning in voted:
+                continue
+            voted.add(meaning)
+            yield {
+                "phrase_id": str(phrase_id(number)),
+                "meaning_id": meaning,
+                "ip": ip,
+                "like": rng.random() < 0.8,
+                "create_date": FIRST_DATE + datetime.timedelta(seconds=rng.randrange(10 ** 8)),
+            }
+        generated += len(voted)
+
+
+def batched(documents, batch_size: int):
+    iterator = iter(documents)
+    while batch := list(itertools.islice(iterator, batch_size)):
+        yield batch
+
+
+def write_mongo(collection, documents, total: int, batch_size: int = 10000, verbose: bool = True):
+    written = 0
+    for batch in batched(documents, batch_size):
+        collection.insert_many(batch, ordered=False)
+        written += len(batch)
+        if verbose:
+            print(f"\r{written}/{total} {collection.name}", end="", flush=True)
+    if verbose:
+        print()
+
+
+def write_ndjson(path: str, documents, compress: bool = False) -> int:
+    """
+    Write the documents to an NDJSON file (MongoDB extended JSON, gzip compressed when compress is set).
+    """
+    written = 0
+    opener = gzip.open if compress else open
+    with opener(path, "wt", encoding="utf-8") as file:
+        for document in documents:
+            file.write(json_util.dumps(document, json_options=json_util.RELAXED_JSON_OPTIONS))
+            file.write("\n")
+            written += 1
+    return written
+
+
+def seed(phrases: int, votes: int, seed: int = 0, tags: int = 500, batch_size: int = 10000, verbose: bool = True):
+    """
+    Replace the benchmark collections with the generated phrases and votes, then create the indexes
+    (faster after the bulk load) and recompute the like counters and the tag facets.
+    """
+    db = get_db()
+    check_bench_db(db)
+    for collection in BENCHMARK_COLLECTIONS:
+        db[collection].drop()
+
+    write_mongo(db["phrases"], generate_phrases(phrases, seed, tags), phrases, batch_size, verbose)
+    write_mongo(db["user_votes"], generate_votes(phrases, votes, seed), votes, batch_size, verbose)
+
+    ensure_indexes()
+    User_Vote.reconcile_like_counts()
+    Tag.rebuild()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scale", choices=list(SCALES), default="1k")
+    parser.add_argument("--phrases", type=int, help="number of phrases (overrides --scale)")
+    parser.add_argument("--votes", type=int, help="number of votes (overrides --scale)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--tags", type=int, default=500, help="size of the tag vocabulary")
+    parser.add_argument("--batch-size", type=int, default=10000)
+    parser.add_argument("--out", help="write phrases.ndjson and user_votes.ndjson to this directory instead of MongoDB")
+    parser.add_argument("--gzip", action="store_true", help="compress the NDJSON files (.ndjson.gz)")
+    args = parser.parse_args()
+
+    phrases = args.phrases or SCALES[args.scale]["phrases"]
+    votes = args.votes if args.votes is not None else SCALES[args.scale]["votes"]
+
+    if not args.out:
+        seed(phrases, votes, args.seed, args.tags, args.batch_size)
+        print(f"{phrases} phrases and {votes} votes written to {get_db().name}")
+        return
+
+    os.makedirs(args.out, exist_ok=True)
+    extension = ".ndjson.gz" if args.gzip else ".ndjson"
+    for name, documents in (("phrases", generate_phrases(phrases, args.seed, args.tags)),
+                            ("user_votes", generate_votes(phrases, votes, args.seed))):
+        path = os.path.join(args.out, name + extension)
+        print(f"{write_ndjson(path, documents, args.gzip)} documents written to {path}")
+
+
+if __name__ == "__main__":
+    main()
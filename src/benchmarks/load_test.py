@@ -0,0 +1,109 @@
+"""
+HTTP load test of the read and vote endpoints, sync (threadpool) vs async (DB_ASYNC) data layer.
+
+Each mode starts its own uvicorn server on the MongoDB of DB_HOST and the benchmark database (BENCH_DB_NAME),
+then `--concurrency` clients call the endpoints for `--duration` seconds.
+
+usage (from src/):
+    python -m benchmarks.load_test --concurrency 64 --duration 20
+"""
+import argparse
+import asyncio
+import os
+import random
+import subprocess
+import sys
+import time
+
+import httpx
+
+from benchmarks import bench_env
+
+
+def percentile(values: list, fraction: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))] if values else 0.0
+
+
+async def wait_until_up(base_url: str, timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient(base_url=base_url) as client:
+        while time.monotonic() < deadline:
+            try:
+                if (await client.get("/")).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.5)
+    raise RuntimeError(f"server at {base_url} did not start")
+
+
+async def run_load(base_url: str, concurrency: int, duration: float) -> dict:
+    async with httpx.AsyncClient(base_url=base_url, timeout=30, limits=httpx.Limits(max_connections=concurrency)) as client:
+        phrases = (await client.get("/phrases", params={"page_size": 50, "include": "meanings"})).json()["data"] or []
+        targets = [(phrase["id"], meaning["id"]) for phrase in phrases for meaning in phrase.get("meanings") or []]
+        if not targets:
+            raise RuntimeError("no phrases with meanings in the database, start the app once to seed it")
+
+        latencies = []
+        errors = 0
+        deadline = time.monotonic() + duration
+
+        async def worker(number: int):
+            nonlocal errors
+            rng = random.Random(number)
+            headers = {"x-forwarded-for": f"10.0.{number // 250}.{number % 250 + 1}"}
+            while time.monotonic() < deadline:
+                phrase_id, meaning_id = rng.choice(targets)
+                request = rng.choices([
+                    ("GET", "/phrases", {"page_size": 20}),
+                    ("GET", f"/phrases/{phrase_id}/meanings", None),
+                    ("GET", "/user_vote/current_user", None),
+                    ("POST", f"/phrases/{phrase_id}/meanings/{meaning_id}/vote", {"like": rng.random() < 0.7}),
+                ], weights=[60, 20, 10, 10])[0]
+
+                started = time.perf_counter()
+                response = await client.request(request[0], request[1], params=request[2], headers=headers)
+                latencies.append((time.perf_counter() - started) * 1000)
+                if response.status_code != 200:
+                    errors += 1
+
+        started = time.monotonic()
+        await asyncio.gather(*(worker(number) for number in range(concurrency)))
+        elapsed = time.monotonic() - started
+
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": len(latencies) / elapsed,
+        "p50_ms": percentile(latencies, 0.50),
+        "p99_ms": percentile(latencies, 0.99),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--duration", type=float, default=20)
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--modes", nargs="+", default=["sync", "async"], choices=["sync", "async"])
+    args = parser.parse_args()
+
+    print(f"{'mode':>6} {'requests':>9} {'errors':>7} {'req/s':>9} {'p50 ms':>8} {'p99 ms':>8}")
+    for mode in args.modes:
+        env = bench_env(DB_ASYNC="true" if mode == "async" else "false")
+        server = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "apis:app", "--port", str(args.port), "--log-level", "warning"],
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))), env=env)
+        try:
+            base_url = f"http://127.0.0.1:{args.port}"
+            asyncio.run(wait_until_up(base_url))
+            result = asyncio.run(run_load(base_url, args.concurrency, args.duration))
+            print(f"{mode:>6} {result['requests']:>9} {result['errors']:>7} {result['rps']:>9.1f} {result['p50_ms']:>8.2f} {result['p99_ms']:>8.2f}")
+        finally:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == "__main__":
+    main()
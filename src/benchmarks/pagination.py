@@ -0,0 +1,67 @@
+"""
+Pagination latency benchmark: page-number (skip/limit) vs cursor (keyset) pages, first page vs a deep page.
+
+usage (from src/, needs a running MongoDB, uses its own database BENCH_DB_NAME):
+    python -m benchmarks.pagination --size 200000 --deep-page 10000 --repeat 20
+"""
+import argparse
+import os
+import statistics
+import time
+
+# every repeat has to run the query, not read the response cache
+os.environ.setdefault("CACHE_ENABLED", "false")
+
+from benchmarks import check_bench_db
+from benchmarks.search import seed
+from datalayer import SortEnum, get_db
+from Models import Phrase
+
+ORDERS = {
+    SortEnum.newest: [("create_date", -1), ("_id", -1)],
+    SortEnum.most_viewed: [("views", -1), ("_id", -1)],
+    SortEnum.A_Z: [("text", 1)],
+}
+
+
+def timed(function, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = function()
+        timings.append((time.perf_counter() - started) * 1000)
+        assert result.success, result.message
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, default=200000)
+    parser.add_argument("--page-size", type=int, default=10)
+    parser.add_argument("--deep-page", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    db = get_db()
+    check_bench_db(db)
+    seed(args.size)
+
+    print(f"{'order':>12} {'page':>8} {'skip ms':>9} {'cursor ms':>10}")
+    for order, order_by in ORDERS.items():
+        for page in (1, args.deep_page):
+            offset = (page - 1) * args.page_size
+            cursor = ""
+            if offset:
+                # the cursor the client would hold after reading the previous page
+                previous = next(db["phrases"].find({}).sort(order_by).skip(offset - 1).limit(1))
+                cursor = Phrase.encode_cursor(order, previous, order_by)
+
+            skip_ms = timed(lambda: Phrase.get_phrases(pageIndex=page - 1, pageSize=args.page_size, pageOrder=order), args.repeat)
+            cursor_ms = timed(lambda: Phrase.get_phrases(pageSize=args.page_size, pageOrder=order, cursor=cursor), args.repeat)
+            print(f"{order.value:>12} {page:>8} {skip_ms:>9.2f} {cursor_ms:>10.2f}")
+
+    db["phrases"].drop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Search latency benchmark: text vs prefix vs (escaped) regex search on a synthetic phrase catalog.
+
+usage (from src/, needs a running MongoDB, uses its own database BENCH_DB_NAME):
+    python -m benchmarks.search --sizes 10000 100000 1000000 --queries 200
+"""
+import argparse
+import datetime
+import os
+import random
+import statistics
+import time
+
+# every repeat has to run the query, not read the response cache
+os.environ.setdefault("CACHE_ENABLED", "false")
+
+from benchmarks import check_bench_db
+from datalayer import SearchModeEnum, ensure_indexes, get_db
+from Models import Phrase
+
+WORDS = ["love", "fine", "whatever", "want", "really", "think", "mean", "tired", "nothing", "okay",
+         "busy", "hungry", "decide", "call", "later", "miss", "friend", "sorry", "remember", "change",
+         "today", "again", "always", "never", "listen", "promise", "care", "talk", "wrong", "happy"]
+
+
+def seed(size: int, batch_size: int = 10000):
+    """
+    Fill the phrases collection with `size` synthetic phrases.
+    """
+    rng = random.Random(size)
+    first_date = datetime.datetime(2023, 1, 1)
+    db = get_db()
+    check_bench_db(db)
+    db["phrases"].drop()
+    ensure_indexes()
+
+    for start in range(0, size, batch_size):
+        batch = []
+        for number in range(start, min(start + batch_size, size)):
+            text = " ".join(rng.choices(WORDS, k=rng.randint(3, 8))) + f" #{number}"
+            batch.append({
+                "text": text,
+                "text_lower": text.lower(),
+                "suggested_response": " ".join(rng.choices(WORDS, k=6)),
+                "tags": rng.sample(WORDS, 3),
+                "views": rng.randint(0, 1000),
+                "create_date": first_date + datetime.timedelta(minutes=rng.randint(0, 1000000)),
+                "meanings": [{"id": f"{number}-{i}", "meaning": " ".join(rng.choices(WORDS, k=8)), "like_count": 0} for i in range(2)],
+            })
+        db["phrases"].insert_many(batch, ordered=False)
+
+
+def measure(mode: SearchModeEnum, terms: list) -> dict:
+    timings = []
+    for term in terms:
+        started = time.perf_counter()
+        result = Phrase.get_phrases(pageSize=10, searchText=term, searchMode=mode)
+        timings.append((time.perf_counter() - started) * 1000)
+        assert result.success, result.message
+
+    timings.sort()
+    return {"p50": statistics.median(timings), "p95": timings[int(len(timings) * 0.95) - 1]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 1000000])
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    print(f"{'phrases':>10} {'mode':>8} {'p50 ms':>9} {'p95 ms':>9}")
+    for size in args.sizes:
+        seed(size)
+        terms = [" ".join(rng.choices(WORDS, k=2)) for _ in range(args.queries)]
+        for mode in SearchModeEnum:
+            # prefix search is an autocomplete, feed it the first letters only
+            mode_terms = [term[:4] for term in terms] if mode == SearchModeEnum.prefix else terms
+            result = measure(mode, mode_terms)
+            print(f"{size:>10} {mode.value:>8} {result['p50']:>9.2f} {result['p95']:>9.2f}")
+
+    get_db()["phrases"].drop()
+
+
+if __name__ == "__main__":
+    main()
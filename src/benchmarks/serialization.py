@@ -0,0 +1,115 @@
+"""
+Serialization benchmark of a phrases page: Phrase(**data) models serialized by FastAPI through
+response_model (before) vs construct_trusted (model_validate) + FastJSONResponse (after). The database is not queried.
+
+usage (from src/):
+    python -m benchmarks.serialization --page-size 100 --meanings 3 --repeat 200
+"""
+import argparse
+import asyncio
+import datetime
+import random
+import statistics
+import time
+
+from bson import ObjectId
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+try:
+    from fastapi.utils import create_model_field
+except ImportError:  # FastAPI before 0.115
+    from fastapi.utils import create_response_field as create_model_field
+from apis.responses import FastJSONResponse, orjson
+from datalayer import ResponseModel, ToneEnum
+from Models import Phrase
+from benchmarks.search import WORDS
+
+# the response field FastAPI built for `@app.get("/phrases", response_model=ResponseModel)`
+RESPONSE_FIELD = create_model_field(name="Response_get_phrases", type_=ResponseModel, mode="serialization")
+_loop = asyncio.new_event_loop()  # FastAPI serializes in the event loop of the request
+
+
+def make_documents(page_size: int, meanings: int) -> list:
+    """
+    Phrase documents as they are read from MongoDB.
+    """
+    rng = random.Random(page_size)
+    documents = []
+    for number in range(page_size):
+        phrase_id = ObjectId()
+        create_date = datetime.datetime(2024, 1, 1) + datetime.timedelta(minutes=number)
+        text = " ".join(rng.choices(WORDS, k=6)) + f" #{number}"
+        documents.append({
+            "_id": phrase_id,
+            "text": text,
+            "text_lower": text.lower(),
+            "suggested_response": " ".join(rng.choices(WORDS, k=10)),
+            "tags": rng.sample(WORDS, 3),
+            "views": rng.randint(0, 10000),
+            "create_date": create_date,
+            "meanings": [{
+                "id": str(ObjectId()),
+                "phrase_id": str(phrase_id),
+                "meaning": " ".join(rng.choices(WORDS, k=12)),
+                "tone": rng.choice(list(ToneEnum)).value,
+                "confidence": rng.randint(0, 100),
+                "warning_level": rng.randint(0, 5),
+                "like_count": rng.randint(0, 500),
+                "create_date": create_date,
+            } for _ in range(meanings)],
+        })
+    return documents
+
+
+def validated_page(documents: list) -> bytes:
+    """
+    The original endpoint path: every document validated into a Phrase by convert_mongo_to_phrase,
+    then the returned ResponseModel serialized by FastAPI (`response_model=ResponseModel`, nothing excluded)
+    and rendered by its default JSONResponse.
+    """
+    phrases = []
+    for document in documents:
+        data = document.copy()
+        data["id"] = str(data.pop("_id"))
+        phrases.append(Phrase(**data))
+
+    result = ResponseModel(success=True, data=phrases)
+    content = _loop.run_until_complete(serialize_response(field=RESPONSE_FIELD, response_content=result, is_coroutine=True))
+    return JSONResponse(content).body
+
+
+def trusted_page(documents: list) -> bytes:
+    """
+    The current path: construct_trusted (model_validate in pydantic-core) and a single dump rendered by FastJSONResponse.
+    """
+    result = ResponseModel(success=True, data=[Phrase.convert_mongo_to_phrase(document) for document in documents])
+    return FastJSONResponse(result, exclude_none=True).body
+
+
+def timed(function, documents: list, repeat: int) -> tuple:
+    timings = []
+    body = b""
+    for _ in range(repeat):
+        started = time.perf_counter()
+        body = function(documents)
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings), len(body)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--page-size", type=int, default=100)
+    parser.add_argument("--meanings", type=int, default=3, help="meanings per phrase")
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    documents = make_documents(args.page_size, args.meanings)
+    print(f"{args.page_size} phrases x {args.meanings} meanings, orjson {'installed' if orjson else 'missing (json fallback)'}")
+    print(f"{'path':>10} {'median ms':>10} {'bytes':>8}")
+    for name, function in (("validated", validated_page), ("trusted", trusted_page)):
+        median_ms, size = timed(function, documents, args.repeat)
+        print(f"{name:>10} {median_ms:>10.3f} {size:>8}")
+
+
+if __name__ == "__main__":
+    main()
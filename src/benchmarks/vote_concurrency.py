@@ -0,0 +1,173 @@
+"""
+Automated concurrency check of the votes: many threads vote on the same meanings from a few IPs,
+first with the code path before the atomic upsert (find the vote, then insert or update it), then with
+User_Vote.create. Runs in-process on its own database (BENCH_DB_NAME), seeded here, no server needed;
+tests/test_votes.py fires the concurrent votes at the HTTP endpoint.
+
+Afterwards every (meaning_id, ip) must have exactly one vote and every like_count must equal the number
+of likes in user_votes. Prints the p50/p99 latency of both paths with their errors, duplicates and drift,
+and exits with 1 when User_Vote.create broke one of these (the old path is only reported).
+
+usage (from src/, needs a running MongoDB):
+    python -m benchmarks.vote_concurrency --threads 32 --votes 200
+    python -m benchmarks.vote_concurrency --report votes.json
+"""
+import argparse
+import datetime
+import json
+import os
+import random
+import threading
+import time
+
+os.environ.setdefault("CACHE_ENABLED", "false")
+
+from datalayer import ensure_indexes, get_db
+from Models import User_Vote
+from benchmarks import check_bench_db
+from benchmarks.dataset import make_phrase, tag_vocabulary
+from benchmarks.load_test import percentile
+
+FIRST_NUMBER = 10 ** 9  # phrase numbers far from the ones of benchmarks.dataset, so a seeded dataset is not touched
+
+
+def legacy_create(vote: User_Vote) -> bool:
+    """
+    The vote path before the atomic upsert: the duplicate check and the write are separate calls, so two
+    concurrent votes of a user can both insert (the second fails on the unique index) or both change the like counter.
+    """
+    db = get_db()
+    existing = db["user_votes"].find_one({"meaning_id": vote.meaning_id, "ip": vote.ip}, {"_id": 1})
+    vote.create_date = datetime.datetime.now()
+    if existing:
+        previous = db["user_votes"].find_one_and_update({"_id": existing["_id"]}, {"$set": vote.dict(exclude={"id"})})
+        if previous and previous["like"] != vote.like:
+            User_Vote.change_like_count(vote.phrase_id, vote.meaning_id, 1 if vote.like else -1)
+        return previous is not None
+
+    db["user_votes"].insert_one(vote.dict(exclude={"id"}))
+    if vote.like:
+        User_Vote.change_like_count(vote.phrase_id, vote.meaning_id, 1)
+    return True
+
+
+def current_create(vote: User_Vote) -> bool:
+    return User_Vote.create(vote).success
+
+
+def prepare(phrases: int) -> list:
+    """
+    (Re)create the voted phrases with zero likes and no votes, return their (phrase_id, meaning_id).
+    """
+    db = get_db()
+    check_bench_db(db)
+    vocabulary = tag_vocabulary(20)
+    documents = [make_phrase(0, FIRST_NUMBER + number, vocabulary) for number in range(phrases)]
+    phrase_ids = [document["_id"] for document in documents]
+
+    db["phrases"].delete_many({"_id": {"$in": phrase_ids}})
+    db["user_votes"].delete_many({"phrase_id": {"$in": [str(phrase_id) for phrase_id in phrase_ids]}})
+    db["phrases"].insert_many(documents)
+    return [(meaning["phrase_id"], meaning["id"]) for document in documents for meaning in document["meanings"]]
+
+
+def check(targets: list) -> dict:
+    """
+    Duplicated votes and like_count drift ({meaning_id: [counter, likes]}) of the voted meanings.
+    """
+    db = get_db()
+    meaning_ids = [meaning_id for _, meaning_id in targets]
+
+    duplicates = list(db["user_votes"].aggregate([
+        {"$match": {"meaning_id": {"$in": meaning_ids}}},
+        {"$group": {"_id": {"meaning_id": "$meaning_id", "ip": "$ip"}, "count": {"$sum": 1}}},
+        {"$match": {"count": {"$gt": 1}}},
+    ]))
+    likes = {row["_id"]: row["count"] for row in db["user_votes"].aggregate([
+        {"$match": {"meaning_id": {"$in": meaning_ids}, "like": True}},
+        {"$group": {"_id": "$meaning_id", "count": {"$sum": 1}}},
+    ])}
+    counters = {}
+    for phrase in db["phrases"].find({"meanings.id": {"$in": meaning_ids}}, {"meanings.id": 1, "meanings.like_count": 1}):
+        counters.update({meaning["id"]: meaning.get("like_count", 0) for meaning in phrase["meanings"]})
+
+    drift = {meaning_id: [counters.get(meaning_id), likes.get(meaning_id, 0)] for meaning_id in meaning_ids
+             if counters.get(meaning_id) != likes.get(meaning_id, 0)}
+    return {"duplicates": len(duplicates), "drift": drift}
+
+
+def run(create, phrases: int, threads: int, votes: int, ips: int, seed: int) -> dict:
+    """
+    `threads` threads each cast `votes` votes through create, started together.
+    """
+    targets = prepare(phrases)
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    start = threading.Barrier(threads)
+
+    def worker(number: int):
+        rng = random.Random(seed * 100_000 + number)
+        start.wait()
+        for _ in range(votes):
+            phrase_id, meaning_id = rng.choice(targets)
+            vote = User_Vote(phrase_id=phrase_id, meaning_id=meaning_id, ip=f"10.1.0.{rng.randrange(ips) + 1}",
+                             like=rng.random() < 0.5)
+            started = time.perf_counter()
+            try:
+                success = create(vote)
+            except Exception:
+                success = False
+            elapsed = (time.perf_counter() - started) * 1000
+            with lock:
+                latencies.append(elapsed)
+                errors[0] += not success
+
+    workers = [threading.Thread(target=worker, args=(number,)) for number in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+
+    return {
+        "requests": len(latencies),
+        "errors": errors[0],
+        "p50_ms": percentile(latencies, 0.50),
+        "p99_ms": percentile(latencies, 0.99),
+        **check(targets),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threads", type=int, default=32)
+    parser.add_argument("--votes", type=int, default=200, help="votes per thread")
+    parser.add_argument("--ips", type=int, default=5, help="distinct client IPs shared by the threads")
+    parser.add_argument("--phrases", type=int, default=1, help="phrases whose meanings are voted on")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--report", help="write the JSON report to this file")
+    args = parser.parse_args()
+
+    ensure_indexes()
+    results = {}
+    for name, create in (("before", legacy_create), ("after", current_create)):
+        results[name] = run(create, args.phrases, args.threads, args.votes, args.ips, args.seed)
+
+    print(f"{'path':>7} {'requests':>9} {'errors':>7} {'p50 ms':>8} {'p99 ms':>8} {'duplicates':>11} {'drifted':>8}")
+    for name, stats in results.items():
+        print(f"{name:>7} {stats['requests']:>9} {stats['errors']:>7} {stats['p50_ms']:>8.2f} {stats['p99_ms']:>8.2f} "
+              f"{stats['duplicates']:>11} {len(stats['drift']):>8}")
+
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as file:
+            json.dump({"config": vars(args), "results": results}, file, indent=2)
+
+    after = results["after"]
+    if after["errors"] or after["duplicates"] or after["drift"]:
+        print(f"FAILED: {after['errors']} errors, {after['duplicates']} duplicated votes, like_count drift {after['drift'] or 'none'}")
+        raise SystemExit(1)
+    print("no duplicated vote and no like_count drift")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,16 @@
-from .base import Base, ResponseModel, SortEnum, ToneEnum, my_logger, get_ip, set_request_context
-from .database import get_db
+from .base import Base, ResponseModel, SortEnum, RankingEnum, SearchModeEnum, TagModeEnum, ExportCollectionEnum, ToneEnum, my_logger, get_ip, set_request_context
+from .database import ConnectionManager, connection, wait_for_db, get_db, get_async_db, get_read_db, get_async_read_db, get_user_db, get_async_user_db, mark_user_write, set_write_token, async_db_enabled
+from .indexes import DECLARED_INDEXES, get_declared_indexes, ensure_indexes, require_indexes
+from .search_index import PhraseSearchIndex, search_index
+from .vote_index import VoteMembershipIndex, vote_index
+from .metrics import register_metric, render_metrics
+from .instrumentation import RequestDbStats, QueryListener, instrumentation_enabled, query_listener
+from .cache import InProcessCacheBackend, RedisCacheBackend, ResponseCache, response_cache
+from .view_buffer import ViewCounterBuffer, view_buffer
+from .vote_queue import QueueFullError, VoteIngestionQueue, vote_queue
+from .rankings import PhraseRankings, rankings
+from .export import export_documents, stream_export
+from .change_stream import ChangeStreamSubscriber, change_stream
 from .add_first_rows import insert_data_from_json
 
-__all__ = ["Base", "ResponseModel", "SortEnum", "ToneEnum", "my_logger", "get_ip", "set_request_context", "get_db", "insert_data_from_json"]
\ No newline at end of file
+__all__ = ["Base", "ResponseModel", "SortEnum", "RankingEnum", "SearchModeEnum", "TagModeEnum", "ExportCollectionEnum", "ToneEnum", "my_logger", "get_ip", "set_request_context", "ConnectionManager", "connection", "wait_for_db", "get_db", "get_async_db", "get_read_db", "get_async_read_db", "get_user_db", "get_async_user_db", "mark_user_write", "set_write_token", "async_db_enabled", "DECLARED_INDEXES", "get_declared_indexes", "ensure_indexes", "require_indexes", "PhraseSearchIndex", "search_index", "VoteMembershipIndex", "vote_index", "register_metric", "render_metrics", "RequestDbStats", "QueryListener", "instrumentation_enabled", "query_listener", "InProcessCacheBackend", "RedisCacheBackend", "ResponseCache", "response_cache", "ViewCounterBuffer", "view_buffer", "QueueFullError", "VoteIngestionQueue", "vote_queue", "PhraseRankings", "rankings", "export_documents", "stream_export", "ChangeStreamSubscriber", "change_stream", "insert_data_from_json"]
\ No newline at end of file
@@ -419,18 +419,9 @@ def insert_data_from_json():
     try:
         db = get_db()
         
-        collections = db.list_collection_names()
-
-        # Check if a collection exists
-        if "phrases" not in collections:
-            for item in data:
-                # Convert each item to a Phrase object
-                if isinstance(item, dict):
-                    item = Phrase(**item)
-                elif isinstance(item, list):
-                    item = [Phrase(**i) for i in item]
-
-                Phrase.create(item)
+        # Check if the collection is empty (it may already exist because of its indexes)
+        if db["phrases"].estimated_document_count() == 0:
+            Phrase.bulk_import(data)
 
     except Exception as e:
         print(f"An error occurred while inserting data: {e}")
@@ -1,5 +1,6 @@
 import datetime
 import logging
+import os
 from pydantic import BaseModel
 from typing import Optional
 from enum import Enum
@@ -7,7 +8,7 @@ from contextvars import ContextVar
 from fastapi import Request
 
 my_logger = logging.getLogger("my_logger")
-logging.basicConfig(level=logging.ERROR, filename="my_logger.log")
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "ERROR").upper(), filename="my_logger.log")
 
 _request_context: ContextVar[Request] = ContextVar("request")
 
@@ -40,6 +41,17 @@ class Base(BaseModel):
     id: Optional[str] = None
     create_date: Optional[datetime.datetime] = None
 
+    @classmethod
+    def construct_trusted(cls, data: dict):
+        """
+        Build an instance from data written by this application (MongoDB documents, cache entries), _id becomes id.
+        model_validate runs in pydantic-core and builds the nested models, enums and cached dates in one pass:
+        faster than model_construct, whose Python loop (and fix-ups) dominated the list responses.
+        """
+        if "_id" in data:
+            data = {**data, "id": str(data["_id"])}
+        return cls.model_validate(data)
+
 
 class ResponseModel(BaseModel):
     """
@@ -48,6 +60,7 @@ class ResponseModel(BaseModel):
     success: bool
     message: Optional[str] = None
     data: Optional[object] = None
+    next_cursor: Optional[str] = None  # for keyset paginated lists, the cursor of the next page
 
 
 class SortEnum(str, Enum):
@@ -56,6 +69,25 @@ class SortEnum(str, Enum):
     oldest = 'oldest'
     newest = 'newest'
     most_viewed = 'most_viewed'
+    relevance = 'relevance'
+    trending = 'trending'  # recent views and votes, precomputed by the rankings job
+
+class RankingEnum(str, Enum):
+    trending = 'trending'
+    most_viewed = 'most_viewed'
+
+class SearchModeEnum(str, Enum):
+    text = 'text'  # full-text search on the text index, relevance-ranked
+    prefix = 'prefix'  # autocomplete, phrases starting with the search text
+    regex = 'regex'  # old behaviour, substring match (the input is escaped)
+
+class TagModeEnum(str, Enum):
+    any = 'any'  # phrases having at least one of the tags (OR)
+    all = 'all'  # phrases having every tag (AND)
+
+class ExportCollectionEnum(str, Enum):
+    phrases = 'phrases'  # phrases with their embedded meanings
+    user_votes = 'user_votes'
 
 class ToneEnum(str, Enum):
     a = 'Passive-aggressive'
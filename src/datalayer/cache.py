@@ -0,0 +1,241 @@
+import asyncio
+import json
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Optional
+from .base import my_logger
+from .metrics import register_metric
+
+
+class InProcessCacheBackend:
+    """
+    LRU cache with a TTL per entry, local to the process.
+    """
+
+    blocking = False  # memory only, called directly from the event loop
+
+    def __init__(self, max_entries: int = 1000):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._counters = {}  # counters never expire and are not evicted
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            if key in self._counters:
+                return str(self._counters[key])
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key: str, value: str, ttl: float):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def incr(self, key: str) -> int:
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + 1
+            return self._counters[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class RedisCacheBackend:
+    """
+    Cache backend on a Redis-compatible client (redis-py, fakeredis, ...): only get, set(ex=) and incr are used.
+    Its calls wait for the network, the async methods of ResponseCache run them in a thread.
+    """
+
+    blocking = True
+
+    def __init__(self, client):
+        self.client = client
+
+    def get(self, key: str) -> Optional[str]:
+        value = self.client.get(key)
+        return value.decode() if isinstance(value, bytes) else value
+
+    def set(self, key: str, value: str, ttl: float):
+        self.client.set(key, value, ex=max(1, int(ttl)))
+
+    def incr(self, key: str) -> int:
+        return int(self.client.incr(key))
+
+    def clear(self):
+        pass  # old entries become unreachable when the generation changes and expire with their TTL
+
+
+class ResponseCache:
+    """
+    Read-through cache of phrase responses, keyed by the normalized query parameters.
+
+    Entries only hold data shared by every user (JSON), per-user fields like is_liked_by_user are
+    overlaid by the caller after reading. Every key contains a generation number: invalidate() bumps it,
+    so all entries written before a change are never read again (on every backend).
+
+    A change of one phrase doesn't need to drop everything: the responses about a single phrase also carry
+    its own generation, and the lists carry the generations of the topics they show of their phrases
+    (TOPICS). invalidate_phrases bumps only these, so e.g. a like keeps the summary pages cached.
+    """
+
+    GENERATION_KEY = "womanslation:cache:generation"
+    # meanings: the page embeds meanings (like counts), meaning_count: it shows their number,
+    # search: it's a search result (the meanings are searched too)
+    TOPICS = ("meanings", "meaning_count", "search")
+
+    def __init__(self, backend, ttl: float = 30, enabled: bool = True):
+        self.backend = backend
+        self.ttl = ttl
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, namespace: str, params: dict, phrase_id: Optional[str] = None, topics: tuple = ()) -> str:
+        """
+        Cache key of a response. Build it before reading the database, so a response read
+        while an invalidation happens is stored under the old generation and never served.
+        phrase_id is set for a response about that phrase only, topics for a list (see TOPICS).
+        """
+        if not self.enabled:
+            return ""
+        generation_keys = [self.GENERATION_KEY] + [f"{self.GENERATION_KEY}:{topic}" for topic in topics]
+        if phrase_id:
+            generation_keys.append(f"{self.GENERATION_KEY}:phrase:{phrase_id}")
+        try:
+            generation = ".".join(self.backend.get(key) or "0" for key in generation_keys)
+        except Exception as e:
+            my_logger.error(f"Error reading cache generation: {e}")
+            return ""
+        return f"womanslation:cache:{generation}:{namespace}:{json.dumps(params, sort_keys=True, default=str)}"
+
+    def get(self, key: str) -> Optional[object]:
+        if not key:
+            return None
+        try:
+            value = self.backend.get(key)
+        except Exception as e:
+            my_logger.error(f"Error reading cache {key}: {e}")
+            return None
+
+        if value is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return json.loads(value)
+
+    def set(self, key: str, value: object):
+        if not key:
+            return
+        try:
+            self.backend.set(key, json.dumps(value, default=str), self.ttl)
+        except Exception as e:
+            my_logger.error(f"Error writing cache {key}: {e}")
+
+    def invalidate(self):
+        """
+        Forget every cached response. Called by every create/update/delete of phrases, meanings and likes.
+        """
+        if not self.enabled:
+            return
+        try:
+            self.backend.incr(self.GENERATION_KEY)
+            self.backend.clear()
+        except Exception as e:
+            my_logger.error(f"Error invalidating cache: {e}")
+
+    def invalidate_phrases(self, phrase_ids, topics: tuple = ("meanings",)):
+        """
+        Forget the cached responses about these phrases and the lists showing one of the changed topics.
+        A phrase generation is a random token kept for twice the TTL: the entries built under the previous
+        one have all expired when it goes back to the default.
+        """
+        if not self.enabled:
+            return
+        try:
+            for phrase_id in set(phrase_ids):
+                self.backend.set(f"{self.GENERATION_KEY}:phrase:{phrase_id}", uuid.uuid4().hex[:12], self.ttl * 2)
+            for topic in topics:
+                self.backend.incr(f"{self.GENERATION_KEY}:{topic}")
+        except Exception as e:
+            my_logger.error(f"Error invalidating cache of phrases {phrase_ids}: {e}")
+
+    async def _run_async(self, method, *args):
+        if getattr(self.backend, "blocking", True):
+            return await asyncio.to_thread(method, *args)
+        return method(*args)
+
+    async def key_async(self, namespace: str, params: dict, phrase_id: Optional[str] = None, topics: tuple = ()) -> str:
+        """
+        Async versions of key, get, set and the invalidations: a network backend (Redis) is called from a thread,
+        so the async read path doesn't block the event loop while it answers.
+        """
+        return await self._run_async(self.key, namespace, params, phrase_id, topics)
+
+    async def get_async(self, key: str) -> Optional[object]:
+        if not key:
+            return None
+        return await self._run_async(self.get, key)
+
+    async def set_async(self, key: str, value: object):
+        if key:
+            await self._run_async(self.set, key, value)
+
+    async def invalidate_async(self):
+        if self.enabled:
+            await self._run_async(self.invalidate)
+
+    async def invalidate_phrases_async(self, phrase_ids, topics: tuple = ("meanings",)):
+        if self.enabled:
+            await self._run_async(self.invalidate_phrases, phrase_ids, topics)
+
+    def apply_changes(self, events: list):
+        """
+        Change stream consumer: invalidate once for a batch with phrase changes, so the responses cached
+        by this worker don't outlive the writes of the others. Like counts invalidate their phrases as a local
+        vote does; view counts don't (they are flushed all the time, cached pages may show them up to the TTL late).
+        """
+        phrase_events = [event for event in events if event["collection"] == "phrases"]
+        if any(event["operation"] == "reset" for event in events) or any(event["counters"] is None for event in phrase_events):
+            self.invalidate()
+            return
+
+        liked_ids = [event["id"] for event in phrase_events if "like_count" in event["counters"]]
+        if liked_ids:
+            self.invalidate_phrases(liked_ids)
+
+
+def _create_backend():
+    if os.getenv("CACHE_BACKEND", "memory").lower() == "redis":
+        try:
+            import redis
+            return RedisCacheBackend(redis.Redis.from_url(os.getenv("REDIS_URL", "redis://localhost:6379/0")))
+        except ImportError:
+            my_logger.error("CACHE_BACKEND=redis needs the redis package, using the in-process cache")
+
+    return InProcessCacheBackend(max_entries=int(os.getenv("CACHE_MAX_ENTRIES", "1000")))
+
+
+response_cache = ResponseCache(
+    _create_backend(),
+    ttl=float(os.getenv("CACHE_TTL", "30")),
+    enabled=os.getenv("CACHE_ENABLED", "true").lower() == "true")
+
+register_metric("womanslation_cache_hits_total", "counter", "Responses served from the cache", lambda: response_cache.hits)
+register_metric("womanslation_cache_misses_total", "counter", "Responses not found in the cache", lambda: response_cache.misses)
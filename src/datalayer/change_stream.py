@@ -0,0 +1,285 @@
+import datetime
+import os
+import re
+import socket
+import threading
+import time
+import uuid
+from pymongo.errors import DuplicateKeyError, OperationFailure, PyMongoError
+from .base import my_logger
+from .database import get_db
+from .metrics import register_metric
+
+WATCHED_COLLECTIONS = ["phrases", "user_votes"]
+CHANGE_OPERATIONS = ["insert", "update", "replace", "delete"]
+# counter fields of a phrase: an update of only these (view buffer flush, like_count $inc) is a counter update
+COUNTER_FIELDS = r"^(views|meanings\.[0-9]+\.like_count)$"
+_COUNTER_PATTERN = re.compile(COUNTER_FIELDS)
+# the server errors that retrying the same stream can not fix
+HISTORY_LOST = 286  # the resume token is older than the oldest oplog entry
+NOT_A_REPLICA_SET = 40573
+
+
+class ChangeStreamSubscriber:
+    """
+    Follows the writes to phrases and user_votes (of every API worker) with a MongoDB change stream
+    and hands them to the registered consumers, which refresh their in-process state
+    (response cache, search index, vote index). Change streams need a replica set, a single node one is enough.
+
+    Consumers are called from the subscriber thread with a batch of events:
+        {"collection", "operation" (insert, update, replace or delete), "id", "document", "before", "counters"}
+    document is the document after the change (None for a delete), before the deleted document when
+    user_votes has pre-images enabled (None otherwise). counters is set for the updates of phrase counters
+    only (e.g. {"views"} or {"like_count"}): their document is dropped by the server, consumers that only
+    care about the content skip them. A {"operation": "reset"} event means that changes may have been
+    missed (history lost, collection dropped): the consumers reload everything.
+
+    The resume token is stored in the change_stream_tokens collection under `name`-`index` after every
+    delivered batch, so a restarted worker continues where the stream was instead of missing the writes made
+    meanwhile. name is stable (CHANGE_STREAM_NAME, the host name by default) and the workers of a host share it:
+    each one leases the lowest free index (or uses `worker_index`), so a restarted set of workers finds the same
+    tokens again. A lease is renewed with the token and ends on stop() or 3 save intervals after a crash.
+    Tokens not saved for a week expire.
+    """
+
+    def __init__(self, enabled: bool = False, name: str = "api", batch_size: int = 500, max_await_ms: int = 1000,
+                 pre_images: bool = True, retry_delay: float = 5.0, token_save_interval: float = 60,
+                 worker_index: int = None, max_workers: int = 64):
+        self.enabled = enabled
+        self.name = name
+        self.worker_index = worker_index
+        self.max_workers = max_workers
+        self.batch_size = batch_size
+        self.max_await_ms = max_await_ms
+        self.pre_images = pre_images
+        self.retry_delay = retry_delay
+        self.token_save_interval = token_save_interval
+
+        self._consumers = []
+        self._owner = uuid.uuid4().hex
+        self._slot = None  # name-index of the stored token, set when the index is claimed
+        self._token = None
+        self._token_saved_at = 0.0
+        self._stop = threading.Event()
+        self._thread = None
+
+        self.events = 0
+        self.resets = 0
+        self.failures = 0
+
+    def add_consumer(self, callback):
+        """
+        Register callback(events: list), called with every batch of changes.
+        """
+        self._consumers.append(callback)
+
+    def lease_until(self) -> datetime.datetime:
+        return datetime.datetime.now() + datetime.timedelta(seconds=self.token_save_interval * 3)
+
+    def claim_slot(self) -> str:
+        """
+        Lease the token of `name`-`worker_index`, or of the lowest index whose lease ended, and return its _id.
+        The claim is one upsert per index: a slot leased by another worker fails on the _id.
+        """
+        if self.worker_index is not None:
+            return f"{self.name}-{self.worker_index}"
+        for index in range(self.max_workers):
+            slot = f"{self.name}-{index}"
+            try:
+                get_db()["change_stream_tokens"].update_one(
+                    {"_id": slot, "$or": [{"owner": self._owner}, {"leased_until": {"$not": {"$gt": datetime.datetime.now()}}}]},
+                    {"$set": {"owner": self._owner, "leased_until": self.lease_until()}}, upsert=True)
+                return slot
+            except DuplicateKeyError:
+                continue
+        raise RuntimeError(f"all {self.max_workers} change stream slots of {self.name} are leased")
+
+    def release_slot(self):
+        if self._slot is None:
+            return
+        try:
+            get_db()["change_stream_tokens"].update_one(
+                {"_id": self._slot, "owner": self._owner}, {"$set": {"leased_until": datetime.datetime.now()}})
+        except PyMongoError as e:
+            my_logger.error(f"Can not release the change stream slot {self._slot}: {e}")
+        self._slot = None
+
+    def load_token(self):
+        document = get_db()["change_stream_tokens"].find_one({"_id": self._slot})
+        return document.get("token") if document else None
+
+    def save_token(self, token):
+        get_db()["change_stream_tokens"].update_one(
+            {"_id": self._slot}, {"$set": {"token": token, "updated_at": datetime.datetime.now(),
+                                           "owner": self._owner, "leased_until": self.lease_until()}}, upsert=True)
+        self._token_saved_at = time.monotonic()
+
+    def enable_pre_images(self):
+        """
+        Ask the server to keep the deleted votes for the stream (MongoDB 6.0+), so consumers know which
+        vote was deleted. Without them the vote index is reloaded after deletes.
+        """
+        try:
+            get_db().command("collMod", "user_votes", changeStreamPreAndPostImages={"enabled": True})
+        except PyMongoError as e:
+            my_logger.error(f"Can not enable pre-images on user_votes, deleted votes will reload the vote index: {e}")
+
+    @staticmethod
+    def changed_counters(change: dict):
+        """
+        The counters changed by a counter-only phrase update ({"views", "like_count"} or a part), None otherwise.
+        """
+        description = change.get("updateDescription")
+        if change["operationType"] != "update" or change["ns"]["coll"] != "phrases" or not description:
+            return None
+        if description.get("removedFields") or description.get("truncatedArrays"):
+            return None
+
+        fields = list(description.get("updatedFields") or {})
+        if not fields or not all(_COUNTER_PATTERN.match(field) for field in fields):
+            return None
+        return {field.rsplit(".", 1)[-1] for field in fields}
+
+    @staticmethod
+    def to_event(change: dict) -> dict:
+        return {
+            "collection": change["ns"]["coll"],
+            "operation": change["operationType"],
+            "id": str(change["documentKey"]["_id"]),
+            "document": change.get("fullDocument"),
+            "before": change.get("fullDocumentBeforeChange"),
+            "counters": ChangeStreamSubscriber.changed_counters(change),
+        }
+
+    def publish(self, events: list):
+        for consumer in self._consumers:
+            try:
+                consumer(events)
+            except Exception as e:
+                my_logger.error(f"Error in change stream consumer {getattr(consumer, '__qualname__', consumer)}: {e}")
+
+    def reset(self, reason: str):
+        """
+        Forget the resume token and tell the consumers to reload, changes may have been missed.
+        """
+        my_logger.error(f"Change stream reset: {reason}")
+        self.resets += 1
+        self._token = None
+        self.publish([{"collection": None, "operation": "reset", "id": None, "document": None, "before": None, "counters": None}])
+
+    def watch(self):
+        """
+        Open the stream after the last token (now when there's none) and deliver its events until stop()
+        is called or the stream is invalidated.
+        """
+        pipeline = [{"$match": {"$or": [
+            {"ns.coll": {"$in": WATCHED_COLLECTIONS}, "operationType": {"$in": CHANGE_OPERATIONS}},
+            {"ns.coll": {"$in": WATCHED_COLLECTIONS}, "operationType": {"$in": ["drop", "rename"]}},
+            {"operationType": {"$in": ["dropDatabase", "invalidate"]}},
+        ]}}, {"$addFields": {"fullDocument": {"$cond": [
+            # the whole phrase is not sent for a view or like counter update
+            {"$and": [
+                {"$eq": ["$operationType", "update"]},
+                {"$eq": ["$ns.coll", "phrases"]},
+                {"$eq": [{"$size": {"$ifNull": ["$updateDescription.removedFields", []]}}, 0]},
+                {"$allElementsTrue": [{"$map": {
+                    "input": {"$objectToArray": "$updateDescription.updatedFields"},
+                    "in": {"$regexMatch": {"input": "$$this.k", "regex": COUNTER_FIELDS}},
+                }}]},
+            ]},
+            "$$REMOVE", "$fullDocument"]}}}]
+        options = {"full_document": "updateLookup", "max_await_time_ms": self.max_await_ms, "resume_after": self._token}
+        if self.pre_images:
+            options["full_document_before_change"] = "whenAvailable"
+
+        with get_db().watch(pipeline, **options) as stream:
+            events = []
+            while not self._stop.is_set() and stream.alive:
+                change = stream.try_next()
+                if change is not None and change["operationType"] not in CHANGE_OPERATIONS:
+                    if events:
+                        self.publish(events)
+                        self.events += len(events)
+                    self.reset(f"{change['operationType']} of {change.get('ns', {}).get('coll', 'the database')}")
+                    return
+
+                if change is not None:
+                    events.append(self.to_event(change))
+                if events and (change is None or len(events) >= self.batch_size):
+                    self.publish(events)
+                    self.events += len(events)
+                    events = []
+                    self._token = stream.resume_token
+                    self.save_token(self._token)
+                elif change is None:
+                    # quiet collections: keep the stored token recent so it stays in the oplog
+                    self._token = stream.resume_token
+                    if time.monotonic() - self._token_saved_at > self.token_save_interval:
+                        self.save_token(self._token)
+
+    def _run(self):
+        while self._slot is None and not self._stop.is_set():
+            try:
+                self._slot = self.claim_slot()
+            except Exception as e:
+                my_logger.error(f"Can not claim a change stream slot: {e}")
+                self._stop.wait(self.retry_delay)
+
+        try:
+            self._token = self.load_token()
+        except PyMongoError as e:
+            my_logger.error(f"Can not load the change stream resume token: {e}")
+
+        while not self._stop.is_set():
+            try:
+                self.watch()
+
+            except OperationFailure as e:
+                if e.code == NOT_A_REPLICA_SET:
+                    my_logger.error("Change streams need a replica set, in-process state is not shared between workers")
+                    return
+                if e.code == HISTORY_LOST:
+                    self.reset("the resume token is no longer in the oplog")
+                    continue
+                self.failures += 1
+                my_logger.error(f"Change stream failed: {e}")
+                self._stop.wait(self.retry_delay)
+
+            except Exception as e:
+                self.failures += 1
+                my_logger.error(f"Change stream failed: {e}")
+                self._stop.wait(self.retry_delay)
+
+    def start(self):
+        """
+        Start the subscriber thread (nothing when disabled).
+        """
+        if not self.enabled or self._thread is not None:
+            return
+        if self.pre_images:
+            self.enable_pre_images()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="change-stream", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.max_await_ms / 1000 + 5)
+            self._thread = None
+        self.release_slot()
+
+
+change_stream = ChangeStreamSubscriber(
+    enabled=os.getenv("CHANGE_STREAM_ENABLED", "false").lower() == "true",
+    name=os.getenv("CHANGE_STREAM_NAME") or socket.gethostname(),
+    worker_index=int(os.getenv("CHANGE_STREAM_WORKER_INDEX")) if os.getenv("CHANGE_STREAM_WORKER_INDEX") else None,
+    batch_size=int(os.getenv("CHANGE_STREAM_BATCH_SIZE", "500")),
+    pre_images=os.getenv("CHANGE_STREAM_PRE_IMAGES", "true").lower() == "true")
+
+register_metric("womanslation_change_stream_events_total", "counter", "Changes delivered to the in-process consumers",
+                lambda: change_stream.events)
+register_metric("womanslation_change_stream_resets_total", "counter", "Change stream resets (consumers reloaded everything)",
+                lambda: change_stream.resets)
+register_metric("womanslation_change_stream_failures_total", "counter", "Change stream errors (reopened after a delay)",
+                lambda: change_stream.failures)
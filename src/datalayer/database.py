@@ -1,39 +1,256 @@
-import pandas as pd
-from pymongo import MongoClient
 import os
+import threading
 import time
+import pymongo
+from pymongo import AsyncMongoClient, MongoClient
+from pymongo.read_preferences import Primary, PrimaryPreferred, Secondary, SecondaryPreferred, Nearest
+from .base import my_logger, get_current_request
+from .instrumentation import instrumentation_enabled, query_listener
 
-def wait_for_db():
+# client option -> environment variable; only the configured ones are passed, pymongo's defaults otherwise
+_INT_OPTIONS = {
+    "maxPoolSize": "DB_MAX_POOL_SIZE",
+    "minPoolSize": "DB_MIN_POOL_SIZE",
+    "maxIdleTimeMS": "DB_MAX_IDLE_TIME_MS",
+    "connectTimeoutMS": "DB_CONNECT_TIMEOUT_MS",
+    "socketTimeoutMS": "DB_SOCKET_TIMEOUT_MS",
+    "serverSelectionTimeoutMS": "DB_SERVER_SELECTION_TIMEOUT_MS",
+    "waitQueueTimeoutMS": "DB_WAIT_QUEUE_TIMEOUT_MS",
+}
+_STRING_OPTIONS = {
+    "compressors": "DB_COMPRESSORS",  # e.g. zstd,snappy,zlib
+    "readPreference": "DB_READ_PREFERENCE",  # primary, primaryPreferred, secondaryPreferred, ...
+    "appname": "DB_APP_NAME",
+}
+
+
+def get_client_options() -> dict:
     """
-    Wait for the MongoDB database to be ready.
-    This function attempts to connect to the database multiple times
-    until it is available or the maximum number of attempts is reached.
+    MongoClient options read from the environment, with the command listener of the request instrumentation.
     """
-    
-    host = os.getenv("DB_HOST", "mongodb://localhost:27017/")
-    max_attempts = 30
-    attempt = 1
+    options = {"event_listeners": [query_listener]} if instrumentation_enabled else {}
+    for option, variable in _INT_OPTIONS.items():
+        if os.getenv(variable):
+            options[option] = int(os.getenv(variable))
+    for option, variable in _STRING_OPTIONS.items():
+        if os.getenv(variable):
+            options[option] = os.getenv(variable)
+    return options
+
+
+class ConnectionManager:
+    """
+    Owns the MongoDB clients (sync and async) of the process.
+
+    The clients are created on first use, not at import: the application creates them in its startup
+    hook with wait_until_ready(), which pings the server with exponential backoff.
+    """
+
+    def __init__(self, host: str, options: dict = None, ping_timeout: float = 2.0):
+        self.host = host
+        self.options = options or {}
+        self.ping_timeout = ping_timeout
+        self.ready = False
 
-    while attempt <= max_attempts:
+        self._lock = threading.Lock()
+        self._client = None
+        self._async_client = None
+
+    def get_client(self) -> MongoClient:
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = MongoClient(self.host, **self.options)
+        return self._client
+
+    def get_async_client(self) -> AsyncMongoClient:
+        if self._async_client is None:
+            with self._lock:
+                if self._async_client is None:
+                    self._async_client = AsyncMongoClient(self.host, **self.options)
+        return self._async_client
+
+    def ping(self) -> bool:
+        """
+        Ask the server for a ping, waiting at most ping_timeout seconds.
+        """
         try:
-            print("Database is ready!")
-            return MongoClient(host)
-        
+            with pymongo.timeout(self.ping_timeout):
+                self.get_client().admin.command("ping")
+            return True
         except Exception as e:
+            my_logger.error(f"Database ping failed: {e}")
+            return False
+
+    def wait_until_ready(self, max_attempts: int = 10, initial_delay: float = 0.5, max_delay: float = 10.0):
+        """
+        Ping the server until it answers, doubling the delay between attempts (up to max_delay).
+        Raises an exception when it still does not answer after max_attempts.
+        """
+        delay = initial_delay
+        for attempt in range(1, max_attempts + 1):
+            if self.ping():
+                self.ready = True
+                print("Database is ready!")
+                return
+
             print(f"Waiting for database... Attempt {attempt}/{max_attempts}")
-            time.sleep(1)
-            attempt += 1
-    
-    raise Exception("Database not ready after maximum attempts.")
+            if attempt < max_attempts:
+                time.sleep(delay)
+                delay = min(delay * 2, max_delay)
+
+        raise Exception("Database not ready after maximum attempts.")
+
+    def close(self):
+        with self._lock:
+            if self._client is not None:
+                self._client.close()
+                self._client = None
+            self._async_client = None  # closing it needs the event loop, it's dropped with the process
+            self.ready = False
+
 
-client = wait_for_db()
+connection = ConnectionManager(
+    os.getenv("DB_HOST", "mongodb://localhost:27017/"),
+    options=get_client_options(),
+    ping_timeout=int(os.getenv("DB_PING_TIMEOUT_MS", "2000")) / 1000)
 dbname = os.getenv("DB_NAME", "womanslation_db")
 
+# the endpoints that have an async version await it instead of running the sync one in the threadpool
+async_db_enabled = os.getenv("DB_ASYNC", "false").lower() == "true"
+
+_READ_PREFERENCES = {"primary": Primary, "primaryPreferred": PrimaryPreferred, "secondary": Secondary,
+                     "secondaryPreferred": SecondaryPreferred, "nearest": Nearest}
+
+
+def get_reads_preference():
+    """
+    Read preference of the read-only queries: DB_READS_PREFERENCE (secondaryPreferred by default)
+    with at most DB_READS_MAX_STALENESS_SECONDS of replication lag (90 at least, -1 for no limit).
+    On a standalone server every preference reads from it.
+    """
+    mode = _READ_PREFERENCES[os.getenv("DB_READS_PREFERENCE", "secondaryPreferred")]
+    if mode is Primary:
+        return Primary()
+    return mode(max_staleness=int(os.getenv("DB_READS_MAX_STALENESS_SECONDS", "90")))
+
+
+reads_preference = get_reads_preference()
+
+# a user who wrote (voted) lately reads their own data from the primary for this long
+read_your_writes_seconds = float(os.getenv("DB_READ_YOUR_WRITES_SECONDS", "120"))
+# the time of the write goes back to the client (cookie and header) so every worker and pod sees it;
+# _recent_writers only spares a round trip to the clients that drop both on the process that took the write
+WROTE_AT_COOKIE = "womanslation_wrote_at"
+WROTE_AT_HEADER = "X-Wrote-At"
+_recent_writers = {}  # ip -> monotonic time of the last write in this process
+_recent_writers_lock = threading.Lock()
+
+
+def wait_for_db():
+    """
+    Wait for the MongoDB database to be ready (see ConnectionManager.wait_until_ready).
+    """
+    connection.wait_until_ready(
+        max_attempts=int(os.getenv("DB_READY_MAX_ATTEMPTS", "10")),
+        initial_delay=int(os.getenv("DB_READY_INITIAL_DELAY_MS", "500")) / 1000,
+        max_delay=int(os.getenv("DB_READY_MAX_DELAY_MS", "10000")) / 1000)
+
 
 def get_db():
     """
     Connect to the MongoDB database and return the database object.
     """
-    db = client[dbname]
+    db = connection.get_client()[dbname]
+
+    return db
+
+
+def get_async_db():
+    """
+    Return the database object of the async (asyncio) client, created on first use.
+    """
+    return connection.get_async_client()[dbname]
+
+
+def get_read_db():
+    """
+    Database object for read-only queries, they may be served by a secondary (see get_reads_preference).
+    Everything that writes, or reads what it just wrote, uses get_db().
+    """
+    return connection.get_client().get_database(dbname, read_preference=reads_preference)
+
+
+def get_async_read_db():
+    """
+    Async version of get_read_db.
+    """
+    return connection.get_async_client().get_database(dbname, read_preference=reads_preference)
+
+
+def _current_request():
+    try:
+        return get_current_request()
+    except LookupError:  # not in a request (CLI, benchmarks, background tasks)
+        return None
+
+
+def mark_user_write(ip: str):
+    """
+    Remember that the user wrote, so their own reads go to the primary for a while (read-your-own-writes).
+    The time of the write is also stored in the request, set_write_token sends it back to the client.
+    """
+    now = time.monotonic()
+    with _recent_writers_lock:
+        _recent_writers[ip] = now
+        if len(_recent_writers) > 10000:
+            for writer_ip, written_at in list(_recent_writers.items()):
+                if now - written_at > read_your_writes_seconds:
+                    del _recent_writers[writer_ip]
 
-    return db
\ No newline at end of file
+    request = _current_request()
+    if request is not None:
+        request.state.wrote_at = time.time()
+
+
+def set_write_token(request, response):
+    """
+    After a request that wrote: return the time of the write as a cookie and a header (for clients that
+    don't send cookies cross-site and echo the header instead), whichever worker serves the next requests reads it.
+    """
+    wrote_at = getattr(request.state, "wrote_at", None)
+    if wrote_at is None:
+        return
+    token = f"{wrote_at:.3f}"
+    response.set_cookie(WROTE_AT_COOKIE, token, max_age=int(read_your_writes_seconds), httponly=True, secure=True, samesite="none")
+    response.headers[WROTE_AT_HEADER] = token
+
+
+def wrote_lately(ip: str) -> bool:
+    request = _current_request()
+    if request is not None:
+        token = request.cookies.get(WROTE_AT_COOKIE) or request.headers.get(WROTE_AT_HEADER)
+        try:
+            if token and time.time() - float(token) <= read_your_writes_seconds:
+                return True
+        except ValueError:
+            pass
+
+    with _recent_writers_lock:
+        written_at = _recent_writers.get(ip)
+    return written_at is not None and time.monotonic() - written_at <= read_your_writes_seconds
+
+
+def get_user_db(ip: str):
+    """
+    Database object for the reads of a user's own data (their votes): the primary when they wrote lately,
+    according to the write token of the request (any process) or to this process.
+    """
+    return get_db() if wrote_lately(ip) else get_read_db()
+
+
+def get_async_user_db(ip: str):
+    """
+    Async version of get_user_db.
+    """
+    return get_async_db() if wrote_lately(ip) else get_async_read_db()
@@ -0,0 +1,137 @@
+import datetime
+import json
+import os
+import zlib
+from hashlib import blake2b
+from itertools import islice
+from bson import ObjectId
+from .base import ExportCollectionEnum, my_logger
+from .database import get_read_db
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# bytes of NDJSON sent (before compression) in one chunk of the stream
+CHUNK_SIZE = 64 * 1024
+# internal fields that are not exported
+EXCLUDED_FIELDS = {"phrases": {"text_lower": 0}, "user_votes": None}
+# voter IPs are never exported: with a key they are replaced by a keyed hash (the same voter gets the same
+# pseudonym in every export made with the key), without one they are dropped
+EXPORT_IP_KEY = os.getenv("EXPORT_IP_KEY", "")
+
+
+def _default(value):
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+def dumps_line(document: dict) -> bytes:
+    """
+    One NDJSON line, with _id renamed to id as in the API responses.
+    """
+    if "_id" in document:
+        document["id"] = str(document.pop("_id"))
+    if orjson is None:
+        return json.dumps(document, default=_default, ensure_ascii=False, separators=(",", ":")).encode("utf-8") + b"\n"
+    return orjson.dumps(document, default=_default, option=orjson.OPT_APPEND_NEWLINE)
+
+
+def pseudonymize_voter(vote: dict) -> dict:
+    """
+    Replace the ip of a vote by its keyed hash (voter), or drop it when EXPORT_IP_KEY is not set.
+    """
+    ip = vote.pop("ip", None)
+    if ip and EXPORT_IP_KEY:
+        vote["voter"] = blake2b(ip.encode(), digest_size=16, key=EXPORT_IP_KEY.encode()[:64]).hexdigest()
+    return vote
+
+
+def date_filter(since: datetime.datetime = None, until: datetime.datetime = None) -> dict:
+    """
+    create_date range of an incremental export: since included, until excluded.
+    """
+    create_date = {}
+    if since:
+        create_date["$gte"] = since
+    if until:
+        create_date["$lt"] = until
+    return {"create_date": create_date} if create_date else {}
+
+
+def export_documents(collection: ExportCollectionEnum, tags: list = None, since: datetime.datetime = None,
+                     until: datetime.datetime = None, batch_size: int = 5000):
+    """
+    Iterate over the documents of a collection with one server-side cursor fetching batch_size
+    documents at a time, so the memory used does not depend on the collection size.
+
+    tags keeps the phrases having one of the tags; for user_votes, the votes on those phrases
+    (looked up batch_size phrases at a time).
+    """
+    collection = ExportCollectionEnum(collection)
+    db = get_read_db()
+    query = date_filter(since, until)
+
+    if collection == ExportCollectionEnum.phrases:
+        if tags:
+            query["tags"] = {"$in": tags}
+        yield from db["phrases"].find(query, EXCLUDED_FIELDS["phrases"]).batch_size(batch_size)
+        return
+
+    if not tags:
+        for vote in db["user_votes"].find(query).batch_size(batch_size):
+            yield pseudonymize_voter(vote)
+        return
+
+    phrase_ids = (str(phrase["_id"]) for phrase in db["phrases"].find({"tags": {"$in": tags}}, {"_id": 1}).batch_size(batch_size))
+    while batch := list(islice(phrase_ids, batch_size)):
+        for vote in db["user_votes"].find({**query, "phrase_id": {"$in": batch}}).batch_size(batch_size):
+            yield pseudonymize_voter(vote)
+
+
+def ndjson_chunks(documents):
+    """
+    Group the NDJSON lines of the documents into chunks of about CHUNK_SIZE bytes.
+    """
+    chunk = bytearray()
+    for document in documents:
+        chunk += dumps_line(document)
+        if len(chunk) >= CHUNK_SIZE:
+            yield bytes(chunk)
+            chunk.clear()
+    if chunk:
+        yield bytes(chunk)
+
+
+def gzip_chunks(chunks, level: int = 6):
+    """
+    Compress a stream of chunks into one gzip stream.
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # wbits 31: gzip header and trailer
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def stream_export(collection: ExportCollectionEnum, tags: list = None, since: datetime.datetime = None,
+                  until: datetime.datetime = None, compress: bool = False, batch_size: int = 5000):
+    """
+    The export of a collection as NDJSON chunks (one gzip stream when compress is set).
+    An error in the middle of the export is logged and raised again, so the HTTP response is aborted
+    (the client sees an incomplete transfer, not a short file that looks complete).
+    """
+    chunks = ndjson_chunks(export_documents(collection, tags, since, until, batch_size))
+    if compress:
+        chunks = gzip_chunks(chunks)
+
+    try:
+        yield from chunks
+    except Exception as e:
+        my_logger.error(f"Error exporting {collection}: {e}")
+        raise
@@ -0,0 +1,125 @@
+import os
+import pymongo
+from pymongo import IndexModel
+from .base import ResponseModel, my_logger
+from .database import get_db
+
+# Every index the application relies on, per collection.
+# Names are fixed so a changed definition can be found and reported.
+DECLARED_INDEXES = {
+    "phrases": [
+        IndexModel([("text", pymongo.ASCENDING)], name="text_unique", unique=True),
+        IndexModel([("tags", pymongo.ASCENDING)], name="tags"),
+        # _id is the tie-breaker of the keyset pagination, it has to be part of the sort indexes
+        IndexModel([("create_date", pymongo.DESCENDING), ("_id", pymongo.DESCENDING)], name="create_date_id"),
+        IndexModel([("views", pymongo.DESCENDING), ("_id", pymongo.DESCENDING)], name="views_id"),
+        IndexModel([("meanings.id", pymongo.ASCENDING)], name="meanings_id"),
+        IndexModel([("text_lower", pymongo.ASCENDING)], name="text_lower"),
+        IndexModel([("text", pymongo.TEXT), ("suggested_response", pymongo.TEXT), ("meanings.meaning", pymongo.TEXT)],
+                   name="text_search", weights={"text": 10, "meanings.meaning": 5, "suggested_response": 2}),
+    ],
+    "user_votes": [
+        IndexModel([("meaning_id", pymongo.ASCENDING), ("ip", pymongo.ASCENDING)], name="meaning_id_ip_unique", unique=True),
+        IndexModel([("ip", pymongo.ASCENDING)], name="ip"),
+        IndexModel([("phrase_id", pymongo.ASCENDING)], name="phrase_id"),
+    ],
+    "phrase_activity": [
+        IndexModel([("phrase_id", pymongo.ASCENDING), ("bucket", pymongo.ASCENDING)], name="phrase_id_bucket_unique", unique=True),
+        # buckets older than the trending window are not read any more
+        IndexModel([("bucket", pymongo.ASCENDING)], name="bucket_ttl",
+                   expireAfterSeconds=int(os.getenv("RANKINGS_WINDOW_HOURS", "168")) * 3600),
+    ],
+    "change_stream_tokens": [
+        # tokens of the workers that stopped for good
+        IndexModel([("updated_at", pymongo.ASCENDING)], name="updated_at_ttl", expireAfterSeconds=7 * 24 * 3600),
+    ],
+    "tag_facets": [
+        IndexModel([("phrase_count", pymongo.DESCENDING), ("_id", pymongo.ASCENDING)], name="phrase_count_id"),
+    ],
+}
+
+# index options that change the behaviour of an index and must match the declaration
+_COMPARED_OPTIONS = ("unique", "sparse", "partialFilterExpression", "weights", "collation")
+
+
+def get_declared_indexes() -> dict:
+    """
+    Return the declared indexes as {collection: {index name: index document}}.
+    """
+    return {
+        collection: {index.document["name"]: dict(index.document) for index in indexes}
+        for collection, indexes in DECLARED_INDEXES.items()
+    }
+
+
+def _index_differs(declared: dict, existing: dict) -> bool:
+    """
+    Compare a declared index document with the one reported by index_information().
+    """
+    if pymongo.TEXT in declared["key"].values():
+        # text indexes are stored as _fts/_ftsx keys, the indexed fields only show up in the weights
+        declared_weights = declared.get("weights") or {field: 1 for field in declared["key"]}
+        return declared_weights != existing.get("weights")
+
+    if list(declared["key"].items()) != [(field, direction) for field, direction in existing["key"]]:
+        return True
+
+    return any(declared.get(option) != existing.get(option) for option in _COMPARED_OPTIONS)
+
+
+def ensure_indexes() -> ResponseModel:
+    """
+    Create the declared indexes that are missing.
+    Existing indexes are never dropped; the ones whose definition differs from the declaration are reported.
+    The declared unique indexes that could not be created or exist without unique are also listed as
+    unenforced: the writes rely on them instead of a lookup (Phrase.create, User_Vote.create), see require_indexes.
+    """
+    report = {"created": [], "existing": [], "different": [], "failed": [], "unenforced": []}
+
+    db = get_db()
+    for collection, indexes in get_declared_indexes().items():
+        try:
+            existing_indexes = db[collection].index_information() if collection in db.list_collection_names() else {}
+        except Exception as e:
+            my_logger.error(f"Error reading indexes of {collection}: {e}")
+            existing_indexes = {}
+
+        for name, declared in indexes.items():
+            full_name = f"{collection}.{name}"
+
+            if name in existing_indexes:
+                if _index_differs(declared, existing_indexes[name]):
+                    my_logger.warning(f"Index {full_name} differs from its declaration")
+                    report["different"].append(full_name)
+                    if declared.get("unique") and not existing_indexes[name].get("unique"):
+                        report["unenforced"].append(full_name)
+                else:
+                    report["existing"].append(full_name)
+                continue
+
+            try:
+                keys = list(declared["key"].items())
+                options = {option: value for option, value in declared.items() if option != "key"}
+                db[collection].create_index(keys, **options)
+                report["created"].append(full_name)
+
+            except Exception as e:
+                my_logger.error(f"Error creating index {full_name}: {e}")
+                report["failed"].append(full_name)
+                if declared.get("unique"):
+                    report["unenforced"].append(full_name)
+
+    success = not report["failed"] and not report["unenforced"]
+    return ResponseModel(success=success, message="Indexes checked" if success else "Some indexes could not be created", data=report)
+
+
+def require_indexes() -> ResponseModel:
+    """
+    ensure_indexes for the startup: raise when a unique index is unenforced, the application would
+    save duplicated phrases or votes without it (an existing duplicate makes its creation fail).
+    """
+    result = ensure_indexes()
+    if result.data["unenforced"]:
+        raise RuntimeError(f"Unique indexes missing: {', '.join(result.data['unenforced'])}. "
+                           "Remove the duplicated documents and run `manage.py ensure-indexes`")
+    return result
@@ -0,0 +1,116 @@
+import os
+import threading
+from collections import defaultdict
+from pymongo import monitoring
+from .base import my_logger, get_current_request
+from .metrics import register_metric
+
+
+class RequestDbStats:
+    """
+    MongoDB commands issued while handling one HTTP request.
+    """
+
+    def __init__(self):
+        self.commands = 0
+        self.total_ms = 0.0
+        self.slowest = None  # (duration ms, command name, collection)
+        self.per_collection = defaultdict(int)
+        self._pending = {}  # request_id of the wire message -> (command name, collection)
+        self._lock = threading.Lock()
+
+    def started(self, request_id: int, command_name: str, collection: str):
+        with self._lock:
+            self._pending[request_id] = (command_name, collection)
+            self.commands += 1
+            self.per_collection[collection] += 1
+
+    def finished(self, request_id: int, duration_ms: float):
+        with self._lock:
+            command_name, collection = self._pending.pop(request_id, ("unknown", "unknown"))
+            self.total_ms += duration_ms
+            if self.slowest is None or duration_ms > self.slowest[0]:
+                self.slowest = (duration_ms, command_name, collection)
+
+    def server_timing(self) -> str:
+        """
+        Value of the Server-Timing header: total database time and the slowest command.
+        """
+        timings = [f'db;dur={self.total_ms:.2f};desc="{self.commands} commands"']
+        if self.slowest:
+            duration_ms, command_name, collection = self.slowest
+            timings.append(f'db-slowest;dur={duration_ms:.2f};desc="{command_name} {collection}"')
+        return ", ".join(timings)
+
+
+class QueryListener(monitoring.CommandListener):
+    """
+    Command listener counting the commands of the current request (found through the request context)
+    and of the whole process (for /metrics).
+    """
+
+    def __init__(self, n_plus_one_threshold: int = 10):
+        self.n_plus_one_threshold = n_plus_one_threshold
+        self._lock = threading.Lock()
+        self._totals = defaultdict(lambda: [0, 0.0])  # (command name, collection) -> [count, seconds]
+        self._collections = {}  # request_id -> (command name, collection), for the process totals
+        self.n_plus_one_warnings = defaultdict(int)  # collection -> requests over the threshold
+
+    @staticmethod
+    def _request_stats():
+        try:
+            return get_current_request().state.db_stats
+        except (LookupError, AttributeError):
+            return None  # not in a request (startup, background threads) or not instrumented
+
+    def started(self, event):
+        collection = event.command.get(event.command_name)
+        collection = collection if isinstance(collection, str) else "-"
+        with self._lock:
+            self._collections[event.request_id] = (event.command_name, collection)
+
+        stats = self._request_stats()
+        if stats is not None:
+            stats.started(event.request_id, event.command_name, collection)
+
+    def _finished(self, event):
+        with self._lock:
+            key = self._collections.pop(event.request_id, (event.command_name, "-"))
+            self._totals[key][0] += 1
+            self._totals[key][1] += event.duration_micros / 1e6
+
+        stats = self._request_stats()
+        if stats is not None:
+            stats.finished(event.request_id, event.duration_micros / 1000)
+
+    def succeeded(self, event):
+        self._finished(event)
+
+    def failed(self, event):
+        self._finished(event)
+
+    def check_request(self, stats: RequestDbStats, path: str):
+        """
+        Log a warning when one request sent more than n_plus_one_threshold commands to the same collection.
+        """
+        for collection, count in stats.per_collection.items():
+            if count > self.n_plus_one_threshold:
+                with self._lock:
+                    self.n_plus_one_warnings[collection] += 1
+                my_logger.warning(f"{path} sent {count} commands to {collection} in one request (threshold {self.n_plus_one_threshold}), N+1 queries?")
+
+    def totals(self, index: int) -> list:
+        with self._lock:
+            return [({"command": command, "collection": collection}, values[index])
+                    for (command, collection), values in self._totals.items()]
+
+
+instrumentation_enabled = os.getenv("DB_INSTRUMENTATION_ENABLED", "true").lower() == "true"
+query_listener = QueryListener(n_plus_one_threshold=int(os.getenv("DB_N_PLUS_ONE_THRESHOLD", "10")))
+
+register_metric("womanslation_db_commands_total", "counter", "MongoDB commands by command and collection",
+                lambda: query_listener.totals(0))
+register_metric("womanslation_db_command_seconds_total", "counter", "Time spent in MongoDB commands by command and collection",
+                lambda: query_listener.totals(1))
+register_metric("womanslation_db_n_plus_one_requests_total", "counter", "Requests over the per-collection command threshold",
+                lambda: [({"collection": collection}, count) for collection, count in list(query_listener.n_plus_one_warnings.items())])
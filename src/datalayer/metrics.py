@@ -0,0 +1,42 @@
+import threading
+
+# name -> (type, help, collect); collect returns a number or a list of (labels dict, number)
+_metrics = {}
+_lock = threading.Lock()
+
+
+def register_metric(name: str, metric_type: str, help_text: str, collect):
+    """
+    Register a metric exposed on /metrics. metric_type is a Prometheus type (gauge, counter).
+    collect is called on every scrape.
+    """
+    with _lock:
+        _metrics[name] = (metric_type, help_text, collect)
+
+
+def _format_labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    values = ",".join(f'{key}="{str(value).replace(chr(34), chr(39))}"' for key, value in labels.items())
+    return "{" + values + "}"
+
+
+def render_metrics() -> str:
+    """
+    Render every registered metric in the Prometheus text exposition format.
+    """
+    with _lock:
+        metrics = list(_metrics.items())
+
+    lines = []
+    for name, (metric_type, help_text, collect) in metrics:
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {metric_type}")
+
+        samples = collect()
+        if not isinstance(samples, list):
+            samples = [({}, samples)]
+        for labels, value in samples:
+            lines.append(f"{name}{_format_labels(labels)} {float(value)}")
+
+    return "\n".join(lines) + "\n"
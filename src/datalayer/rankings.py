@@ -0,0 +1,201 @@
+import datetime
+import os
+import threading
+import time
+from collections import defaultdict
+from pymongo import UpdateOne, DESCENDING
+from .base import my_logger
+from .database import get_async_read_db, get_db, get_read_db
+from .metrics import register_metric
+
+TRENDING = "trending"
+MOST_VIEWED = "most_viewed"
+
+
+class PhraseRankings:
+    """
+    Trending and all-time most viewed phrase rankings.
+
+    Views and votes are counted in memory, then added to time buckets of the phrase_activity collection
+    ({phrase_id, bucket, views, votes}, one document per phrase and bucket, expired by a TTL index).
+    Every `refresh_interval` seconds the job writes the buckets and computes:
+        trending: sum over the buckets of the window of (views + vote_weight * votes) * 0.5 ** (age / half_life)
+        most_viewed: the phrases with the most views
+    Both are materialized as the `top_size` first phrase ids in the rankings collection
+    ({_id: ranking name, phrase_ids, computed_at}), so a page of a ranking is read by _id.
+    """
+
+    def __init__(self, enabled: bool = True, bucket_minutes: int = 60, window_hours: int = 168, half_life_hours: float = 24,
+                 vote_weight: float = 5, top_size: int = 500, refresh_interval: float = 60):
+        self.enabled = enabled
+        self.bucket_seconds = bucket_minutes * 60
+        self.window_hours = window_hours
+        self.half_life_hours = half_life_hours
+        self.vote_weight = vote_weight
+        self.top_size = top_size
+        self.refresh_interval = refresh_interval
+
+        self._lock = threading.Lock()
+        self._pending = defaultdict(lambda: [0, 0])  # (phrase_id, bucket) -> [views, votes] not written yet
+        self._lists = {}  # ranking name -> (monotonic time it was read, phrase ids)
+        self._stop = threading.Event()
+        self._thread = None
+
+        self.last_refresh_duration = 0.0
+        self.failed_refreshes = 0
+
+    def _bucket(self) -> datetime.datetime:
+        """
+        Start of the current bucket (naive UTC, as pymongo reads dates).
+        """
+        start = int(time.time()) // self.bucket_seconds * self.bucket_seconds
+        return datetime.datetime.fromtimestamp(start, datetime.timezone.utc).replace(tzinfo=None)
+
+    def record_views(self, views_by_phrase: dict):
+        """
+        Count phrase views ({phrase_id: views}). Registered as a view buffer listener.
+        """
+        if not self.enabled:
+            return
+        bucket = self._bucket()
+        with self._lock:
+            for phrase_id, views in views_by_phrase.items():
+                self._pending[(phrase_id, bucket)][0] += views
+
+    def record_vote(self, phrase_id: str, votes: int = 1):
+        if not self.enabled:
+            return
+        bucket = self._bucket()
+        with self._lock:
+            self._pending[(phrase_id, bucket)][1] += votes
+
+    def flush_activity(self) -> int:
+        """
+        Add the counted views and votes to their buckets, return how many buckets were written.
+        """
+        with self._lock:
+            pending, self._pending = self._pending, defaultdict(lambda: [0, 0])
+
+        if not pending:
+            return 0
+
+        try:
+            db = get_db()
+            db["phrase_activity"].bulk_write([
+                UpdateOne({"phrase_id": phrase_id, "bucket": bucket}, {"$inc": {"views": views, "votes": votes}}, upsert=True)
+                for (phrase_id, bucket), (views, votes) in pending.items()
+            ], ordered=False)
+            return len(pending)
+
+        except Exception as e:
+            my_logger.error(f"Error writing {len(pending)} phrase activity buckets: {e}")
+            with self._lock:
+                for key, (views, votes) in pending.items():
+                    self._pending[key][0] += views
+                    self._pending[key][1] += votes
+            return 0
+
+    def refresh(self) -> dict:
+        """
+        Write the counted activity and recompute both rankings. Returns the size of each ranking.
+        """
+        started = time.monotonic()
+        self.flush_activity()
+
+        now = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+        half_life_ms = self.half_life_hours * 3600 * 1000
+
+        db = get_db()
+        trending = [row["_id"] for row in db["phrase_activity"].aggregate([
+            {"$match": {"bucket": {"$gte": now - datetime.timedelta(hours=self.window_hours)}}},
+            {"$group": {"_id": "$phrase_id", "score": {"$sum": {"$multiply": [
+                {"$add": ["$views", {"$multiply": ["$votes", self.vote_weight]}]},
+                {"$pow": [0.5, {"$divide": [{"$subtract": [now, "$bucket"]}, half_life_ms]}]},
+            ]}}}},
+            {"$sort": {"score": DESCENDING, "_id": DESCENDING}},
+            {"$limit": self.top_size},
+        ])]
+        most_viewed = [str(row["_id"]) for row in db["phrases"].find({}, {"_id": 1}).sort(
+            [("views", DESCENDING), ("_id", DESCENDING)]).limit(self.top_size)]
+
+        for name, phrase_ids in ((TRENDING, trending), (MOST_VIEWED, most_viewed)):
+            db["rankings"].replace_one({"_id": name}, {"phrase_ids": phrase_ids, "computed_at": now}, upsert=True)
+            with self._lock:
+                self._lists[name] = (time.monotonic(), phrase_ids)
+
+        self.last_refresh_duration = time.monotonic() - started
+        return {TRENDING: len(trending), MOST_VIEWED: len(most_viewed)}
+
+    def _loaded_ranking(self, name: str):
+        with self._lock:
+            loaded = self._lists.get(name)
+        if loaded and time.monotonic() - loaded[0] < self.refresh_interval:
+            return loaded[1]
+        return None
+
+    def _keep_ranking(self, name: str, document: dict) -> list:
+        phrase_ids = (document or {}).get("phrase_ids", [])
+        with self._lock:
+            self._lists[name] = (time.monotonic(), phrase_ids)
+        return phrase_ids
+
+    def get_ranking(self, name: str) -> list:
+        """
+        Phrase ids of a ranking, best first. Read from the rankings collection (computed by any worker)
+        at most once per refresh_interval.
+        """
+        phrase_ids = self._loaded_ranking(name)
+        if phrase_ids is not None:
+            return phrase_ids
+        return self._keep_ranking(name, get_read_db()["rankings"].find_one({"_id": name}))
+
+    async def get_ranking_async(self, name: str) -> list:
+        """
+        Async version of get_ranking, for the async read path (doesn't block the event loop).
+        """
+        phrase_ids = self._loaded_ranking(name)
+        if phrase_ids is not None:
+            return phrase_ids
+        return self._keep_ranking(name, await get_async_read_db()["rankings"].find_one({"_id": name}))
+
+    def _run(self):
+        while True:
+            try:
+                self.refresh()
+            except Exception as e:
+                self.failed_refreshes += 1
+                my_logger.error(f"Error refreshing phrase rankings: {e}")
+            if self._stop.wait(self.refresh_interval):
+                break
+
+    def start(self):
+        if not self.enabled or self._thread:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="phrase-rankings", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stop the job and write the activity that is still counted in memory.
+        """
+        if self._thread:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+        self.flush_activity()
+
+
+rankings = PhraseRankings(
+    enabled=os.getenv("RANKINGS_ENABLED", "true").lower() == "true",
+    bucket_minutes=int(os.getenv("RANKINGS_BUCKET_MINUTES", "60")),
+    window_hours=int(os.getenv("RANKINGS_WINDOW_HOURS", "168")),
+    half_life_hours=float(os.getenv("RANKINGS_HALF_LIFE_HOURS", "24")),
+    vote_weight=float(os.getenv("RANKINGS_VOTE_WEIGHT", "5")),
+    top_size=int(os.getenv("RANKINGS_TOP_SIZE", "500")),
+    refresh_interval=float(os.getenv("RANKINGS_REFRESH_INTERVAL", "60")))
+
+register_metric("womanslation_rankings_refresh_seconds", "gauge", "Duration of the last rankings refresh",
+                lambda: rankings.last_refresh_duration)
+register_metric("womanslation_rankings_failed_refreshes_total", "counter", "Failed rankings refreshes",
+                lambda: rankings.failed_refreshes)
@@ -0,0 +1,260 @@
+import os
+import re
+import sys
+import threading
+from collections import defaultdict
+from .base import my_logger
+from .database import get_db
+
+# weight of a token depending on where it was found in the phrase
+FIELD_WEIGHTS = {"text": 3.0, "tags": 2.0, "meanings": 1.0}
+# minimal trigram similarity (jaccard) for a token to count as a typo of another one
+MIN_SIMILARITY = 0.35
+# how many similar tokens a single query token may expand to
+MAX_FUZZY_CANDIDATES = 10
+
+_TOKEN_PATTERN = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> list:
+    """
+    Split a text into lowercase word tokens (unicode aware).
+    """
+    return _TOKEN_PATTERN.findall((text or "").lower())
+
+
+def trigrams(token: str, prefix: bool = False) -> set:
+    """
+    Character trigrams of a token, padded so the start (and the end, unless it's a prefix) count too.
+    """
+    padded = f"  {token}" if prefix else f"  {token} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _deep_sizeof(value, seen: set = None) -> int:
+    """
+    Approximate memory used by a value and everything it contains.
+    """
+    seen = seen if seen is not None else set()
+    if id(value) in seen:
+        return 0
+    seen.add(id(value))
+
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(_deep_sizeof(key, seen) + _deep_sizeof(item, seen) for key, item in value.items())
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        size += sum(_deep_sizeof(item, seen) for item in value)
+    return size
+
+
+class PhraseSearchIndex:
+    """
+    In-process inverted index over phrase text, tags and meanings, with character trigrams
+    over the vocabulary for typo-tolerant and prefix matching.
+
+    The index only holds phrase ids; the phrases themselves are still read from MongoDB (by _id).
+    """
+
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self._lock = threading.RLock()
+        self._sources = {}  # phrase_id -> {"text", "tags", "meanings": {meaning_id: meaning}}
+        self._postings = defaultdict(dict)  # token -> {phrase_id: weight}
+        self._trigrams = defaultdict(set)  # trigram -> tokens
+        self._phrase_tokens = {}  # phrase_id -> tokens, to remove a phrase without a scan
+
+    def _add_tokens(self, phrase_id: str, source: dict):
+        weights = defaultdict(float)
+        for token in tokenize(source["text"]):
+            weights[token] += FIELD_WEIGHTS["text"]
+        for tag in source["tags"]:
+            for token in tokenize(tag):
+                weights[token] += FIELD_WEIGHTS["tags"]
+        for meaning in source["meanings"].values():
+            for token in tokenize(meaning):
+                weights[token] += FIELD_WEIGHTS["meanings"]
+
+        for token, weight in weights.items():
+            if token not in self._postings:
+                for trigram in trigrams(token):
+                    self._trigrams[trigram].add(token)
+            self._postings[token][phrase_id] = weight
+
+        self._phrase_tokens[phrase_id] = set(weights)
+
+    def _remove_tokens(self, phrase_id: str):
+        for token in self._phrase_tokens.pop(phrase_id, ()):
+            postings = self._postings.get(token)
+            if postings is None:
+                continue
+
+            postings.pop(phrase_id, None)
+            if not postings:
+                del self._postings[token]
+                for trigram in trigrams(token):
+                    self._trigrams[trigram].discard(token)
+                    if not self._trigrams[trigram]:
+                        del self._trigrams[trigram]
+
+    def index_phrase(self, phrase_id: str, text: str, tags: list, meanings: dict):
+        """
+        Add or replace a phrase. meanings is {meaning_id: meaning text}.
+        """
+        with self._lock:
+            self._remove_tokens(phrase_id)
+            self._sources[phrase_id] = {"text": text, "tags": list(tags or []), "meanings": dict(meanings or {})}
+            self._add_tokens(phrase_id, self._sources[phrase_id])
+
+    def index_document(self, document: dict):
+        """
+        Add or replace a phrase from its MongoDB document.
+        """
+        meanings = {meaning.get("id"): meaning.get("meaning", "") for meaning in document.get("meanings") or []}
+        self.index_phrase(str(document["_id"]), document.get("text", ""), document.get("tags"), meanings)
+
+    def remove_phrase(self, phrase_id: str):
+        with self._lock:
+            self._remove_tokens(phrase_id)
+            self._sources.pop(phrase_id, None)
+
+    def set_meaning(self, phrase_id: str, meaning_id: str, meaning: str):
+        """
+        Add or replace one meaning of an indexed phrase.
+        """
+        with self._lock:
+            source = self._sources.get(phrase_id)
+            if source is None:
+                return
+            source["meanings"][meaning_id] = meaning
+            self._remove_tokens(phrase_id)
+            self._add_tokens(phrase_id, source)
+
+    def remove_meaning(self, phrase_id: str, meaning_id: str = None):
+        """
+        Remove one meaning of an indexed phrase, or all of them when meaning_id is None.
+        """
+        with self._lock:
+            source = self._sources.get(phrase_id)
+            if source is None:
+                return
+            if meaning_id is None:
+                source["meanings"].clear()
+            else:
+                source["meanings"].pop(meaning_id, None)
+            self._remove_tokens(phrase_id)
+            self._add_tokens(phrase_id, source)
+
+    def apply_changes(self, events: list):
+        """
+        Change stream consumer: index the phrases written (by any worker) and remove the deleted ones.
+        """
+        if not self.enabled:
+            return
+
+        for event in events:
+            if event["operation"] == "reset":
+                self.rebuild_from_db()
+                return
+            if event["collection"] != "phrases" or event["counters"]:
+                continue  # counters are not indexed
+            if event["operation"] == "delete":
+                self.remove_phrase(event["id"])
+            elif event["document"] is not None:
+                self.index_document(event["document"])
+
+    def _match_token(self, token: str, prefix: bool) -> dict:
+        """
+        Tokens of the vocabulary matching a query token, with their similarity (1.0 for an exact match).
+        """
+        matches = {}
+        if token in self._postings:
+            matches[token] = 1.0
+
+        if prefix:
+            candidates = None
+            for trigram in trigrams(token, prefix=True):
+                tokens = self._trigrams.get(trigram, set())
+                candidates = set(tokens) if candidates is None else candidates & tokens
+            for candidate in candidates or ():
+                if candidate.startswith(token) and candidate not in matches:
+                    matches[candidate] = 0.9 * len(token) / len(candidate)
+
+        if len(token) >= 3:
+            query_trigrams = trigrams(token)
+            shared = defaultdict(int)
+            for trigram in query_trigrams:
+                for candidate in self._trigrams.get(trigram, ()):
+                    shared[candidate] += 1
+
+            similar = []
+            for candidate, count in shared.items():
+                similarity = count / (len(query_trigrams) + len(trigrams(candidate)) - count)
+                if similarity >= MIN_SIMILARITY and candidate not in matches:
+                    similar.append((similarity, candidate))
+
+            for similarity, candidate in sorted(similar, reverse=True)[:MAX_FUZZY_CANDIDATES]:
+                matches[candidate] = similarity
+
+        return matches
+
+    def search(self, text: str, prefix: bool = False, tags: list = None, all_tags: bool = False) -> list:
+        """
+        Return the ids of the matching phrases, best match first.
+        With prefix, the last word of the text may be incomplete (autocomplete).
+        tags keeps only phrases having at least one of the given tags (every one of them with all_tags).
+        """
+        tokens = tokenize(text)
+        with self._lock:
+            scores = defaultdict(float)
+            for position, token in enumerate(tokens):
+                for candidate, similarity in self._match_token(token, prefix and position == len(tokens) - 1).items():
+                    for phrase_id, weight in self._postings[candidate].items():
+                        scores[phrase_id] += weight * similarity
+
+            if tags:
+                tags = set(tags)
+                if all_tags:
+                    scores = {phrase_id: score for phrase_id, score in scores.items() if tags <= set(self._sources[phrase_id]["tags"])}
+                else:
+                    scores = {phrase_id: score for phrase_id, score in scores.items() if tags & set(self._sources[phrase_id]["tags"])}
+
+        return [phrase_id for phrase_id, _ in sorted(scores.items(), key=lambda item: item[1], reverse=True)]
+
+    def rebuild_from_db(self) -> int:
+        """
+        Drop the index content and load every phrase from the database.
+        """
+        db = get_db()
+        data_from_db = db["phrases"].find({}, {"text": 1, "tags": 1, "meanings.id": 1, "meanings.meaning": 1})
+
+        with self._lock:
+            self._sources.clear()
+            self._postings.clear()
+            self._trigrams.clear()
+            self._phrase_tokens.clear()
+            for document in data_from_db:
+                self.index_document(document)
+
+            my_logger.info(f"Search index rebuilt with {len(self._sources)} phrases")
+            return len(self._sources)
+
+    def memory_report(self) -> dict:
+        """
+        Size of the index and approximate memory used by each of its structures, in bytes.
+        """
+        with self._lock:
+            report = {
+                "phrases": len(self._sources),
+                "tokens": len(self._postings),
+                "trigrams": len(self._trigrams),
+                "sources_bytes": _deep_sizeof(self._sources),
+                "postings_bytes": _deep_sizeof(self._postings),
+                "trigrams_bytes": _deep_sizeof(self._trigrams),
+                "phrase_tokens_bytes": _deep_sizeof(self._phrase_tokens),
+            }
+        report["total_bytes"] = sum(value for key, value in report.items() if key.endswith("_bytes"))
+        return report
+
+
+search_index = PhraseSearchIndex(enabled=os.getenv("SEARCH_INDEX_ENABLED", "false").lower() == "true")
@@ -0,0 +1,182 @@
+import os
+import threading
+import time
+from bson import ObjectId
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from .base import my_logger
+from .database import get_db
+from .metrics import register_metric
+
+
+class ViewCounterBuffer:
+    """
+    Write-behind buffer for the phrase view counter.
+
+    Views are summed in memory per phrase id and written as one bulk_write of $inc operations
+    every `flush_interval` seconds, or as soon as `max_pending` phrases are waiting.
+    Counts of a failed flush are put back and retried with the next one (only the failed $inc of a
+    partially applied bulk write, the others are already counted).
+    Views of phrase ids that don't exist (any id is accepted without a read) are dropped at the flush,
+    before the write and the listeners.
+    Listeners (add_listener) get the {phrase_id: views} of every successful flush, to keep
+    what is derived from the views (tag totals, rankings) up to date.
+    """
+
+    def __init__(self, enabled: bool = False, flush_interval: float = 2.0, max_pending: int = 1000):
+        self.enabled = enabled
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._pending = {}  # phrase_id -> views not written yet
+        self._oldest_pending_at = None  # monotonic time of the oldest view not written yet
+        self._wake_up = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._listeners = []
+
+        self.flushed_views = 0
+        self.failed_flushes = 0
+        self.last_flush_duration = 0.0
+        self.last_flush_lag = 0.0
+
+    def add(self, phrase_id: str, views: int = 1):
+        with self._lock:
+            self._pending[phrase_id] = self._pending.get(phrase_id, 0) + views
+            if self._oldest_pending_at is None:
+                self._oldest_pending_at = time.monotonic()
+            full = len(self._pending) >= self.max_pending
+
+        if full:
+            self._wake_up.set()
+
+    def add_listener(self, callback):
+        """
+        Call callback({phrase_id: views}) after every successful flush.
+        """
+        if callback not in self._listeners:
+            self._listeners.append(callback)
+
+    def _put_back(self, pending: dict, oldest_pending_at: float):
+        """
+        Add the counts of a failed write back to the buffer, retried with the next flush.
+        """
+        for phrase_id, views in pending.items():
+            self.add(phrase_id, views)
+        if pending:
+            with self._lock:
+                self._oldest_pending_at = min(filter(None, (self._oldest_pending_at, oldest_pending_at)))
+
+    def flush(self) -> int:
+        """
+        Write the pending views, return how many views were written.
+        """
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+                oldest_pending_at, self._oldest_pending_at = self._oldest_pending_at, None
+
+            if not pending:
+                return 0
+
+            started = time.monotonic()
+            try:
+                db = get_db()
+                existing = {str(phrase["_id"]) for phrase in db["phrases"].find(
+                    {"_id": {"$in": [ObjectId(phrase_id) for phrase_id in pending]}}, {"_id": 1})}
+                pending = {phrase_id: views for phrase_id, views in pending.items() if phrase_id in existing}
+                if not pending:
+                    return 0
+
+                operations = list(pending.items())
+                db["phrases"].bulk_write(
+                    [UpdateOne({"_id": ObjectId(phrase_id)}, {"$inc": {"views": views}}) for phrase_id, views in operations],
+                    ordered=False)
+
+            except BulkWriteError as e:
+                # the unordered write applied every $inc but the failed ones, only those are put back
+                failed_indexes = {error["index"] for error in e.details.get("writeErrors", [])}
+                my_logger.error(f"Error flushing {len(failed_indexes)} of {len(pending)} view counters: {e}")
+                self.failed_flushes += 1
+                self._put_back({phrase_id: views for index, (phrase_id, views) in enumerate(operations) if index in failed_indexes},
+                               oldest_pending_at)
+                pending = {phrase_id: views for index, (phrase_id, views) in enumerate(operations) if index not in failed_indexes}
+                if not pending:
+                    return 0
+
+            except Exception as e:
+                my_logger.error(f"Error flushing {len(pending)} view counters: {e}")
+                self.failed_flushes += 1
+                self._put_back(pending, oldest_pending_at)
+                return 0
+
+            finished = time.monotonic()
+            self.last_flush_duration = finished - started
+            self.last_flush_lag = finished - oldest_pending_at
+            self.flushed_views += sum(pending.values())
+
+            for callback in self._listeners:
+                try:
+                    callback(pending)
+                except Exception as e:
+                    my_logger.error(f"Error in view buffer listener {getattr(callback, '__qualname__', callback)}: {e}")
+
+            return sum(pending.values())
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake_up.wait(self.flush_interval)
+            self._wake_up.clear()
+            self.flush()
+
+    def start(self):
+        if not self.enabled or self._thread:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="view-counter-flush", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stop the flush thread and write what is still pending.
+        """
+        if self._thread:
+            self._stop.set()
+            self._wake_up.set()
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+    def stats(self) -> dict:
+        with self._lock:
+            pending_phrases = len(self._pending)
+            pending_views = sum(self._pending.values())
+            oldest_pending_at = self._oldest_pending_at
+
+        return {
+            "pending_phrases": pending_phrases,
+            "pending_views": pending_views,
+            # how long the oldest buffered view has been waiting to be written
+            "flush_lag_seconds": time.monotonic() - oldest_pending_at if oldest_pending_at else 0.0,
+            "last_flush_lag_seconds": self.last_flush_lag,
+            "last_flush_duration_seconds": self.last_flush_duration,
+            "flushed_views": self.flushed_views,
+            "failed_flushes": self.failed_flushes,
+        }
+
+
+view_buffer = ViewCounterBuffer(
+    enabled=os.getenv("VIEW_BUFFER_ENABLED", "false").lower() == "true",
+    flush_interval=float(os.getenv("VIEW_BUFFER_FLUSH_INTERVAL", "2")),
+    max_pending=int(os.getenv("VIEW_BUFFER_MAX_PENDING", "1000")))
+
+register_metric("womanslation_view_buffer_pending_views", "gauge", "Phrase views buffered and not written yet",
+                lambda: view_buffer.stats()["pending_views"])
+register_metric("womanslation_view_buffer_flush_lag_seconds", "gauge", "Age of the oldest buffered phrase view",
+                lambda: view_buffer.stats()["flush_lag_seconds"])
+register_metric("womanslation_view_buffer_flushed_views_total", "counter", "Phrase views written by the buffer",
+                lambda: view_buffer.flushed_views)
+register_metric("womanslation_view_buffer_failed_flushes_total", "counter", "Failed view buffer flushes",
+                lambda: view_buffer.failed_flushes)
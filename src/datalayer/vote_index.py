@@ -0,0 +1,179 @@
+import os
+import threading
+from array import array
+from bisect import bisect_left
+from hashlib import blake2b
+from .base import my_logger
+from .database import get_db
+from .metrics import register_metric
+from .search_index import _deep_sizeof
+
+
+def ip_key(ip: str) -> int:
+    """
+    64-bit hash of an IP, what the index stores instead of the IP string (collisions are negligible
+    at this size, and would only show a meaning as liked to the wrong user).
+    """
+    return int.from_bytes(blake2b(ip.encode(), digest_size=8).digest(), "little")
+
+
+class VoteMembershipIndex:
+    """
+    In-process index of the likes: meaning_id -> sorted array of the hashed IPs that liked it
+    (8 bytes per like), so is_liked_by_user of a whole page is answered without a database call.
+
+    Loaded from user_votes at startup and kept current by the User_Vote writes of this process
+    (and by the change stream for the writes of the other workers).
+    Until it's loaded (or when disabled), the likes are read from the database.
+    """
+
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self.loaded = False
+        self._lock = threading.Lock()
+        self._likes = {}  # meaning_id -> array("Q") of sorted ip keys
+        self._journal = None  # changes made while a rebuild reads user_votes, replayed on the new content
+
+    @property
+    def ready(self) -> bool:
+        return self.enabled and self.loaded
+
+    def _set(self, likes: dict, meaning_id: str, key: int, like: bool):
+        keys = likes.get(meaning_id)
+        position = bisect_left(keys, key) if keys is not None else 0
+        present = keys is not None and position < len(keys) and keys[position] == key
+
+        if like and not present:
+            if keys is None:
+                keys = likes[meaning_id] = array("Q")
+            keys.insert(position, key)
+        elif not like and present:
+            del keys[position]
+            if not keys:
+                del likes[meaning_id]
+
+    def set(self, meaning_id: str, ip: str, like: bool):
+        """
+        Record the like state of one vote (idempotent).
+        """
+        if not self.enabled:
+            return
+
+        key = ip_key(ip)
+        with self._lock:
+            self._set(self._likes, meaning_id, key, like)
+            if self._journal is not None:
+                self._journal.append((meaning_id, key, like))
+
+    def remove_meanings(self, meaning_ids: list):
+        """
+        Forget every like of the given meanings (their votes were deleted).
+        """
+        if not self.enabled:
+            return
+
+        with self._lock:
+            for meaning_id in meaning_ids:
+                self._likes.pop(meaning_id, None)
+                if self._journal is not None:
+                    self._journal.append((meaning_id, None, False))
+
+    def apply_changes(self, events: list):
+        """
+        Change stream consumer: apply the votes written by any worker. A deleted vote is only known
+        from its pre-image; without it (or after a reset) the index is reloaded once for the batch.
+        """
+        if not self.ready:
+            return
+
+        reload = False
+        for event in events:
+            if event["operation"] == "reset":
+                reload = True
+            elif event["collection"] != "user_votes":
+                continue
+            elif event["operation"] == "delete":
+                if event["before"] is None:
+                    reload = True
+                else:
+                    self.set(event["before"]["meaning_id"], event["before"]["ip"], False)
+            elif event["document"] is not None:
+                self.set(event["document"]["meaning_id"], event["document"]["ip"], event["document"].get("like", False))
+
+        if reload:
+            self.rebuild_from_db()
+
+    def size(self) -> int:
+        with self._lock:
+            return sum(len(keys) for keys in self._likes.values())
+
+    def liked(self, ip: str, meaning_ids: list) -> set:
+        """
+        The meaning ids liked by ip among meaning_ids.
+        """
+        key = ip_key(ip)
+        liked = set()
+        with self._lock:
+            for meaning_id in meaning_ids:
+                keys = self._likes.get(meaning_id)
+                if keys:
+                    position = bisect_left(keys, key)
+                    if position < len(keys) and keys[position] == key:
+                        liked.add(meaning_id)
+        return liked
+
+    def rebuild_from_db(self) -> int:
+        """
+        Replace the index content with every like of user_votes.
+        The votes written meanwhile are replayed on top, so a rebuild can run while serving.
+        """
+        with self._lock:
+            self._journal = []
+
+        try:
+            db = get_db()
+            likes = {}
+            for vote in db["user_votes"].find({"like": True}, {"_id": 0, "meaning_id": 1, "ip": 1}).batch_size(10000):
+                keys = likes.get(vote["meaning_id"])
+                if keys is None:
+                    keys = likes[vote["meaning_id"]] = array("Q")
+                keys.append(ip_key(vote["ip"]))
+
+            for meaning_id, keys in likes.items():
+                likes[meaning_id] = array("Q", sorted(set(keys)))
+
+            with self._lock:
+                for meaning_id, key, like in self._journal:
+                    if key is None:
+                        likes.pop(meaning_id, None)
+                    else:
+                        self._set(likes, meaning_id, key, like)
+                self._likes = likes
+                self.loaded = True
+        finally:
+            with self._lock:
+                self._journal = None
+
+        count = self.size()
+        my_logger.info(f"Vote index rebuilt with {count} likes on {len(likes)} meanings")
+        return count
+
+    def memory_report(self) -> dict:
+        """
+        Size of the index and approximate memory it uses, in bytes and per million likes.
+        """
+        likes = self.size()
+        with self._lock:
+            report = {
+                "meanings": len(self._likes),
+                "likes": likes,
+                "total_bytes": _deep_sizeof(self._likes),
+            }
+        report["bytes_per_million_likes"] = round(report["total_bytes"] * 1_000_000 / report["likes"]) if report["likes"] else 0
+        return report
+
+
+vote_index = VoteMembershipIndex(enabled=os.getenv("VOTE_INDEX_ENABLED", "false").lower() == "true")
+
+register_metric("womanslation_vote_index_likes", "gauge", "Likes held by the in-process vote index",
+                lambda: vote_index.size() if vote_index.ready else 0)
@@ -0,0 +1,187 @@
+import os
+import queue
+import threading
+import time
+from .base import my_logger
+from .metrics import register_metric
+
+
+class QueueFullError(Exception):
+    """
+    Raised when a vote can not be queued because the ingestion queue is full (backpressure).
+    """
+
+
+class VoteIngestionQueue:
+    """
+    Bounded in-process queue of votes written in batches by a background worker.
+
+    Every `flush_interval` seconds (or as soon as `max_batch` votes are waiting) the worker takes the queued
+    votes, keeps only the last one per (meaning_id, ip) and hands them to `write_batch` (set by start()).
+    write_batch returns the votes it could not write (or raises when none was written): they are retried
+    with the next batches, unless a newer vote of the same user replaced them, and dropped after
+    `max_attempts` failed writes (counted in the metrics).
+    """
+
+    def __init__(self, enabled: bool = False, max_size: int = 10000, flush_interval: float = 0.2, max_batch: int = 1000,
+                 max_attempts: int = 10, retry_delay: float = 1.0):
+        self.enabled = enabled
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+
+        self._queue = queue.Queue(maxsize=max_size)
+        self._stop = threading.Event()
+        self._thread = None
+        self._write_batch = None
+        self._retries = {}  # (meaning_id, ip) -> (vote, failed attempts), only used by the worker thread
+
+        self.queued_votes = 0
+        self.rejected_votes = 0
+        self.written_votes = 0
+        self.collapsed_votes = 0
+        self.failed_flushes = 0
+        self.retried_votes = 0
+        self.dropped_votes = 0
+        self.last_flush_duration = 0.0
+        self.total_flush_duration = 0.0
+        self.flushes = 0
+
+    def submit(self, vote):
+        """
+        Queue a vote without waiting. Raises QueueFullError when the queue is full.
+        """
+        try:
+            self._queue.put_nowait(vote)
+            self.queued_votes += 1
+        except queue.Full:
+            self.rejected_votes += 1
+            raise QueueFullError("Vote queue is full, try again later")
+
+    def _take_batch(self, wait: bool) -> list:
+        """
+        Take up to max_batch queued votes, waiting at most flush_interval for the first one if wait is set.
+        """
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.max_batch:
+            try:
+                if wait:
+                    batch.append(self._queue.get(timeout=max(0.0, deadline - time.monotonic())))
+                else:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _flush(self, batch: list) -> bool:
+        """
+        Write a batch with the votes to retry, return False when some votes could not be written.
+        """
+        if not batch and not self._retries:
+            return True
+
+        # the last vote of a user on a meaning wins, also over a vote waiting for a retry
+        latest = {key: vote for key, (vote, _) in self._retries.items()}
+        attempts = {key: failed for key, (_, failed) in self._retries.items()}
+        for vote in batch:
+            key = (vote.meaning_id, vote.ip)
+            if key in latest:
+                self.collapsed_votes += 1
+                attempts.pop(key, None)
+            latest[key] = vote
+
+        started = time.monotonic()
+        try:
+            failed = self._write_batch(list(latest.values())) or []
+        except Exception as e:
+            my_logger.error(f"Error writing {len(latest)} queued votes: {e}")
+            failed = list(latest.values())
+        finally:
+            self.last_flush_duration = time.monotonic() - started
+            self.total_flush_duration += self.last_flush_duration
+            self.flushes += 1
+
+        self.written_votes += len(latest) - len(failed)
+        self._retries = {}
+        for vote in failed:
+            key = (vote.meaning_id, vote.ip)
+            failed_attempts = attempts.get(key, 0) + 1
+            if failed_attempts >= self.max_attempts:
+                self.dropped_votes += 1
+                my_logger.error(f"Vote of {vote.ip} on meaning {vote.meaning_id} dropped after {failed_attempts} failed writes")
+            else:
+                self.retried_votes += 1
+                self._retries[key] = (vote, failed_attempts)
+
+        if failed:
+            self.failed_flushes += 1
+        return not failed
+
+    def _run(self):
+        while not self._stop.is_set():
+            if not self._flush(self._take_batch(wait=True)):
+                self._stop.wait(self.retry_delay)
+
+        # drain what is left, the votes still failing are retried a last time
+        while not self._queue.empty():
+            self._flush(self._take_batch(wait=False))
+        if self._retries:
+            self._flush([])
+            for vote, _ in self._retries.values():
+                self.dropped_votes += 1
+                my_logger.error(f"Vote of {vote.ip} on meaning {vote.meaning_id} dropped at shutdown, it could not be written")
+            self._retries = {}
+
+    def start(self, write_batch):
+        """
+        Start the worker; write_batch(votes) writes a list of votes (one per (meaning_id, ip))
+        and returns the ones that failed.
+        """
+        if not self.enabled or self._thread:
+            return
+        self._write_batch = write_batch
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="vote-ingestion", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stop the worker after writing every queued vote.
+        """
+        if self._thread:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+
+    def depth(self) -> int:
+        return self._queue.qsize()
+
+
+vote_queue = VoteIngestionQueue(
+    enabled=os.getenv("VOTE_QUEUE_ENABLED", "false").lower() == "true",
+    max_size=int(os.getenv("VOTE_QUEUE_MAX_SIZE", "10000")),
+    flush_interval=int(os.getenv("VOTE_QUEUE_FLUSH_INTERVAL_MS", "200")) / 1000,
+    max_batch=int(os.getenv("VOTE_QUEUE_MAX_BATCH", "1000")),
+    max_attempts=int(os.getenv("VOTE_QUEUE_MAX_ATTEMPTS", "10")),
+    retry_delay=int(os.getenv("VOTE_QUEUE_RETRY_DELAY_MS", "1000")) / 1000)
+
+register_metric("womanslation_vote_queue_depth", "gauge", "Votes waiting in the ingestion queue", vote_queue.depth)
+register_metric("womanslation_vote_queue_rejected_total", "counter", "Votes rejected because the queue was full",
+                lambda: vote_queue.rejected_votes)
+register_metric("womanslation_vote_queue_written_total", "counter", "Votes written by the ingestion worker",
+                lambda: vote_queue.written_votes)
+register_metric("womanslation_vote_queue_collapsed_total", "counter", "Queued votes replaced by a later vote of the same user",
+                lambda: vote_queue.collapsed_votes)
+register_metric("womanslation_vote_queue_failed_flushes_total", "counter", "Failed vote batch writes",
+                lambda: vote_queue.failed_flushes)
+register_metric("womanslation_vote_queue_retried_total", "counter", "Votes put back for a retry after a failed write",
+                lambda: vote_queue.retried_votes)
+register_metric("womanslation_vote_queue_dropped_total", "counter", "Queued votes lost after failing every write attempt",
+                lambda: vote_queue.dropped_votes)
+register_metric("womanslation_vote_queue_last_flush_seconds", "gauge", "Duration of the last vote batch write",
+                lambda: vote_queue.last_flush_duration)
+register_metric("womanslation_vote_queue_flush_seconds_total", "counter", "Total time spent writing vote batches",
+                lambda: vote_queue.total_flush_duration)
+register_metric("womanslation_vote_queue_flushes_total", "counter", "Vote batch writes", lambda: vote_queue.flushes)
@@ -0,0 +1,174 @@
+import argparse
+import datetime
+import json
+import sys
+import time
+
+from datalayer import ExportCollectionEnum, change_stream, ensure_indexes, search_index, vote_index, rankings, stream_export
+from Models import Phrase, Tag, User_Vote
+
+
+def reconcile_likes(args):
+    result = User_Vote.reconcile_like_counts()
+    print(result.message)
+
+
+def check_indexes(args):
+    result = ensure_indexes()
+    print(result.message)
+    for status, indexes in result.data.items():
+        for index in indexes:
+            print(f"{status:>10}  {index}")
+    if not result.success:
+        raise SystemExit(1)
+
+
+def search_index_report(args):
+    count = search_index.rebuild_from_db()
+    print(f"{count} phrases indexed")
+    for key, value in search_index.memory_report().items():
+        print(f"{key:>20}  {value}")
+
+
+def vote_index_report(args):
+    vote_index.enabled = True
+    count = vote_index.rebuild_from_db()
+    print(f"{count} likes indexed")
+    for key, value in vote_index.memory_report().items():
+        print(f"{key:>24}  {value}")
+
+
+def rebuild_tag_facets(args):
+    result = Tag.rebuild()
+    print(result.message)
+
+
+def refresh_rankings(args):
+    for name, size in rankings.refresh().items():
+        print(f"{name:>12}  {size} phrases")
+
+
+def import_phrases(args):
+    """
+    NDJSON files are read and imported batch by batch, JSON files at once.
+    """
+    totals = {"created": 0, "duplicate": 0, "invalid": 0, "failed": 0}
+
+    def run(items: list, first_index: int):
+        result = Phrase.bulk_import(items, batch_size=args.batch_size, first_index=first_index)
+        for item in result.data["items"]:
+            totals[item["status"]] += 1
+            if item["status"] != "created" and args.verbose:
+                print(f"{item['index']:>8}  {item['status']:>9}  {item.get('text')}: {item.get('message')}")
+        if not result.success:
+            raise SystemExit(result.message)
+
+    with open(args.file, encoding="utf-8-sig") as file:
+        if args.file.endswith(".ndjson") or args.file.endswith(".jsonl"):
+            items, first_index = [], 0
+            for line in file:
+                if line.strip():
+                    items.append(json.loads(line))
+                if len(items) >= args.batch_size:
+                    run(items, first_index)
+                    first_index += len(items)
+                    items = []
+            if items:
+                run(items, first_index)
+        else:
+            run(Phrase.parse_import_data(file.read()), 0)
+
+    print(", ".join(f"{count} {status}" for status, count in totals.items()))
+
+
+def export(args):
+    """
+    Same stream as GET /export, written to a file (gzip when it ends with .gz) or to stdout.
+    """
+    tags = [tag.strip().lower() for tag in args.tags.split(",") if tag.strip()]
+    chunks = stream_export(ExportCollectionEnum(args.collection), tags=tags, since=args.since, until=args.until,
+                           compress=args.gzip or args.out.endswith(".gz"), batch_size=args.batch_size)
+
+    if args.out == "-":
+        for chunk in chunks:
+            sys.stdout.buffer.write(chunk)
+        return
+
+    try:
+        with open(args.out, "wb") as file:
+            for chunk in chunks:
+                file.write(chunk)
+    except Exception as e:
+        raise SystemExit(f"export failed, {args.out} is incomplete: {e}")
+    print(f"{args.collection} exported to {args.out}", file=sys.stderr)
+
+
+def watch_changes(args):
+    """
+    Print the change stream events as the API workers receive them, to try it on a replica set.
+    Uses its own resume token, so it does not move the one of the API.
+    """
+    change_stream.enabled = True
+    change_stream.name = args.name
+
+    def print_events(events: list):
+        for event in events:
+            print(f"{event['operation']:>8}  {event['collection']}  {event['id']}", flush=True)
+
+    change_stream.add_consumer(print_events)
+    change_stream.start()
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        change_stream.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Womanslation maintenance commands")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    command = commands.add_parser("reconcile-likes", help="recompute meanings like_count from user_votes")
+    command.set_defaults(func=reconcile_likes)
+
+    command = commands.add_parser("ensure-indexes", help="create missing indexes and report the ones that differ")
+    command.set_defaults(func=check_indexes)
+
+    command = commands.add_parser("search-index-report", help="build the in-process search index from the database and print its memory footprint")
+    command.set_defaults(func=search_index_report)
+
+    command = commands.add_parser("vote-index-report", help="build the in-process vote index from the database and print its memory footprint")
+    command.set_defaults(func=vote_index_report)
+
+    command = commands.add_parser("rebuild-tag-facets", help="recompute the tag counts and views from the phrases")
+    command.set_defaults(func=rebuild_tag_facets)
+
+    command = commands.add_parser("refresh-rankings", help="recompute the trending and most viewed rankings now")
+    command.set_defaults(func=refresh_rankings)
+
+    command = commands.add_parser("import", help="import phrases from a JSON or NDJSON (.ndjson/.jsonl) file")
+    command.add_argument("file")
+    command.add_argument("--batch-size", type=int, default=1000)
+    command.add_argument("--verbose", action="store_true", help="print every item that was not created")
+    command.set_defaults(func=import_phrases)
+
+    command = commands.add_parser("export", help="export phrases or user_votes as NDJSON (optionally gzip)")
+    command.add_argument("collection", choices=[collection.value for collection in ExportCollectionEnum])
+    command.add_argument("--out", default="-", help="output file (.gz for gzip), stdout by default")
+    command.add_argument("--gzip", action="store_true")
+    command.add_argument("--tags", default="", help="comma-separated tags, only the phrases having one of them (or their votes)")
+    command.add_argument("--since", type=datetime.datetime.fromisoformat, help="create_date from (included), ISO format")
+    command.add_argument("--until", type=datetime.datetime.fromisoformat, help="create_date until (excluded), ISO format")
+    command.add_argument("--batch-size", type=int, default=5000)
+    command.set_defaults(func=export)
+
+    command = commands.add_parser("watch-changes", help="print the phrases and user_votes changes seen by the change stream (needs a replica set)")
+    command.add_argument("--name", default="watch-changes", help="name of the stored resume token")
+    command.set_defaults(func=watch_changes)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
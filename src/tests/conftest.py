@@ -0,0 +1,46 @@
+"""
+Integration tests of the API: they start it with uvicorn on the benchmark database (BENCH_DB_NAME, see
+benchmarks/__init__.py) against the MongoDB of DB_HOST, and are skipped when it's not reachable.
+
+usage (from src/):
+    python -m pytest tests
+"""
+import asyncio
+import os
+import subprocess
+import sys
+
+import pytest
+
+from benchmarks import bench_env, check_bench_db
+from benchmarks.load_test import wait_until_up
+from datalayer import connection, ensure_indexes, get_db
+
+PORT = int(os.getenv("TEST_PORT", "8098"))
+
+
+@pytest.fixture(scope="session")
+def db():
+    if not connection.ping():
+        pytest.skip("MongoDB is not reachable (DB_HOST)")
+    db = get_db()
+    check_bench_db(db)
+    ensure_indexes()
+    return db
+
+
+@pytest.fixture(scope="session")
+def api_url(db):
+    """
+    Base URL of the API running in its own process, votes written directly (no queue).
+    """
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "apis:app", "--port", str(PORT), "--log-level", "warning"],
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))), env=bench_env(VOTE_QUEUE_ENABLED="false"))
+    base_url = f"http://127.0.0.1:{PORT}"
+    try:
+        asyncio.run(wait_until_up(base_url))
+        yield base_url
+    finally:
+        server.terminate()
+        server.wait()
@@ -0,0 +1,24 @@
+from bson import ObjectId
+
+from Models import Meaning, Phrase
+
+
+def test_duplicated_meaning_is_rejected(db):
+    phrase = Phrase(text=f"test meanings {ObjectId()}", suggested_response=None)
+    assert Phrase.create(phrase).success
+    try:
+        assert Meaning.create(Meaning(meaning="first meaning"), phrase.id).success
+
+        second = Meaning.create(Meaning(meaning="first meaning"), phrase.id)
+        assert not second.success
+        assert second.message == "Meaning already exists in the database"
+        assert len(db["phrases"].find_one({"_id": ObjectId(phrase.id)})["meanings"]) == 1
+    finally:
+        db["phrases"].delete_one({"_id": ObjectId(phrase.id)})
+
+
+def test_meaning_of_a_missing_phrase_is_not_saved(db):
+    for phrase_id in (str(ObjectId()), "not-an-id"):
+        result = Meaning.create(Meaning(meaning="orphan meaning"), phrase_id)
+        assert not result.success
+        assert result.message == "Phrase not found!"
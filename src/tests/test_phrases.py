@@ -0,0 +1,41 @@
+import pytest
+from bson import ObjectId
+
+from datalayer import ensure_indexes, require_indexes
+from Models import Phrase
+
+
+def test_unique_phrase_text_index_is_enforced(db):
+    result = ensure_indexes()
+
+    assert result.data["unenforced"] == []
+    assert db["phrases"].index_information()["text_unique"]["unique"]
+
+
+def test_duplicated_phrase_is_rejected(db):
+    text = f"test duplicated phrase {ObjectId()}"
+    try:
+        assert Phrase.create(Phrase(text=text, suggested_response="first")).success
+
+        second = Phrase.create(Phrase(text=text, suggested_response="second"))
+        assert not second.success
+        assert second.message == "Phrase already exists in the database"
+        assert db["phrases"].count_documents({"text": text}) == 1
+    finally:
+        db["phrases"].delete_many({"text": text})
+
+
+def test_startup_fails_when_the_unique_index_can_not_be_built(db):
+    text = f"test duplicated phrase {ObjectId()}"
+    db["phrases"].drop_index("text_unique")
+    try:
+        # duplicates saved while the index was missing keep it from being created again
+        db["phrases"].insert_many([{"text": text, "suggested_response": None}, {"text": text, "suggested_response": None}])
+
+        with pytest.raises(RuntimeError, match="phrases.text_unique"):
+            require_indexes()
+    finally:
+        db["phrases"].delete_many({"text": text})
+        ensure_indexes()
+
+    assert db["phrases"].index_information()["text_unique"]["unique"]
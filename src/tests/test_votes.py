@@ -0,0 +1,47 @@
+import random
+import threading
+
+import httpx
+from bson import ObjectId
+
+from benchmarks.vote_concurrency import check, prepare
+
+
+def vote(client: httpx.Client, phrase_id: str, meaning_id: str, ip: str, like: bool) -> httpx.Response:
+    return client.post(f"/phrases/{phrase_id}/meanings/{meaning_id}/vote", params={"like": like},
+                       headers={"x-forwarded-for": ip})
+
+
+def test_concurrent_votes_keep_one_vote_and_like_count(api_url):
+    targets = prepare(1)
+    failures = []
+
+    def worker(number: int):
+        rng = random.Random(number)
+        with httpx.Client(base_url=api_url, timeout=30) as client:
+            for _ in range(50):
+                phrase_id, meaning_id = rng.choice(targets)
+                response = vote(client, phrase_id, meaning_id, f"10.1.0.{rng.randrange(3) + 1}", rng.random() < 0.5)
+                if response.status_code != 200 or not response.json()["success"]:
+                    failures.append(response.text)
+
+    threads = [threading.Thread(target=worker, args=(number,)) for number in range(16)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert failures == []
+    assert check(targets) == {"duplicates": 0, "drift": {}}
+
+
+def test_vote_on_a_missing_meaning_is_not_saved(api_url, db):
+    phrase_id, _ = prepare(1)[0]
+    meaning_id = str(ObjectId())
+
+    with httpx.Client(base_url=api_url, timeout=30) as client:
+        response = vote(client, phrase_id, meaning_id, "10.2.0.1", True)
+
+    assert response.status_code == 200
+    assert response.json()["success"] is False
+    assert db["user_votes"].count_documents({"meaning_id": meaning_id}) == 0